@@ -1,10 +1,18 @@
+import asyncio
+import logging
+import os
+import time
 from textwrap import dedent
-from typing import AsyncGenerator, List, Optional
+from typing import Any, AsyncGenerator, List, Optional
 
 # Import our agent team
 from app.agents.stage_2_initial_research import create_competitor_analysis_workflow, create_customer_insights_workflow, create_online_trends_workflow, create_market_research_workflow
 from app.agents.stage_6_output_production import create_podcast_workflow, create_executive_summary_workflow
 
+from app.engine.session_index import get_session_index_store
+from app.utils.json_validator import StructuredOutputStats, track_structured_output
+from app.workflows.checkpoint import WorkflowCheckpoint
+from app.workflows.research_feed import ResearchFeed
 from app.workflows.single import AgentRunEvent, AgentRunResult
 from llama_index.core.llms import ChatMessage, ChatResponse
 from llama_index.core.workflow import (
@@ -18,6 +26,8 @@ from llama_index.core.workflow import (
 from app.settings import Settings
 from llama_index.core.prompts import PromptTemplate
 
+logger = logging.getLogger("uvicorn")
+
 class StartCompetitorAnalysisResearchEvent(Event):
     input: str
 
@@ -50,20 +60,46 @@ class IdeatorIncWorkflow(Workflow):
         timeout: int = 1800, 
         initial_team_size: int = 4,
         post_production_team_size: int = 2,
-        chat_history: Optional[List[ChatMessage]] = None
+        chat_history: Optional[List[ChatMessage]] = None,
+        resume: bool = False,
+        pipelined: Optional[bool] = None
     ):
-        '''This is a very long running multi-step workflow, so we set a default timeout of 30 minutes'''
+        '''
+        This is a very long running multi-step workflow, so we set a default timeout of 30 minutes.
+        Every completed sub workflow is checkpointed per session, if resume is set, a re-run of the same idea skips the sub workflows that already finished.
+        If pipelined is set (PIPELINED_POST_PRODUCTION, on by default), post production starts with the research and briefs each research section as it lands, only its final synthesis waits for all the research.
+        '''
         super().__init__(timeout=timeout)
         self.session_id = session_id
         self.email = email
         self.chat_history = chat_history or []
         self.initial_team_size = initial_team_size
         self.post_production_team_size = post_production_team_size
+        self.resume = resume
+        self.pipelined = pipelined if pipelined is not None else os.getenv("PIPELINED_POST_PRODUCTION", "true").lower() == "true"
+        self.checkpoint = WorkflowCheckpoint(session_id=session_id, workflow_name="ideator_inc")
+        self.structured_output_stats: Optional[StructuredOutputStats] = None
+    
+    def run(self, *args: Any, **kwargs: Any) -> Any:
+        # The step tasks are created here and inherit the context, so the structured outputs of every agent in this run are counted
+        with track_structured_output() as stats:
+            self.structured_output_stats = stats
+            return super().run(*args, **kwargs)
         
     @step()
-    async def start(self, ctx: Context, ev: StartEvent) -> StartMarketResearchEvent | StartCustomerInsightsResearchEvent | StartOnlineTrendsResearchEvent | StartCompetitorAnalysisResearchEvent:
+    async def start(self, ctx: Context, ev: StartEvent) -> StartMarketResearchEvent | StartCustomerInsightsResearchEvent | StartOnlineTrendsResearchEvent | StartCompetitorAnalysisResearchEvent | CreatePodcastEvent | CreateExecutiveSummaryEvent:
         ctx.data["idea"] = ev.input
         
+        # Only resume from a checkpoint that was created for the same idea
+        if await self.checkpoint.astart(self.resume, idea=ev.input):
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name="Ideator Inc Workflow",
+                    msg=f"Resuming research, already completed: {self.checkpoint.completed_steps}",
+                    workflow_name="Research Manager"
+                )
+            )
+        
         ctx.write_event_to_stream(
             AgentRunEvent(
                 name="Ideator Inc Workflow",
@@ -77,13 +113,19 @@ class IdeatorIncWorkflow(Workflow):
         ctx.send_event(StartOnlineTrendsResearchEvent(input=ev.input))
         ctx.send_event(StartMarketResearchEvent(input=ev.input))
         
+        if self.pipelined:
+            # Post production consumes the research sections as they land
+            ctx.data["research_feed"] = ResearchFeed(session_id=self.session_id, expected=self.initial_team_size)
+            ctx.send_event(CreatePodcastEvent(input=ev.input))
+            ctx.send_event(CreateExecutiveSummaryEvent(input=ev.input))
+        
         return None
     
     ### Initial Research Analysts Team 1 ###
     @step()
     async def competitor_research(self, ctx: Context, ev: StartCompetitorAnalysisResearchEvent, competitor_researcher: Workflow) -> CombineResearchResultsEvent:
         prompt = f"Conduct a competitor analysis session based on the following idea: {ev.input}"
-        res = await self.run_sub_workflow(ctx, competitor_researcher, prompt, workflow_name="Competitor Analysis Analyst")
+        res = await self.run_checkpointed_sub_workflow(ctx, "competitor_research_result", competitor_researcher, prompt, workflow_name="Competitor Analysis Analyst")
         
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -93,14 +135,15 @@ class IdeatorIncWorkflow(Workflow):
             )
         )
         
-        ctx.data["competitor_research_result"] = res.response.message.content
+        ctx.data["competitor_research_result"] = res
         ctx.data["research_completed"] = ctx.data.get("research_completed", 0) + 1
-        return CombineResearchResultsEvent(input=res.response.message.content)
+        await self.publish_research(ctx, "Competitor Analysis", [competitor_researcher.report_file])
+        return CombineResearchResultsEvent(input=str(res))
     
     @step()
     async def customer_insights(self, ctx: Context, ev: StartCustomerInsightsResearchEvent, customer_insights_researcher: Workflow) -> CombineResearchResultsEvent:
         prompt = f"Conduct a customer insights session based on the following idea: {ev.input}"
-        res = await self.run_sub_workflow(ctx, customer_insights_researcher, prompt, workflow_name="Customer Insights Analyst")
+        res = await self.run_checkpointed_sub_workflow(ctx, "customer_insights_result", customer_insights_researcher, prompt, workflow_name="Customer Insights Analyst")
         
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -110,14 +153,15 @@ class IdeatorIncWorkflow(Workflow):
             )
         )
         
-        ctx.data["customer_insights_result"] = res.response.message.content
+        ctx.data["customer_insights_result"] = res
         ctx.data["research_completed"] = ctx.data.get("research_completed", 0) + 1
-        return CombineResearchResultsEvent(input=res.response.message.content)
+        await self.publish_research(ctx, "Customer Insights", [customer_insights_researcher.report_file])
+        return CombineResearchResultsEvent(input=str(res))
     
     @step()
     async def online_trends(self, ctx: Context, ev: StartOnlineTrendsResearchEvent, online_trends_researcher: Workflow) -> CombineResearchResultsEvent:
         prompt = f"Conduct a online trends research session based on the following idea: {ev.input}"
-        res = await self.run_sub_workflow(ctx, online_trends_researcher, prompt, workflow_name="Online Trends Analyst")
+        res = await self.run_checkpointed_sub_workflow(ctx, "online_trends_result", online_trends_researcher, prompt, workflow_name="Online Trends Analyst")
         
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -127,14 +171,15 @@ class IdeatorIncWorkflow(Workflow):
             )
         )
         
-        ctx.data["online_trends_result"] = res.response.message.content
+        ctx.data["online_trends_result"] = res
         ctx.data["research_completed"] = ctx.data.get("research_completed", 0) + 1
-        return CombineResearchResultsEvent(input=res.response.message.content)
+        await self.publish_research(ctx, "Online Trends", [online_trends_researcher.report_file])
+        return CombineResearchResultsEvent(input=str(res))
     
     @step()
     async def market_research(self, ctx: Context, ev: StartMarketResearchEvent, market_research_researcher: Workflow) -> CombineResearchResultsEvent:
         prompt = f"Conduct a market research session based on the following idea: {ev.input}"
-        res = await self.run_sub_workflow(ctx, market_research_researcher, prompt, workflow_name="Market Research Analyst")
+        res = await self.run_checkpointed_sub_workflow(ctx, "market_research_result", market_research_researcher, prompt, workflow_name="Market Research Analyst")
         
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -144,9 +189,10 @@ class IdeatorIncWorkflow(Workflow):
             )
         )
         
-        ctx.data["market_research_result"] = res.response.message.content
+        ctx.data["market_research_result"] = res
         ctx.data["research_completed"] = ctx.data.get("research_completed", 0) + 1
-        return CombineResearchResultsEvent(input=res.response.message.content)
+        await self.publish_research(ctx, "Market Research", [market_research_researcher.report_file])
+        return CombineResearchResultsEvent(input=str(res))
 
     @step()
     async def combine_research_results(self, ctx: Context, ev: CombineResearchResultsEvent) -> CreatePodcastEvent | CreateExecutiveSummaryEvent:
@@ -170,14 +216,18 @@ class IdeatorIncWorkflow(Workflow):
                 workflow_name="Research Manager"
             )
         )
-        ctx.send_event(CreatePodcastEvent(input=ev.input))
-        ctx.send_event(CreateExecutiveSummaryEvent(input=ev.input))
+        # Index the research for Q&A in the background while the post production runs
+        self._index_task = asyncio.create_task(self.build_qna_index())
+        if not self.pipelined:
+            ctx.send_event(CreatePodcastEvent(input=ev.input))
+            ctx.send_event(CreateExecutiveSummaryEvent(input=ev.input))
         return None
 
     ### Output Production ###
     @step()
     async def podcast_generation(self, ctx: Context, ev: CreatePodcastEvent, podcast_generator: Workflow) -> CombinePostProductionResultsEvent:
-        res = await self.run_sub_workflow(ctx, podcast_generator, ev.input, workflow_name="Podcaster")
+        res = await self.run_checkpointed_sub_workflow(ctx, "podcast_result", podcast_generator, ev.input, workflow_name="Podcaster", research_feed=ctx.data.get("research_feed"))
+        ctx.data.setdefault("post_production_finished_at", {})["podcast"] = time.monotonic()
         
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -193,7 +243,8 @@ class IdeatorIncWorkflow(Workflow):
     
     @step()
     async def executive_summary_generation(self, ctx: Context, ev: CreateExecutiveSummaryEvent, executive_summarizer: Workflow) -> CombinePostProductionResultsEvent:
-        res = await self.run_sub_workflow(ctx, executive_summarizer, ev.input, workflow_name="Executive Summarizer")
+        res = await self.run_checkpointed_sub_workflow(ctx, "executive_summary_result", executive_summarizer, ev.input, workflow_name="Executive Summarizer", research_feed=ctx.data.get("research_feed"))
+        ctx.data.setdefault("post_production_finished_at", {})["executive_summary"] = time.monotonic()
         
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -228,6 +279,32 @@ class IdeatorIncWorkflow(Workflow):
             )
         )
         
+        research_feed: Optional[ResearchFeed] = ctx.data.get("research_feed")
+        if research_feed is not None:
+            timings = research_feed.report(ctx.data.get("post_production_finished_at"))
+            logger.info(f"Pipelined post production timings for session {self.session_id}: {timings}")
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name="Ideator Inc Workflow",
+                    msg=f"Research took {timings['research_seconds']}s, post production finished {timings.get('post_production_seconds', 0)}s later, starting it early saved an estimated {timings.get('estimated_saving_seconds', 0)}s",
+                    workflow_name="Research Manager"
+                )
+            )
+        
+        stats = self.structured_output_stats
+        if stats is not None:
+            logger.info(f"Structured outputs for session {self.session_id}: {stats.model_dump()}")
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name="Ideator Inc Workflow",
+                    msg=f"Structured outputs: {stats.parsed} valid, {stats.repaired_locally} repaired locally ({stats.llm_repairs_avoided} LLM repair calls avoided), {stats.native} schema constrained, {stats.llm_repair_calls} LLM repair calls, {stats.failed} failed",
+                    workflow_name="Research Manager"
+                )
+            )
+        
+        # Add the post production outputs to the Q&A index, only the new files are embedded
+        await self.build_qna_index()
+
         responses = f"""
         Market Research Result: 
         {ctx.data.get('market_research_result', "None")}
@@ -282,16 +359,58 @@ class IdeatorIncWorkflow(Workflow):
         
         return StopEvent(result=responses)
     
+    async def publish_research(self, ctx: Context, section: str, files: List[str]) -> None:
+        research_feed: Optional[ResearchFeed] = ctx.data.get("research_feed")
+        if research_feed is not None:
+            await research_feed.publish(section, files)
+
+    async def build_qna_index(self) -> None:
+        try:
+            await get_session_index_store().refresh(self.session_id)
+        except Exception as e:
+            logger.warning(f"Failed to index research for session {self.session_id}: {e}")
+
+    async def run_checkpointed_sub_workflow(
+        self,
+        ctx: Context,
+        step_name: str,
+        workflow: Workflow,
+        input: str,
+        workflow_name: str = "",
+        **kwargs: Any
+    ) -> Any:
+        '''
+        Run a sub workflow and persist its result, or restore the result if a previous run of this session already completed it
+        '''
+        if self.checkpoint.is_completed(step_name):
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name="Ideator Inc Workflow",
+                    msg=f"Restored {workflow_name} result from checkpoint, skipping",
+                    workflow_name=workflow_name
+                )
+            )
+            return self.checkpoint.get(step_name)
+        
+        res = await self.run_sub_workflow(ctx, workflow, input, workflow_name=workflow_name, **kwargs)
+        result = res.response.message.content if isinstance(res, AgentRunResult) else res
+        
+        # Failed sub workflows are not checkpointed so that they are retried on resume
+        if result is not None and workflow_name not in ctx.data.get("failed_workflows", []):
+            await self.checkpoint.asave_step(step_name, **{step_name: result})
+        return result
+    
     async def run_sub_workflow(
         self,
         ctx: Context,
         workflow: Workflow,
         input: str,
         streaming: bool = False,
-        workflow_name: str = ""
+        workflow_name: str = "",
+        **kwargs: Any
     ) -> AgentRunResult | AsyncGenerator:
         try:
-            handler = workflow.run(input=input, streaming=streaming)
+            handler = workflow.run(input=input, streaming=streaming, **kwargs)
             # bubble all events while running the executor to the planner
             async for event in handler.stream_events():
                 # Don't write the StopEvent from sub task to the stream
@@ -301,6 +420,7 @@ class IdeatorIncWorkflow(Workflow):
                     ctx.write_event_to_stream(event)
             return await handler
         except Exception as e:
+            ctx.data.setdefault("failed_workflows", []).append(workflow_name)
             error_message = f"Error in {workflow_name}: {str(e)}"
             ctx.write_event_to_stream(
                 AgentRunEvent(
@@ -319,7 +439,7 @@ class IdeatorIncWorkflow(Workflow):
                 sources=[]
             )
     
-def create_idea_research_workflow(session_id: str, chat_history: Optional[List[ChatMessage]] = None, email: Optional[str] = None, **kwargs):
+def create_idea_research_workflow(session_id: str, chat_history: Optional[List[ChatMessage]] = None, email: Optional[str] = None, resume: bool = False, **kwargs):
     # Initial Research Team
     timeout = 1200
     competitor_researcher = create_competitor_analysis_workflow(
@@ -355,23 +475,25 @@ def create_idea_research_workflow(session_id: str, chat_history: Optional[List[C
         timeout=timeout
     )
     
+    workflow = IdeatorIncWorkflow(session_id=session_id, timeout=3600, chat_history=chat_history, initial_team_size=4, post_production_team_size=2, resume=resume)
+
     # Final Output
+    # Pipelined post production starts with the research and waits for it, so its timeout also covers the research
+    post_production_timeout = 1800 + (timeout if workflow.pipelined else 0)
     podcast_generator = create_podcast_workflow(
         session_id=session_id, 
         chat_history=chat_history, 
-        timeout=1800,
+        timeout=post_production_timeout,
         max_iterations=1
     )
     executive_summarizer = create_executive_summary_workflow(
         session_id=session_id, 
         chat_history=chat_history, 
         email=email,
-        timeout=1800,
+        timeout=post_production_timeout,
         max_iterations=1
     )
 
-    workflow = IdeatorIncWorkflow(session_id=session_id, timeout=3600, chat_history=chat_history, initial_team_size=4, post_production_team_size=2)
-
     workflow.add_workflows(
         competitor_researcher=competitor_researcher,
         customer_insights_researcher=customer_insights_researcher,
@@ -3,7 +3,7 @@ from typing import List
 from app.workflows.single import FunctionCallingAgent
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.tools import FunctionTool
-from app.engine.tools.tavily import tavily_search
+from app.engine.tools.tavily import atavily_search
 from app.engine.tools.web_reader import read_webpage
 from pydantic import BaseModel, Field
 
@@ -40,15 +40,15 @@ class SearchCompetitorDetailsResponse(BaseModel):
     sources: List[str] = Field(description="List of URLs used for the analysis")
     
 def create_competitor_researcher(chat_history: List[ChatMessage]):
-    def search(query: str):
-        return tavily_search(
+    async def search(query: str):
+        return await atavily_search(
             query=query,
             max_results=3,
             search_depth="advanced"
         )
         
-    def review_search(query: str):
-        return tavily_search(
+    async def review_search(query: str):
+        return await atavily_search(
             query=query,
             max_results=5,
             search_depth="advanced",
@@ -78,8 +78,8 @@ def create_competitor_researcher(chat_history: List[ChatMessage]):
 
 
     tools = [
-        FunctionTool.from_defaults(search, name="search", description="Search the web for any information"),
-        FunctionTool.from_defaults(review_search, name="review_search", description="Search on a curated list of websites for user reviews"),
+        FunctionTool.from_defaults(async_fn=search, name="search", description="Search the web for any information"),
+        FunctionTool.from_defaults(async_fn=review_search, name="review_search", description="Search on a curated list of websites for user reviews"),
         FunctionTool.from_defaults(async_fn=scrape_product_details, name="scrape_product_details", description="Extract detailed product information from a webpage"),
         FunctionTool.from_defaults(async_fn=scrape_pricing, name="scrape_pricing", description="Extract pricing information from a webpage"),
         FunctionTool.from_defaults(async_fn=scrape_reviews, name="scrape_reviews", description="Extract and analyze user reviews from a webpage, note that there may be no reviews on the site"),
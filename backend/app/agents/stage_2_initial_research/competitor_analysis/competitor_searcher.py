@@ -4,7 +4,7 @@ from app.workflows.single import FunctionCallingAgent
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.tools import FunctionTool
 
-from app.engine.tools.tavily import tavily_search
+from app.engine.tools.tavily import atavily_search
 from app.engine.tools.web_reader import read_webpage
 from pydantic import BaseModel, Field
 
@@ -21,12 +21,12 @@ class CompetitorSearchResponse(BaseModel):
     competitors: List[CompetitorInfo] = Field(description="Detailed information about each competitor found")
 
 def create_competitor_searcher(chat_history: List[ChatMessage]):
-    def curated_competitor_search(search_query: str):
-        return tavily_search(query=search_query, max_results=10, include_domains=["ycombinator.com", "reddit.com", "tiktok.com", "producthunt.com", "news.ycombinator.com", "hackernews.com", "appsumo.com", "youtube.com" ])
+    async def curated_competitor_search(search_query: str):
+        return await atavily_search(query=search_query, max_results=10, include_domains=["ycombinator.com", "reddit.com", "tiktok.com", "producthunt.com", "news.ycombinator.com", "hackernews.com", "appsumo.com", "youtube.com" ])
     
     tools = [
-        FunctionTool.from_defaults(tavily_search, name="search", description="Search the web for information, it returns a list of urls and content"),
-        FunctionTool.from_defaults(curated_competitor_search, name="curated_competitor_search", description="Search a curated domain of websites for information, it returns a list of urls and content"),
+        FunctionTool.from_defaults(async_fn=atavily_search, name="search", description="Search the web for information, it returns a list of urls and content"),
+        FunctionTool.from_defaults(async_fn=curated_competitor_search, name="curated_competitor_search", description="Search a curated domain of websites for information, it returns a list of urls and content"),
         FunctionTool.from_defaults(async_fn=read_webpage, name="read_webpage", description="Access a webpage and read it"),
     ]
 
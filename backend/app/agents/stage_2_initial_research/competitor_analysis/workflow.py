@@ -1,6 +1,7 @@
 import json
+import os
 from textwrap import dedent
-from typing import List, Optional
+from typing import Any, Callable, List, Optional
 from app.agents.stage_2_initial_research.competitor_analysis.competitor_searcher import CompetitorInfo, CompetitorSearchResponse, create_competitor_searcher
 from app.agents.stage_2_initial_research.competitor_analysis.competitor_analyzer import create_competitor_analyzer
 from app.agents.stage_2_initial_research.competitor_analysis.report_critic import CompetitorReportCritique, create_report_critic
@@ -9,7 +10,11 @@ from app.agents.example.reporter import create_reporter
 from app.engine.tools.file_writer import write_file
 from app.utils.json_extractor import extract_code_block_from_response, extract_json_from_response
 from app.utils.json_validator import JsonValidationHelper
+from app.utils.json_stream import StreamingModelParser
+from app.utils.context_packer import get_context_budget, pack_context
+from app.utils.dedup import dedupe_by_embedding, dedupe_urls, embedding_dedup_enabled, same_name
 from app.workflows.react import ReActAgentWithMemory
+from app.workflows.critic_loop import CriticLoop
 from llama_index.core.workflow import Context, Event, StartEvent, StopEvent, Workflow, step
 from app.workflows.single import AgentRunEvent, FunctionCallingAgent, AgentRunResult
 from llama_index.core.chat_engine.types import ChatMessage
@@ -17,6 +22,10 @@ import asyncio
 from llama_index.core.chat_engine.types import AgentChatResponse
 from llama_index.core.prompts.base import PromptTemplate
 from app.settings import Settings
+from app.engine.llm_cache import acomplete
+
+# Size of the competitor detail gathering worker pool
+COMPETITOR_DETAIL_WORKERS = int(os.getenv("COMPETITOR_DETAIL_WORKERS", "2"))
 
 class ExecuteSearchEvent(Event):
     query: str
@@ -56,20 +65,38 @@ class CompetitorAnalysisWorkflow(Workflow):
         num_searches: Number of parallel searches to perform
         num_competitors: Maximum number of competitors to analyze
         timeout: Maximum time in seconds for the workflow
+        streaming_search: Parse the searchers' responses as they stream (STREAMING_COMPETITOR_SEARCH, on by default),
+            direct competitors start their detail gathering as soon as they are found, for up to half of the
+            competitor slots, the other slots go to the best ranked competitors once all searches are done
+        fanout_details: Start the detail gathering of every new competitor as soon as it is found, up to `num_competitors`,
+            instead of ranking them once all searches are done (COMPETITOR_DETAIL_FANOUT, off by default)
     """
+    # Research file the report is saved to in the session data directory
+    report_file = "report.txt"
+
     def __init__(self, 
                  session_id: str,
                  chat_history: Optional[List[ChatMessage]] = None,
                  num_queries: int = 2,
-                 num_competitors: int = 4,
+                 num_competitors: Optional[int] = None,
                  timeout: int = 1800,
-                 max_critic_iterations: int = 3):
+                 max_critic_iterations: int = 3,
+                 streaming_search: Optional[bool] = None,
+                 fanout_details: Optional[bool] = None):
         super().__init__(timeout=timeout)
         self.session_id = session_id
         self.chat_history = chat_history or []
         self.num_queries = num_queries
-        self.num_competitors = num_competitors
+        self.num_competitors = num_competitors or int(os.getenv("MAX_COMPETITORS", "4"))
         self.max_critic_iterations = max_critic_iterations
+        self.streaming_search = streaming_search if streaming_search is not None else os.getenv("STREAMING_COMPETITOR_SEARCH", "true").lower() == "true"
+        self.fanout_details = fanout_details if fanout_details is not None else os.getenv("COMPETITOR_DETAIL_FANOUT", "false").lower() == "true"
+        if self.fanout_details:
+            self.eager_detail_slots = self.num_competitors
+        elif self.streaming_search:
+            self.eager_detail_slots = max(1, self.num_competitors // 2)
+        else:
+            self.eager_detail_slots = 0
         
     @step()
     async def start(self, ctx: Context, ev: StartEvent) -> ExecuteSearchEvent:
@@ -110,16 +137,28 @@ class CompetitorAnalysisWorkflow(Workflow):
                 Here is the search query you should use for your research: {ev.query}
             """
         competitor_searcher = create_competitor_searcher(chat_history=[])
-        result = await self.run_agent(ctx, competitor_searcher, prompt)
+        if self.streaming_search:
+            # Shortlist each competitor as soon as the searcher has written it
+            streamed = StreamingModelParser(
+                CompetitorInfo,
+                ("competitors", "*"),
+                on_item=lambda competitor: self.shortlist_competitor(ctx, competitor, competitor_searcher.name),
+            )
+            content = await self.run_agent_streaming(ctx, competitor_searcher, prompt, streamed.feed)
+        else:
+            result = await self.run_agent(ctx, competitor_searcher, prompt)
+            content = result.response.message.content
         ctx.write_event_to_stream(
             AgentRunEvent(
                 name=competitor_searcher.name,
-                msg=f"Completed competitor search: {result.response.message.content}",
+                msg=f"Completed competitor search: {content}",
             )
         )
         
         parser = JsonValidationHelper(CompetitorSearchResponse, Settings.llm)
-        parsed_res = await parser.validate_and_fix(result.response.message.content)
+        parsed_res = await parser.validate_and_fix(content)
+        if not parsed_res and self.streaming_search and streamed.items:
+            parsed_res = CompetitorSearchResponse(sources=[], insights=[], competitors=streamed.items)
         
         if not parsed_res:
             ctx.write_event_to_stream(
@@ -132,8 +171,8 @@ class CompetitorAnalysisWorkflow(Workflow):
             return CombineSearchesEvent()
         
         # This will be used by the analyzer agent
-        ctx.data.setdefault("initial_search_results", []).append(result.response.message.content)
-        ctx.data.setdefault("sources", []).extend(parsed_res.sources)
+        ctx.data.setdefault("initial_search_results", []).append(content)
+        ctx.data.setdefault("sources", []).extend(dedupe_urls(parsed_res.sources, ctx.data.setdefault("source_urls", set())))
         ctx.write_event_to_stream(
                 AgentRunEvent(
                     name=competitor_searcher.name,
@@ -142,19 +181,7 @@ class CompetitorAnalysisWorkflow(Workflow):
             )
         
         for competitor in parsed_res.competitors:
-            # Skip if we've already gathered details for this competitor
-            if competitor.name in ctx.data.get("competitor_names", set()):
-                continue 
-            
-            ctx.data.setdefault("competitor_names", set()).add(competitor.name)
-            ctx.data.setdefault("competitors", []).append(competitor)
-            
-            ctx.write_event_to_stream(
-                AgentRunEvent(
-                    name=competitor_searcher.name,
-                    msg=f"Shortlisted {competitor.name} as a competitor",
-                )
-            )
+            self.shortlist_competitor(ctx, competitor, competitor_searcher.name)
         
         ctx.data["num_searches_completed"] = ctx.data.get("num_searches_completed", 0) + 1
         return CombineSearchesEvent()
@@ -184,22 +211,37 @@ class CompetitorAnalysisWorkflow(Workflow):
             )
         )
         
-        reranked_competitors = await self._deduplicate_and_rank_competitors(ctx.data["competitors"], ctx.data["task"], self.num_competitors)
-        ctx.data["reranked_competitors"] = reranked_competitors[:self.num_competitors]
+        # Competitors whose details are already being gathered keep their slot, rank the rest for the remaining slots
+        eager_competitors = ctx.data.get("eager_competitors", [])
+        eager_names = {competitor.name for competitor in eager_competitors}
+        remaining_slots = self.num_competitors - len(eager_competitors)
+        candidates = [competitor for competitor in ctx.data["competitors"] if competitor.name not in eager_names]
+        reranked_competitors = []
+        # When fanning out, every competitor found got a slot while there were any left, there is nothing to rank
+        if remaining_slots > 0 and not self.fanout_details:
+            if embedding_dedup_enabled():
+                # Also collapse the same company listed under different names before spending rerank tokens on it
+                candidates = await dedupe_by_embedding(candidates, key=lambda competitor: f"{competitor.name}: {competitor.description}")
+            reranked_competitors = await self._deduplicate_and_rank_competitors(candidates, ctx.data["task"], remaining_slots)
+            reranked_competitors = reranked_competitors[:remaining_slots]
+        ctx.data["reranked_competitors"] = eager_competitors + reranked_competitors
         ctx.write_event_to_stream(
             AgentRunEvent(
                 name="Research combiner",
-                msg=f"Shortlisted {len(reranked_competitors)} promising competitors:\n{reranked_competitors}",
+                msg=f"Shortlisted {len(ctx.data['reranked_competitors'])} promising competitors:\n{ctx.data['reranked_competitors']}",
             )
         )
         
         for competitor in reranked_competitors:
             ctx.send_event(GatherCompetitorDetailsEvent(input=competitor))
+        if not reranked_competitors:
+            # Only eager competitors, whose details may all be gathered already
+            ctx.send_event(CombineCompetitorDetailsEvent())
         
         return None
         
     
-    @step(num_workers=2)
+    @step(num_workers=COMPETITOR_DETAIL_WORKERS)
     async def gather_competitor_details(self, ctx: Context, ev: GatherCompetitorDetailsEvent) -> CombineCompetitorDetailsEvent:
         '''
         Gather details about a single competitor, including pricing information, key features, target audience, and reviews
@@ -230,7 +272,7 @@ class CompetitorAnalysisWorkflow(Workflow):
             )
             return CombineCompetitorDetailsEvent()
 
-        ctx.data.setdefault("sources", []).extend(parsed_res.sources)
+        ctx.data.setdefault("sources", []).extend(dedupe_urls(parsed_res.sources, ctx.data.setdefault("source_urls", set())))
         return CombineCompetitorDetailsEvent()
     
     @step()
@@ -238,8 +280,12 @@ class CompetitorAnalysisWorkflow(Workflow):
         '''
         Combine the details about all competitors
         '''
+        if "reranked_competitors" not in ctx.data:
+            # Details of a competitor found early, the other competitors are assigned once all searches are done
+            return None
+        
         num_to_collect = len(ctx.data.get("reranked_competitors"))
-        num_completed = len(ctx.data.get("refined_search_results"))
+        num_completed = len(ctx.data.get("refined_search_results", []))
         
         if num_completed < num_to_collect:
             ctx.write_event_to_stream(
@@ -265,48 +311,47 @@ class CompetitorAnalysisWorkflow(Workflow):
     async def analyze(
         self, ctx: Context, ev: AnalyzeCompetitorsEvent, competitor_analyzer: FunctionCallingAgent
     ) -> CritiqueCompetitorsEvent | ReportEvent:
-        if ctx.data.get("critic_iteration", 0) == 0:
+        loop = CriticLoop.of(ctx, "Competitor analysis", self.max_critic_iterations)
+        if loop.draft is None:
+            research = pack_context(
+                ctx.data["task"],
+                {
+                    "Initial research": ctx.data["initial_search_results"],
+                    "Refined research": ctx.data["refined_search_results"],
+                },
+                token_budget=get_context_budget(competitor_analyzer.llm),
+            )
             prompt = dedent(f"""
                 We are currently researching this task: {ctx.data['task']}
                 
-                ### Initial research
+                ### Research
                 Junior analysts have gathered initial research on these competitors.
                 They have found the following competitors: 
                 {ctx.data["competitor_names"]}
                 
-                Here are their findings and analysis: 
-                {ctx.data["initial_search_results"]}
-                
-                ### Refined research
-                Promising competitors have been reranked and deduplicated and further researched, here are their details: 
-                {ctx.data["refined_search_results"]}
+                Promising competitors have then been reranked and deduplicated and further researched.
+                Here are their findings and analysis, most relevant first within the context budget:
+                {research}
                 
                 ### Report
                 Analyze the data and provide a detailed report with citations
             """)
         else:
-            prompt = dedent(f"""
-                We are currently researching this task: {ctx.data['task']}
-                
-                You had asked the critic to critique your output and here is the feedback: {ev.input}
-                
-                Refine this report based on the following feedback: {ev.input}
-            """)
+            prompt = f"We are currently researching this task: {ctx.data['task']}\n\n" + loop.revision_request(ev.input)
         result: AgentRunResult = await self.run_agent(ctx, competitor_analyzer, prompt)
-        ctx.data["competitor_analysis_result"] = result.response.message.content
+        ctx.data["competitor_analysis_result"] = loop.add_draft(result.response.message.content)
         
-        # If we've done this 3 times, we should just return the report
-        if ctx.data.get("critic_iteration", 0) >= self.max_critic_iterations:
+        # Stop once the critic has been asked enough times, the drafts converged or the time budget is spent
+        if loop.should_stop():
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name=competitor_analyzer.name,
-                    msg=f"Completed competitor analysis and asked the critic 3 times, moving on to generate the final report",
+                    msg=f"Completed competitor analysis. {loop.describe()}, moving on to generate the final report",
                 )
             )
             return ReportEvent(input=ctx.data["competitor_analysis_result"])
         
         # Otherwise, we should critique the report
-        ctx.data["critic_iteration"] = ctx.data.get("critic_iteration", 0) + 1
         ctx.write_event_to_stream(
             AgentRunEvent(
                 name=competitor_analyzer.name,
@@ -319,9 +364,10 @@ class CompetitorAnalysisWorkflow(Workflow):
     async def critique(
         self, ctx: Context, ev: CritiqueCompetitorsEvent, report_critic: FunctionCallingAgent
     ) -> ReportEvent:
+        loop = CriticLoop.of(ctx, "Competitor analysis", self.max_critic_iterations)
         result = await self.run_agent(ctx, report_critic,
             f"""We are currently researching this task: {ctx.data['task']}
-            We have researched and analyzed the competitors, and created this report draft: {ev.input}
+            We have researched and analyzed the competitors, and created this report draft: {loop.critique_material(ev.input)}
             Please critique the report and provide actionable feedback for improvement."""
         )
         ctx.write_event_to_stream(
@@ -340,9 +386,11 @@ class CompetitorAnalysisWorkflow(Workflow):
                     msg=f"No valid JSON content found in the response",
                 )
             )
+            loop.finish("invalid_critique")
             return ReportEvent(input=result.response.message.content)
         
         if parsed_response.satisfied:
+            loop.finish("critic_satisfied")
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name=report_critic.name,
@@ -409,13 +457,13 @@ class CompetitorAnalysisWorkflow(Workflow):
                     We used the following sources to compile the report:
                     {ctx.data["sources"]}
                 """),
-                file_name="report.txt",
+                file_name=self.report_file,
                 session_id=self.session_id,
             )
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name=reporter.name,
-                    msg=f"Saved report to report.txt",
+                    msg=f"Saved report to {self.report_file}",
                 )
             )
             
@@ -445,6 +493,68 @@ class CompetitorAnalysisWorkflow(Workflow):
             )
             raise
     
+    async def run_agent_streaming(self, ctx: Context, agent: FunctionCallingAgent, input: str, on_text: Callable[[str], Any]) -> str:
+        '''
+        Run an agent with a streamed final response, `on_text` is called with each chunk of it. Returns the full response.
+        '''
+        try:
+            handler = agent.run(input=input, streaming=True)
+            async for event in handler.stream_events():
+                if type(event) is not StopEvent:
+                    ctx.write_event_to_stream(event)
+            result = await handler
+            if isinstance(result, AgentRunResult):
+                on_text(result.response.message.content)
+                return result.response.message.content
+            
+            last_chunk = None
+            async for chunk in result:
+                # The agent yields the last chunk again once the stream is done
+                if chunk is last_chunk:
+                    continue
+                last_chunk = chunk
+                on_text(chunk.delta or "")
+            return last_chunk.message.content if last_chunk is not None else ""
+        except Exception as e:
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name=agent.name,
+                    msg=f"Error running agent: {str(e)}",
+                )
+            )
+            raise
+    
+    def shortlist_competitor(self, ctx: Context, competitor: CompetitorInfo, agent_name: str) -> None:
+        '''
+        Shortlist a competitor found by a searcher, new competitors start their detail gathering right away while there are
+        eager slots left (only direct competitors, unless fanning out)
+        '''
+        # Skip if we've already shortlisted this competitor, possibly under a slightly different name
+        competitors = ctx.data.setdefault("competitors", [])
+        if any(same_name(competitor.name, other.name) for other in competitors):
+            return
+        
+        ctx.data.setdefault("competitor_names", set()).add(competitor.name)
+        competitors.append(competitor)
+        
+        ctx.write_event_to_stream(
+            AgentRunEvent(
+                name=agent_name,
+                msg=f"Shortlisted {competitor.name} as a competitor",
+            )
+        )
+        
+        eager_competitors = ctx.data.setdefault("eager_competitors", [])
+        if (self.fanout_details or competitor.direct_competitor) and len(eager_competitors) < self.eager_detail_slots:
+            eager_competitors.append(competitor)
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name=agent_name,
+                    msg=f"Gathering details about {competitor.name} while the searches continue",
+                )
+            )
+            ctx.send_event(GatherCompetitorDetailsEvent(input=competitor))
+    
     async def _generate_search_queries(self, task: str, chat_history: List[ChatMessage], number_of_queries: int = 5) -> List[str]:
         prompt_template = PromptTemplate(
             dedent("""
@@ -498,7 +608,7 @@ class CompetitorAnalysisWorkflow(Workflow):
         )
 
         prompt = prompt_template.format(task=task, chat_history=chat_history, number_of_queries=number_of_queries)
-        output = await Settings.llm.acomplete(prompt)
+        output = await acomplete(Settings.llm, prompt)
         json_content = extract_json_from_response(output.text.strip())
         return json_content
 
@@ -542,20 +652,21 @@ class CompetitorAnalysisWorkflow(Workflow):
             n=n
         )
         
-        output = await Settings.llm.acomplete(prompt)
+        output = await acomplete(Settings.llm, prompt)
         json_array = extract_json_from_response(output.text.strip())
         res = [CompetitorInfo.model_validate(comp) for comp in json_array]
         print(res)
         return res
 
 
-def create_competitor_analysis_workflow(session_id: str, chat_history: List[ChatMessage], email: str | None = None, timeout: int = 1800, num_queries: int = 5, max_critic_iterations: int = 3):
+def create_competitor_analysis_workflow(session_id: str, chat_history: List[ChatMessage], email: str | None = None, timeout: int = 1800, num_queries: int = 5, max_critic_iterations: int = 3, num_competitors: Optional[int] = None):
     workflow = CompetitorAnalysisWorkflow(
         session_id=session_id,
         timeout=timeout,
         chat_history=chat_history,
         num_queries=num_queries,
         max_critic_iterations=max_critic_iterations,
+        num_competitors=num_competitors,
     )
     
     competitor_analyzer = create_competitor_analyzer(chat_history)
@@ -3,19 +3,19 @@ from typing import List
 from app.workflows.single import FunctionCallingAgent
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.tools import FunctionTool
-from app.engine.tools.tavily import tavily_search
+from app.engine.tools.tavily import atavily_search
 from app.engine.tools import ToolFactory
 
 def create_insights_analyzer(chat_history: List[ChatMessage]):
-    def search(query: str):
-        return tavily_search(
+    async def search(query: str):
+        return await atavily_search(
             query=query,
             max_results=3,
             search_depth="advanced"
         )
         
     tools = [
-        FunctionTool.from_defaults(search, name="search", description="Search for additional context or validation"),
+        FunctionTool.from_defaults(async_fn=search, name="search", description="Search for additional context or validation"),
     ]
 
     prompt_instructions = dedent("""
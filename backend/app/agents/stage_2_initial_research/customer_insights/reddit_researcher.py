@@ -4,11 +4,11 @@ from app.engine.tools.web_reader import read_webpage
 from app.workflows.single import FunctionCallingAgent
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.tools import FunctionTool
-from app.engine.tools.tavily import tavily_search
+from app.engine.tools.tavily import atavily_search
 
 def create_reddit_researcher(chat_history: List[ChatMessage]):
-    def reddit_search(search_query: str):
-        return tavily_search(
+    async def reddit_search(search_query: str):
+        return await atavily_search(
             query=search_query,
             max_results=5,
             include_domains=["reddit.com"]
@@ -22,7 +22,7 @@ def create_reddit_researcher(chat_history: List[ChatMessage]):
     
     tools = [
         FunctionTool.from_defaults(
-            reddit_search, 
+            async_fn=reddit_search, 
             name="reddit_search",
             description="Search Reddit for customer discussions and insights"
         ),
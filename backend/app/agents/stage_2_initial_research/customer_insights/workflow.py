@@ -12,6 +12,9 @@ from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.prompts.base import PromptTemplate
 from app.settings import Settings
 from app.utils.json_validator import JsonValidationHelper
+from app.utils.context_packer import get_context_budget, pack_context
+from app.utils.dedup import extract_urls
+from app.workflows.critic_loop import CriticLoop
 
 from pydantic import BaseModel, Field
 from typing import List
@@ -62,6 +65,9 @@ class ReportEvent(Event):
     input: str
 
 class CustomerInsightsWorkflow(Workflow):
+    # Research file the report is saved to in the session data directory
+    report_file = "customer_insights_report.txt"
+
     def __init__(self,
                 session_id: str,
                 chat_history: Optional[List[ChatMessage]] = None,
@@ -157,32 +163,29 @@ class CustomerInsightsWorkflow(Workflow):
             )
         )
         
-        # Initialize critic iteration counter
-        ctx.data["critic_iteration"] = 0
-        
         return AnalyzeInsightsEvent(input="")
 
     @step()
     async def analyze(
         self, ctx: Context, ev: AnalyzeInsightsEvent, insights_analyzer: FunctionCallingAgent
     ) -> CritiqueInsightsEvent | ReportEvent:
-        if ctx.data.get("critic_iteration", 0) == 0:
+        loop = CriticLoop.of(ctx, "Customer insights", self.max_critic_iterations)
+        if loop.draft is None:
+            research = pack_context(
+                ctx.data["task"],
+                {"Reddit discussions": ctx.data.get("reddit_search_results", [])},
+                token_budget=get_context_budget(insights_analyzer.llm),
+            )
             prompt = dedent(f"""
                 We are researching customer insights for this task: {ctx.data['task']}
                 
                 Here are the findings from Reddit discussions:
-                {ctx.data.get('reddit_search_results', [])}
+                {research}
                 
                 Please analyze these findings and provide a comprehensive customer insights report.
             """)
         else:
-            prompt = dedent(f"""
-                We are researching customer insights for this task: {ctx.data['task']}
-                
-                The critic provided this feedback on your previous analysis: {ev.input}
-                
-                Please refine the analysis based on this feedback.
-            """)
+            prompt = f"We are researching customer insights for this task: {ctx.data['task']}\n\n" + loop.revision_request(ev.input)
             
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -191,14 +194,14 @@ class CustomerInsightsWorkflow(Workflow):
             )
         )
         result = await self.run_agent(ctx, insights_analyzer, prompt)
-        ctx.data["insights_analysis_result"] = result.response.message.content
+        ctx.data["insights_analysis_result"] = loop.add_draft(result.response.message.content)
         
-        # If we have reached the max number of critic iterations, return the final analysis to the reporter
-        if ctx.data.get("critic_iteration", 0) >= self.max_critic_iterations:
+        # Once the critic has been asked enough times, the drafts converged or the time budget is spent, return the final analysis to the reporter
+        if loop.should_stop():
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Insights analyzer",
-                    msg=f"Reached max critic iterations, returning final analysis to reporter",
+                    msg=f"{loop.describe()}, returning final analysis to reporter",
                 )
             )
             return ReportEvent(input=ctx.data["insights_analysis_result"])
@@ -210,23 +213,24 @@ class CustomerInsightsWorkflow(Workflow):
                 msg=f"Returning analysis to critic for feedback",
             )
         )
-        ctx.data["critic_iteration"] = ctx.data.get("critic_iteration", 0) + 1
         return CritiqueInsightsEvent(input=ctx.data["insights_analysis_result"])
 
     @step()
     async def critique(
         self, ctx: Context, ev: CritiqueInsightsEvent, insights_critic: FunctionCallingAgent
     ) -> AnalyzeInsightsEvent | ReportEvent:
+        loop = CriticLoop.of(ctx, "Customer insights", self.max_critic_iterations)
         result = await self.run_agent(
             ctx, insights_critic,
             f"""We are researching customer insights for this task: {ctx.data['task']}
-            Please critique this insights analysis and provide actionable feedback: {ev.input}"""
+            Please critique this insights analysis and provide actionable feedback: {loop.critique_material(ev.input)}"""
         )
         
         parser = JsonValidationHelper(CustomerReportCritique, Settings.llm)
         parsed_response = await parser.validate_and_fix(result.response.message.content)
         
         if parsed_response and parsed_response.satisfied:
+            loop.finish("critic_satisfied")
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Insights critic",
@@ -257,6 +261,7 @@ class CustomerInsightsWorkflow(Workflow):
             
             # Save all research data
             reddit_search_results = '\n'.join(ctx.data.get('reddit_search_results', []))
+            sources = extract_urls(ctx.data.get('reddit_search_results', []))
             write_file(
                 content=dedent(f"""
                     # Customer Insights Analysis
@@ -272,9 +277,9 @@ class CustomerInsightsWorkflow(Workflow):
                     {ctx.data["insights_analysis_result"]}
                     
                     ### Sources
-                    {ctx.data.get('sources', [])}
+                    {sources}
                 """),
-                file_name="customer_insights_report.txt",
+                file_name=self.report_file,
                 session_id=self.session_id,
             )
             
@@ -348,9 +353,8 @@ class CustomerInsightsWorkflow(Workflow):
             num_queries=num_queries
         )
         
-        output = await Settings.llm.acomplete(prompt)
-        validator = JsonValidationHelper(CustomerSearchQueries, Settings.llm)  
-        json_content = await validator.validate_and_fix(output.text)
+        validator = JsonValidationHelper(CustomerSearchQueries, Settings.llm)
+        json_content = await validator.generate(prompt)
         return json_content
 
 def create_customer_insights_workflow(
@@ -3,11 +3,11 @@ from typing import List
 from app.workflows.single import FunctionCallingAgent
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.tools import FunctionTool
-from app.engine.tools.tavily import tavily_search
+from app.engine.tools.tavily import atavily_search
 
 def create_market_analyzer(chat_history: List[ChatMessage]):
-    def search(query: str):
-        return tavily_search(
+    async def search(query: str):
+        return await atavily_search(
             query=query,
             max_results=5,
             search_depth="advanced"
@@ -15,7 +15,7 @@ def create_market_analyzer(chat_history: List[ChatMessage]):
         
     tools = [
         FunctionTool.from_defaults(
-            search,
+            async_fn=search,
             name="search",
             description="Search for market data and statistics"
         )
@@ -3,12 +3,12 @@ from typing import List
 from app.workflows.single import FunctionCallingAgent
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.tools import FunctionTool
-from app.engine.tools.tavily import tavily_search
+from app.engine.tools.tavily import atavily_search
 from app.engine.tools.web_reader import read_webpage
 
 def create_market_researcher(name_prefix: str, chat_history: List[ChatMessage], domains: List[str] | None = None):
-    def market_search(search_query: str):
-        return tavily_search(
+    async def market_search(search_query: str):
+        return await atavily_search(
             query=search_query,
             max_results=5,
             include_domains=domains,
@@ -17,7 +17,7 @@ def create_market_researcher(name_prefix: str, chat_history: List[ChatMessage],
     
     tools = [
         FunctionTool.from_defaults(
-            market_search, 
+            async_fn=market_search, 
             name="market_search", 
             description="Search for market data and statistics"
         ),
@@ -11,6 +11,9 @@ from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.prompts.base import PromptTemplate
 from app.settings import Settings
 from app.utils.json_validator import JsonValidationHelper
+from app.utils.context_packer import get_context_budget, pack_context
+from app.utils.dedup import extract_urls
+from app.workflows.critic_loop import CriticLoop
 
 from pydantic import BaseModel, Field
 
@@ -55,6 +58,9 @@ class ReportEvent(Event):
     input: str
 
 class MarketResearchWorkflow(Workflow):
+    # Research file the report is saved to in the session data directory
+    report_file = "market_report.txt"
+
     def __init__(self,
                 session_id: str,
                 chat_history: Optional[List[ChatMessage]] = None,
@@ -153,23 +159,23 @@ class MarketResearchWorkflow(Workflow):
     async def analyze(
         self, ctx: Context, ev: AnalyzeMarketEvent, market_analyzer: FunctionCallingAgent
     ) -> CritiqueAnalysisEvent | ReportEvent:
-        if ctx.data.get("critic_iteration", 0) == 0:
+        loop = CriticLoop.of(ctx, "Market research", self.max_critic_iterations)
+        if loop.draft is None:
+            research = pack_context(
+                ctx.data["task"],
+                {"Market research": ctx.data.get("market_search_results", [])},
+                token_budget=get_context_budget(market_analyzer.llm),
+            )
             prompt = dedent(f"""
                 We are researching market size and segments for this task: {ctx.data['task']}
                 
                 Here are the findings from market research:
-                {ctx.data.get('market_search_results', [])}
+                {research}
                 
                 Please analyze these findings and provide a comprehensive market analysis report.
             """)
         else:
-            prompt = dedent(f"""
-                We are researching market size and segments for this task: {ctx.data['task']}
-                
-                The critic provided this feedback on your previous analysis: {ev.input}
-                
-                Please refine the analysis based on this feedback.
-            """)
+            prompt = f"We are researching market size and segments for this task: {ctx.data['task']}\n\n" + loop.revision_request(ev.input)
             
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -178,14 +184,14 @@ class MarketResearchWorkflow(Workflow):
             )
         )
         result = await self.run_agent(ctx, market_analyzer, prompt)
-        ctx.data["market_analysis_result"] = result.response.message.content
+        ctx.data["market_analysis_result"] = loop.add_draft(result.response.message.content)
         
-        # If we have reached the max number of critic iterations, return the final analysis to the reporter
-        if ctx.data.get("critic_iteration", 0) >= self.max_critic_iterations:
+        # Once the critic has been asked enough times, the drafts converged or the time budget is spent, return the final analysis to the reporter
+        if loop.should_stop():
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Market analyzer",
-                    msg=f"Reached max critic iterations, returning final analysis to reporter",
+                    msg=f"{loop.describe()}, returning final analysis to reporter",
                 )
             )
             return ReportEvent(input=ctx.data["market_analysis_result"])
@@ -197,23 +203,24 @@ class MarketResearchWorkflow(Workflow):
                 msg=f"Returning analysis to critic for feedback",
             )
         )
-        ctx.data["critic_iteration"] = ctx.data.get("critic_iteration", 0) + 1
         return CritiqueAnalysisEvent(input=ctx.data["market_analysis_result"])
 
     @step()
     async def critique(
         self, ctx: Context, ev: CritiqueAnalysisEvent, market_critic: FunctionCallingAgent
     ) -> AnalyzeMarketEvent | ReportEvent:
+        loop = CriticLoop.of(ctx, "Market research", self.max_critic_iterations)
         result = await self.run_agent(
             ctx, market_critic,
             f"""We are researching market size and segments for this task: {ctx.data['task']}
-            Please critique this market analysis and provide actionable feedback: {ev.input}"""
+            Please critique this market analysis and provide actionable feedback: {loop.critique_material(ev.input)}"""
         )
         
         parser = JsonValidationHelper(MarketReportCritique, Settings.llm)
         parsed_response = await parser.validate_and_fix(result.response.message.content)
         
         if parsed_response and parsed_response.satisfied:
+            loop.finish("critic_satisfied")
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Market critic",
@@ -243,6 +250,7 @@ class MarketResearchWorkflow(Workflow):
             )
             
             # Save all research data
+            sources = extract_urls(ctx.data.get('market_search_results', []))
             write_file(
                 content=dedent(f"""
                     # Market Research Analysis
@@ -258,9 +266,9 @@ class MarketResearchWorkflow(Workflow):
                     {ctx.data["market_analysis_result"]}
                     
                     ### Sources
-                    {ctx.data.get('sources', [])}
+                    {sources}
                 """),
-                file_name="market_report.txt",
+                file_name=self.report_file,
                 session_id=self.session_id,
             )
             
@@ -332,9 +340,8 @@ class MarketResearchWorkflow(Workflow):
             num_queries=num_queries
         )
         
-        output = await Settings.llm.acomplete(prompt)
-        validator = JsonValidationHelper(MarketSearchQueries, Settings.llm)  
-        json_content = await validator.validate_and_fix(output.text)
+        validator = JsonValidationHelper(MarketSearchQueries, Settings.llm)
+        json_content = await validator.generate(prompt)
         return json_content
 
 def create_market_research_workflow(
@@ -3,11 +3,11 @@ from typing import List
 from app.workflows.single import FunctionCallingAgent
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.tools import FunctionTool
-from app.engine.tools.tavily import tavily_search
+from app.engine.tools.tavily import atavily_search
 
 def create_domain_researcher(name_prefix: str, chat_history: List[ChatMessage], domain: str):
-    def domain_specific_search(search_query: str):
-        return tavily_search(
+    async def domain_specific_search(search_query: str):
+        return await atavily_search(
             query=search_query,
             max_results=10,
             include_domains=[domain]
@@ -15,7 +15,7 @@ def create_domain_researcher(name_prefix: str, chat_history: List[ChatMessage],
     
     tools = [
         FunctionTool.from_defaults(
-            domain_specific_search, 
+            async_fn=domain_specific_search, 
             name="domain_search", 
             description=f"Search for content specifically on {domain}"
         ),
@@ -3,19 +3,19 @@ from typing import List
 from app.workflows.single import FunctionCallingAgent
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.tools import FunctionTool
-from app.engine.tools.tavily import tavily_search
+from app.engine.tools.tavily import atavily_search
 from app.engine.tools.web_reader import read_webpage
 
 def create_web_researcher(name_prefix: str, chat_history: List[ChatMessage], domains: List[str] | None = None):
-    def trend_search(search_query: str):
-        return tavily_search(
+    async def trend_search(search_query: str):
+        return await atavily_search(
             query=search_query,
             max_results=5,
             include_domains=domains
         )
     
     tools = [
-        FunctionTool.from_defaults(trend_search, name="trend_search", description="Search the web for information about trends"),
+        FunctionTool.from_defaults(async_fn=trend_search, name="trend_search", description="Search the web for information about trends"),
         FunctionTool.from_defaults(async_fn=read_webpage, name="read_webpage", description="Read and extract content from a webpage"),
     ]
 
@@ -13,6 +13,9 @@ from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.prompts.base import PromptTemplate
 from app.settings import Settings
 from app.utils.json_validator import JsonValidationHelper
+from app.utils.context_packer import get_context_budget, pack_context
+from app.utils.dedup import extract_urls
+from app.workflows.critic_loop import CriticLoop
 
 from pydantic import BaseModel, Field
 from typing import List
@@ -72,6 +75,9 @@ class ReportEvent(Event):
     input: str
 
 class OnlineTrendsWorkflow(Workflow):
+    # Research file the report is saved to in the session data directory
+    report_file = "trend_report.txt"
+
     def __init__(self,
                 session_id: str,
                 chat_history: Optional[List[ChatMessage]] = None,
@@ -221,26 +227,26 @@ class OnlineTrendsWorkflow(Workflow):
     async def analyze(
         self, ctx: Context, ev: AnalyzeTrendsEvent, trend_analyzer: FunctionCallingAgent
     ) -> CritiqueTrendsEvent | ReportEvent:
-        if ctx.data.get("critic_iteration", 0) == 0:
+        loop = CriticLoop.of(ctx, "Online trends", self.max_critic_iterations)
+        if loop.draft is None:
+            research = pack_context(
+                ctx.data["task"],
+                {
+                    "Web searches across the web, reddit and trendhunter": ctx.data.get("web_search_results", []),
+                    "Content trends across domains like youtube and tiktok": ctx.data.get("domain_search_results", []),
+                },
+                token_budget=get_context_budget(trend_analyzer.llm),
+            )
             prompt = dedent(f"""
                 We are researching trends for this task: {ctx.data['task']}
                 
-                Here are the findings from web searches across the web, reddit and trendhunter:
-                {ctx.data.get('web_search_results', [])}
-                
-                Here are the findings from content trends across domains like youtube and tiktok:
-                {ctx.data.get('domain_search_results', [])}
+                Here are the findings from web searches and content trends across domains:
+                {research}
                 
                 Please analyze these findings and provide a comprehensive trend analysis report.
             """)
         else:
-            prompt = dedent(f"""
-                We are researching trends for this task: {ctx.data['task']}
-                
-                The critic provided this feedback on your previous analysis: {ev.input}
-                
-                Please refine the analysis based on this feedback.
-            """)
+            prompt = f"We are researching trends for this task: {ctx.data['task']}\n\n" + loop.revision_request(ev.input)
             
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -249,14 +255,14 @@ class OnlineTrendsWorkflow(Workflow):
             )
         )
         result = await self.run_agent(ctx, trend_analyzer, prompt)
-        ctx.data["trend_analysis_result"] = result.response.message.content
+        ctx.data["trend_analysis_result"] = loop.add_draft(result.response.message.content)
         
-        # If we have reached the max number of critic iterations, return the final analysis to the reporter
-        if ctx.data.get("critic_iteration", 0) >= self.max_critic_iterations:
+        # Once the critic has been asked enough times, the drafts converged or the time budget is spent, return the final analysis to the reporter
+        if loop.should_stop():
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Trend analyzer",
-                    msg=f"Reached max critic iterations, returning final analysis to reporter",
+                    msg=f"{loop.describe()}, returning final analysis to reporter",
                 )
             )
             return ReportEvent(input=ctx.data["trend_analysis_result"])
@@ -268,23 +274,24 @@ class OnlineTrendsWorkflow(Workflow):
                 msg=f"Returning analysis to critic for feedback",
             )
         )
-        ctx.data["critic_iteration"] = ctx.data.get("critic_iteration", 0) + 1
         return CritiqueTrendsEvent(input=ctx.data["trend_analysis_result"])
 
     @step()
     async def critique(
         self, ctx: Context, ev: CritiqueTrendsEvent, trend_critic: FunctionCallingAgent
     ) -> AnalyzeTrendsEvent | ReportEvent:
+        loop = CriticLoop.of(ctx, "Online trends", self.max_critic_iterations)
         result = await self.run_agent(
             ctx, trend_critic,
             f"""We are researching trends for this task: {ctx.data['task']}
-            Please critique this trend analysis and provide actionable feedback: {ev.input}"""
+            Please critique this trend analysis and provide actionable feedback: {loop.critique_material(ev.input)}"""
         )
         
         parser = JsonValidationHelper(TrendReportCritique, Settings.llm)
         parsed_response = await parser.validate_and_fix(result.response.message.content)
         
         if parsed_response and parsed_response.satisfied:
+            loop.finish("critic_satisfied")
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Trend critic",
@@ -316,6 +323,7 @@ class OnlineTrendsWorkflow(Workflow):
             # Save all research data
             web_search_results = '\n'.join(ctx.data.get('web_search_results', []))
             domain_search_results = '\n'.join(ctx.data.get('domain_search_results', []))
+            sources = extract_urls(ctx.data.get('web_search_results', []) + ctx.data.get('domain_search_results', []))
             write_file(
                 content=dedent(f"""
                     # Online Trends Analysis
@@ -334,9 +342,9 @@ class OnlineTrendsWorkflow(Workflow):
                     {ctx.data["trend_analysis_result"]}
                     
                     ### Sources
-                    {ctx.data.get('sources', [])}
+                    {sources}
                 """),
-                file_name="trend_report.txt",
+                file_name=self.report_file,
                 session_id=self.session_id,
             )
             
@@ -423,9 +431,8 @@ class OnlineTrendsWorkflow(Workflow):
             num_queries=num_queries
         )
         
-        output = await Settings.llm.acomplete(prompt)
-        validator = JsonValidationHelper(TrendSearchQueries, Settings.llm)  
-        json_content = await validator.validate_and_fix(output.text)
+        validator = JsonValidationHelper(TrendSearchQueries, Settings.llm)
+        json_content = await validator.generate(prompt)
         return json_content
 
 def create_online_trends_workflow(
@@ -1,12 +1,15 @@
 from textwrap import dedent
 from typing import List, Optional
-from pathlib import Path
 from app.agents.stage_6_output_production.executive_summarizer.analyzer import create_analyzer
 from llama_index.core.workflow import Context, Event, StartEvent, StopEvent, Workflow, step
 from llama_index.core.chat_engine.types import ChatMessage
 from app.workflows.single import AgentRunEvent, AgentRunResult, FunctionCallingAgent
 from app.settings import Settings
 from app.utils.json_validator import JsonValidationHelper
+from app.utils.context_packer import pack_context
+from app.utils.research_corpus import load_research_corpus
+from app.workflows.research_feed import ResearchFeed, ResearchSection
+from app.workflows.critic_loop import CriticLoop
 from .models import ExecutiveSummaryOutline, ExecutiveCritique
 import logging
 from .outline_writer import create_outline_writer
@@ -45,35 +48,41 @@ class ExecutiveSummaryWorkflow(Workflow):
     async def start(self, ctx: Context, ev: StartEvent) -> GenerateOutlineEvent:
         ctx.data["task"] = ev.input
         
-        # Read all research files from data/<session_id> directory
-        current_file = Path(__file__)
-        data_dir = current_file.parent.parent.parent.parent.parent / "data" / self.session_id
-        research_files = list(data_dir.glob("**/*"))
+        # Pipelined mode, the research sections are briefed as they land instead of read at once
+        research_feed: Optional[ResearchFeed] = ev.get("research_feed")
+        if research_feed is not None:
+            ctx.data["research_feed"] = research_feed
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name="Executive Summary Workflow",
+                    msg=f"Briefing research sections as they land, {len(research_feed.sections)} of {research_feed.expected} available"
+                )
+            )
+            return GenerateOutlineEvent()
         
-        research_content = []
-        for file in research_files:
-            if file.is_file():
-                with open(file, "r") as f:
-                    content = f.read()
-                    research_content.append(f"=== {file.name} ===\n\n{content}\n\n")
+        # Read all research files from data/<session_id> directory, shared with the podcaster
+        corpus = await load_research_corpus(self.session_id)
         
-        research = dedent("\n".join(research_content))
-        ctx.data["research"] = research
+        # The outline writer and the analyzer both get the research, pack it into the context budget once
+        ctx.data["research"] = pack_context(ctx.data["task"], corpus.as_dict())
         
         ctx.write_event_to_stream(
             AgentRunEvent(
                 name="Executive Summary Workflow",
-                msg=f"Reading research from {data_dir}, found {len(research_files)} files"
+                msg=f"Reading research from {corpus.data_dir}, found {len(corpus.documents)} files"
             )
         )
         
-        if len(research_files) == 0:
+        if len(corpus.documents) == 0:
             return StopEvent(result="No research files found")
         
         return GenerateOutlineEvent()
 
     @step()
-    async def generate_outline(self, ctx: Context, ev: GenerateOutlineEvent, outline_writer: FunctionCallingAgent) -> AnalyzeContentEvent:
+    async def generate_outline(self, ctx: Context, ev: GenerateOutlineEvent, outline_writer: FunctionCallingAgent) -> AnalyzeContentEvent | StopEvent:
+        if ctx.data.get("research_feed") is not None:
+            return await self.generate_outline_pipelined(ctx, outline_writer, ctx.data["research_feed"])
+        
         prompt = dedent(f"""
             Generate an executive summary outline based on the following research done by 4 other junior analysts:
             {ctx.data["research"]}
@@ -89,21 +98,30 @@ class ExecutiveSummaryWorkflow(Workflow):
         result = await self.run_agent(ctx, outline_writer, prompt)
         validator = JsonValidationHelper(ExecutiveSummaryOutline, Settings.llm)
         outline = await validator.validate_and_fix(result.response.message.content)
-        
+        if outline is None:
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name=outline_writer.name,
+                    msg="Could not generate a valid executive summary outline",
+                )
+            )
+            return StopEvent(result="Failed to generate the executive summary outline")
+
         ctx.write_event_to_stream(
             AgentRunEvent(
                 name=outline_writer.name,
                 msg=f"Generated executive summary outline:\n{outline.model_dump_json(indent=2)}\nPassing to analyzer"
             )
         )
-        
+
         return AnalyzeContentEvent(analysis=result.response.message.content)
 
     @step()
     async def analyze(
         self, ctx: Context, ev: AnalyzeContentEvent, analyzer: FunctionCallingAgent
     ) -> CritiqueAnalysisEvent | GenerateReportEvent:
-        if ctx.data.get("critic_iteration", 0) == 0:
+        loop = CriticLoop.of(ctx, "Executive summary", self.max_iterations)
+        if loop.draft is None:
             prompt = dedent(f"""
                 Here is the executive summary outline and the research data to analyze:
                 
@@ -116,11 +134,7 @@ class ExecutiveSummaryWorkflow(Workflow):
                 Please analyze this data and provide a comprehensive executive summary analysis.
             """)
         else:
-            prompt = dedent(f"""
-                The critic provided this feedback on your previous analysis: {ev.analysis}
-                
-                Please refine the analysis based on this feedback.
-            """)
+            prompt = loop.revision_request(ev.analysis)
             
         ctx.write_event_to_stream(
             AgentRunEvent(
@@ -129,14 +143,14 @@ class ExecutiveSummaryWorkflow(Workflow):
             )
         )
         result = await self.run_agent(ctx, analyzer, prompt)
-        ctx.data["analysis_result"] = result.response.message.content
+        ctx.data["analysis_result"] = loop.add_draft(result.response.message.content)
         
-        # If we have reached the max number of critic iterations, return the final analysis to the reporter
-        if ctx.data.get("critic_iteration", 0) >= self.max_iterations:
+        # Once the critic has been asked enough times, the drafts converged or the time budget is spent, return the final analysis to the reporter
+        if loop.should_stop():
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Executive analyzer",
-                    msg=f"Reached max critic iterations, returning final analysis to reporter",
+                    msg=f"{loop.describe()}, returning final analysis to reporter",
                 )
             )
             return GenerateReportEvent(analysis=ctx.data["analysis_result"])
@@ -148,22 +162,23 @@ class ExecutiveSummaryWorkflow(Workflow):
                 msg=f"Returning analysis to critic for feedback",
             )
         )
-        ctx.data["critic_iteration"] = ctx.data.get("critic_iteration", 0) + 1
         return CritiqueAnalysisEvent(analysis=ctx.data["analysis_result"])
 
     @step()
     async def critique(
         self, ctx: Context, ev: CritiqueAnalysisEvent, critic: FunctionCallingAgent
     ) -> AnalyzeContentEvent | GenerateReportEvent:
+        loop = CriticLoop.of(ctx, "Executive summary", self.max_iterations)
         result = await self.run_agent(
             ctx, critic,
-            f"""Please critique this executive summary analysis and provide actionable feedback: {ev.analysis}"""
+            f"""Please critique this executive summary analysis and provide actionable feedback: {loop.critique_material(ev.analysis)}"""
         )
         
         parser = JsonValidationHelper(ExecutiveCritique, Settings.llm)
         parsed_response = await parser.validate_and_fix(result.response.message.content)
         
         if parsed_response and parsed_response.satisfied:
+            loop.finish("critic_satisfied")
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Executive critic",
@@ -205,6 +220,65 @@ class ExecutiveSummaryWorkflow(Workflow):
         
         return StopEvent(result=result.response.message.content)
 
+    async def generate_outline_pipelined(self, ctx: Context, outline_writer: FunctionCallingAgent, research_feed: ResearchFeed) -> AnalyzeContentEvent | StopEvent:
+        '''
+        Brief each research section into a partial outline as soon as it lands, then synthesize the final
+        outline from the briefs once all research is in, instead of from the whole research at once
+        '''
+        validator = JsonValidationHelper(ExecutiveSummaryOutline, Settings.llm)
+        
+        async def brief(section: ResearchSection) -> Optional[ExecutiveSummaryOutline]:
+            if not section.files:
+                return None
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name=outline_writer.name,
+                    msg=f"Briefing {section.name} research for the executive summary outline",
+                )
+            )
+            research = pack_context(ctx.data["task"], section.files)
+            result = await self.run_agent(ctx, outline_writer, dedent(f"""
+                Generate an executive summary outline based on the following research done by one of the junior analysts ({section.name}), the other analysts are still working:
+                {research}
+            """))
+            return await validator.validate_and_fix(result.response.message.content)
+        
+        briefs = await research_feed.map("executive_summary", brief)
+        if not research_feed.research():
+            return StopEvent(result="No research files found")
+        
+        # The final synthesis only has to merge the briefs, the analyzer still gets the full packed research
+        ctx.data["research"] = pack_context(ctx.data["task"], research_feed.research())
+        briefs_json = "\n\n".join(brief.model_dump_json(indent=2) for brief in briefs if brief is not None)
+        ctx.write_event_to_stream(
+            AgentRunEvent(
+                name=outline_writer.name,
+                msg=f"All research landed, synthesizing the executive summary outline from {len(briefs)} section briefs",
+            )
+        )
+        result = await self.run_agent(ctx, outline_writer, dedent(f"""
+            All junior analysts are done. Combine the outlines you generated for each of their research sections into one cohesive executive summary outline, linking the findings into a single story:
+            {briefs_json}
+        """))
+        outline = await validator.validate_and_fix(result.response.message.content)
+        if outline is None:
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name=outline_writer.name,
+                    msg="Could not synthesize a valid executive summary outline from the section briefs",
+                )
+            )
+            return StopEvent(result="Failed to generate the executive summary outline")
+        
+        ctx.write_event_to_stream(
+            AgentRunEvent(
+                name=outline_writer.name,
+                msg=f"Generated executive summary outline:\n{outline.model_dump_json(indent=2)}\nPassing to analyzer"
+            )
+        )
+        
+        return AnalyzeContentEvent(analysis=result.response.message.content)
+
     async def run_agent(self, ctx: Context, agent: FunctionCallingAgent, input: str) -> AgentRunResult:
         try:
             handler = agent.run(input=input, streaming=False)
@@ -6,10 +6,13 @@ from llama_index.core.chat_engine.types import ChatMessage
 from app.workflows.single import AgentRunEvent, AgentRunResult, FunctionCallingAgent
 from app.settings import Settings
 from app.utils.json_validator import JsonValidationHelper
+from app.utils.research_corpus import load_research_corpus
+from app.workflows.research_feed import ResearchFeed, ResearchSection
+from app.workflows.critic_loop import CriticLoop
 from .models import PodcastOutline, PodcastScript, ScriptCritique
-from pathlib import Path
 import json
 import logging
+import os
 from .outline_writer import create_outline_writer
 from .script_writer import create_script_writer
 from .script_critic import create_script_critic
@@ -46,29 +49,30 @@ class PodcastWorkflow(Workflow):
     async def start(self, ctx: Context, ev: StartEvent) -> GenerateOutlineEvent:
         ctx.data["task"] = ev.input
         
-        # Read all research files from data/<session_id> directory
-        current_file = Path(__file__)
-        data_dir = current_file.parent.parent.parent.parent.parent / "data" / self.session_id
-        research_files = list(data_dir.glob("**/*"))
-        
-        research_content = []
-        for file in research_files:
-            if file.is_file():
-                with open(file, "r") as f:
-                    content = f.read()
-                    research_content.append(f"=== {file.name} ===\n\n{content}\n\n")
+        # Pipelined mode, the research sections are outlined as they land instead of read at once
+        research_feed: Optional[ResearchFeed] = ev.get("research_feed")
+        if research_feed is not None:
+            ctx.data["research_feed"] = research_feed
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name="Podcast Workflow",
+                    msg=f"Outlining research sections as they land, {len(research_feed.sections)} of {research_feed.expected} available"
+                )
+            )
+            return GenerateOutlineEvent()
         
-        research = dedent("\n".join(research_content))
-        ctx.data["research"] = research
+        # Read all research files from data/<session_id> directory, shared with the executive summarizer
+        corpus = await load_research_corpus(self.session_id)
+        ctx.data["research"] = corpus.render()
         
         ctx.write_event_to_stream(
             AgentRunEvent(
                 name="Podcast Workflow",
-                msg=f"Reading research from {data_dir}, found {len(research_files)} files which are {[research_file.name for research_file in research_files]}"
+                msg=f"Reading research from {corpus.data_dir}, found {len(corpus.documents)} files which are {corpus.file_names}"
             )
         )
         
-        if len(research_files) == 0:
+        if len(corpus.documents) == 0:
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Podcast Workflow",
@@ -80,10 +84,15 @@ class PodcastWorkflow(Workflow):
         return GenerateOutlineEvent()
 
     @step()
-    async def generate_outline(self, ctx: Context, ev: GenerateOutlineEvent, outline_writer: FunctionCallingAgent) -> WriteScriptEvent:
-        result = await self.run_agent(ctx, outline_writer, ctx.data["research"])
+    async def generate_outline(self, ctx: Context, ev: GenerateOutlineEvent, outline_writer: FunctionCallingAgent) -> WriteScriptEvent | StopEvent:
         validator = JsonValidationHelper(PodcastOutline, Settings.llm)
-        outline = await validator.validate_and_fix(result.response.message.content)     
+        if ctx.data.get("research_feed") is not None:
+            outline = await self.generate_outline_pipelined(ctx, outline_writer, ctx.data["research_feed"])
+            if outline is None:
+                return StopEvent()
+        else:
+            result = await self.run_agent(ctx, outline_writer, ctx.data["research"])
+            outline = await validator.validate_and_fix(result.response.message.content)     
         ctx.write_event_to_stream(
             AgentRunEvent(
                 name=outline_writer.name,
@@ -116,35 +125,50 @@ class PodcastWorkflow(Workflow):
             )
         )
         
-        if ctx.data.get("critique_iteration", 0) >= self.max_iterations:
+        # The script is JSON and always rewritten in full, the critic still only reviews what changed
+        loop = CriticLoop.of(ctx, "Podcast script", self.max_iterations, section_revisions=False)
+        loop.add_draft(script.model_dump_json(indent=2))
+        if loop.should_stop():
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name="Podcast Workflow",
-                    msg="Reached maximum critique iterations, passing to podcast generator to generate audio"
+                    msg=f"{loop.describe()}, passing to podcast generator to generate audio"
                 )
             )
             return GenerateAudioEvent(script=script)
         
-        ctx.data["critique_iteration"] = ctx.data.get("critique_iteration", 0) + 1
         ctx.write_event_to_stream(
             AgentRunEvent(
                 name="Podcast Workflow",
-                msg=f"Asking for critique of the script, iteration {ctx.data['critique_iteration']} of {self.max_iterations}"
+                msg=f"Asking for critique of the script, iteration {loop.iteration} of {self.max_iterations}"
             )
         )
         return CritiqueScriptEvent(script=script)
 
     @step()
     async def critique_script(self, ctx: Context, ev: CritiqueScriptEvent, script_critic: FunctionCallingAgent) -> ReviseScriptEvent | GenerateAudioEvent:
+        loop = CriticLoop.of(ctx, "Podcast script", self.max_iterations, section_revisions=False)
         prompt = dedent(f"""
             Here is the podcast script, critique it:
-            {ev.script.model_dump_json(indent=2)}
+            {loop.critique_material(ev.script.model_dump_json(indent=2))}
         """)
         result = await self.run_agent(ctx, script_critic, prompt)
         validator = JsonValidationHelper(ScriptCritique, Settings.llm)
         critique = await validator.validate_and_fix(result.response.message.content)
-        
+
+        if critique is None:
+            # Without a valid critique there is nothing to revise against, keep the current script
+            loop.finish("invalid_critique")
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name=script_critic.name,
+                    msg="Could not parse the script critique, passing the current script to the podcast generator"
+                )
+            )
+            return GenerateAudioEvent(script=ev.script)
+
         if critique.satisfied:
+            loop.finish("critic_satisfied")
             ctx.write_event_to_stream(
                 AgentRunEvent(
                     name=script_critic.name,
@@ -174,7 +198,22 @@ class PodcastWorkflow(Workflow):
                 )
             )
             
-            output_path = elevenlabs_generator.generate_podcast(segments, filename=ctx.data["podcast_title"], session_id=self.session_id)
+            def on_stream_ready(playlist_url: str) -> None:
+                ctx.write_event_to_stream(
+                    AgentRunEvent(
+                        name="Podcast Generator",
+                        msg=f"Podcast is streaming at: {playlist_url}, the rest of the episode is added as it is synthesized"
+                    )
+                )
+            
+            # Progressive mode publishes a playable HLS stream while the rest is still being synthesized
+            progressive = os.getenv("PODCAST_STREAMING", "true").lower() == "true"
+            output_path = await elevenlabs_generator.agenerate_podcast(
+                segments,
+                filename=ctx.data["podcast_title"],
+                session_id=self.session_id,
+                on_stream_ready=on_stream_ready if progressive else None,
+            )
             
             ctx.write_event_to_stream(
                 AgentRunEvent(
@@ -189,6 +228,53 @@ class PodcastWorkflow(Workflow):
             logger.error(f"Error generating audio: {str(e)}")
             raise
         
+    async def generate_outline_pipelined(self, ctx: Context, outline_writer: FunctionCallingAgent, research_feed: ResearchFeed) -> Optional[PodcastOutline]:
+        '''
+        Outline the segments of each research section as soon as it lands, then synthesize the final
+        outline from the section outlines once all research is in
+        '''
+        validator = JsonValidationHelper(PodcastOutline, Settings.llm)
+        
+        async def brief(section: ResearchSection) -> Optional[PodcastOutline]:
+            if not section.files:
+                return None
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name=outline_writer.name,
+                    msg=f"Outlining podcast segments for the {section.name} research"
+                )
+            )
+            research = "\n".join(f"=== {file_name} ===\n\n{content}\n\n" for file_name, content in section.files.items())
+            result = await self.run_agent(ctx, outline_writer, dedent(f"""
+                This is the research of one section ({section.name}), the rest of the research is still in progress. Outline the podcast segments for this section:
+                {research}
+            """))
+            return await validator.validate_and_fix(result.response.message.content)
+        
+        briefs = await research_feed.map("podcast", brief)
+        briefs = [brief for brief in briefs if brief is not None]
+        if not briefs:
+            ctx.write_event_to_stream(
+                AgentRunEvent(
+                    name="Podcast Workflow",
+                    msg="No research files found, skipping outline generation"
+                )
+            )
+            return None
+        
+        ctx.write_event_to_stream(
+            AgentRunEvent(
+                name=outline_writer.name,
+                msg=f"All research landed, synthesizing the podcast outline from {len(briefs)} section outlines"
+            )
+        )
+        briefs_json = "\n\n".join(brief.model_dump_json(indent=2) for brief in briefs)
+        result = await self.run_agent(ctx, outline_writer, dedent(f"""
+            All the research is done. Combine the outlines you wrote for each research section into the final podcast outline, following the proven structure with a single title and hook:
+            {briefs_json}
+        """))
+        return await validator.validate_and_fix(result.response.message.content)
+
     async def run_agent(self, ctx: Context, agent: FunctionCallingAgent, input: str) -> AgentRunResult:
         try:
             handler = agent.run(input=input, streaming=False)
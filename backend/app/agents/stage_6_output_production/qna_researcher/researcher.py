@@ -1,24 +1,13 @@
 from typing import List
 from textwrap import dedent
-from llama_index.core import VectorStoreIndex, Document, SimpleDirectoryReader
+from llama_index.core import VectorStoreIndex
 from llama_index.core.tools import QueryEngineTool, ToolMetadata, FunctionTool
 from llama_index.core.chat_engine.types import ChatMessage
-from app.utils.paths import get_session_data_path
+from app.engine.session_index import get_session_index_store
 from app.workflows.single import FunctionCallingAgent
-from app.engine.tools.tavily import tavily_qna_search
+from app.engine.tools.tavily import atavily_qna_search
 
-def _load_documents(session_id: str) -> List[Document]:
-    research_path = get_session_data_path(session_id)
-    print(research_path)
-    if not research_path.exists():
-        raise ValueError(f"No research data found for session {session_id}")
-        
-    return SimpleDirectoryReader(
-        input_dir=str(research_path)
-    ).load_data()
-
-def _create_query_tools(documents: List[Document]) -> List[QueryEngineTool]:
-    index = VectorStoreIndex.from_documents(documents)
+def _create_query_tools(index: VectorStoreIndex) -> List[QueryEngineTool]:
     return [
         QueryEngineTool(
             query_engine=index.as_query_engine(),
@@ -27,14 +16,14 @@ def _create_query_tools(documents: List[Document]) -> List[QueryEngineTool]:
                 description="ALWAYS TRY THIS FIRST. Contains information from all research documents, use this tool as a search engine to find answers based on the research done"
             )
         ),
-        FunctionTool.from_defaults(tavily_qna_search, description="Ask a question to the web, it returns a detailed answer"),
+        FunctionTool.from_defaults(async_fn=atavily_qna_search, name="tavily_qna_search", description="Ask a question to the web, it returns a detailed answer"),
     ]
 
-def create_researcher(session_id: str, chat_history: List[ChatMessage], email: str) -> FunctionCallingAgent:
-    documents = _load_documents(session_id)
-    print(f"Loaded {len(documents)} documents")
+async def create_researcher(session_id: str, chat_history: List[ChatMessage], email: str) -> FunctionCallingAgent:
+    # The session index is persisted and cached, only files changed since the last question are embedded
+    index = await get_session_index_store().refresh(session_id)
     
-    query_tools = _create_query_tools(documents)
+    query_tools = _create_query_tools(index)
     
     system_prompt = dedent("""
         You are a research assistant helping users understand the research conducted by other agents.
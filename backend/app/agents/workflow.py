@@ -8,6 +8,7 @@ from app.workflows.single import AgentRunEvent, AgentRunResult, FunctionCallingA
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.prompts import PromptTemplate
 from llama_index.core.settings import Settings
+from app.engine.llm_cache import acomplete
 from llama_index.core.workflow import (
     Context,
     Event,
@@ -109,7 +110,7 @@ class FinancialReportWorkflow(Workflow):
         )
         prompt = prompt_template.format(chat_history=chat_history_str, input=input)
 
-        output = await Settings.llm.acomplete(prompt)
+        output = await acomplete(Settings.llm, prompt)
         decision = output.text.strip().lower()
 
         return "publish" if decision == "publish" else "research"
@@ -3,8 +3,10 @@ import logging
 from app.api.routers.models import (
     ChatData,
 )
-from app.api.routers.vercel_response import VercelStreamResponse
+from app.api.routers.vercel_response import DetachedRunStreamResponse, VercelStreamResponse
+from app.api.services.runs import get_run_registry
 from app.engine.engine import get_chat_engine
+from app.engine.llm_scheduler import Priority, llm_priority
 from app.agents.stage_6_output_production import create_researcher
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, status
 
@@ -30,15 +32,50 @@ async def chat(
         params = data.data or {}
         logger.info(f"Email: {data.email}")
         logger.info(f"Session ID: {data.sessionId}")
-        engine = get_chat_engine(session_id=data.sessionId, chat_history=messages, email=data.email, params=params, mode="prod")
 
-        event_handler = engine.run(input=last_message_content, streaming=True)
-        return VercelStreamResponse(
-            request=request,
-            chat_data=data,
-            event_handler=event_handler,
-            events=engine.stream_events(),
+        registry = get_run_registry()
+        run = registry.get(data.sessionId) if registry is not None else None
+        if run is not None and run.running:
+            if run.input != last_message_content:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Research run {run.run_id} of session {data.sessionId} is still running, wait for it or cancel it",
+                )
+            # E.g. the client retried the request, follow the run instead of starting the research again
+            logger.info(f"Attaching to the running research run {run.run_id}")
+            return DetachedRunStreamResponse(request=request, run=run)
+
+        engine = get_chat_engine(
+            session_id=data.sessionId,
+            chat_history=messages,
+            email=data.email,
+            params=params,
+            mode="prod",
+            resume=bool(params.get("resume", False)),
         )
+
+        # The research pipeline runs in the background, yield to interactive Q&A
+        with llm_priority(Priority.BACKGROUND):
+            event_handler = engine.run(input=last_message_content, streaming=True)
+        events = engine.stream_events()
+        if registry is None:
+            return VercelStreamResponse(
+                request=request,
+                chat_data=data,
+                event_handler=event_handler,
+                events=events,
+            )
+
+        # Run in the background so the research survives the client disconnecting
+        run = registry.start(
+            data.sessionId,
+            lambda run: VercelStreamResponse.produce(run, data, event_handler, events),
+            on_cancel=event_handler.cancel_run,
+            input=last_message_content,
+        )
+        return DetachedRunStreamResponse(request=request, run=run)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Error in chat engine", exc_info=True)
         raise HTTPException(
@@ -46,18 +83,56 @@ async def chat(
             detail=f"Error in chat engine: {e}",
         ) from e
 
+def _get_run(session_id: str):
+    registry = get_run_registry()
+    run = registry.get(session_id) if registry is not None else None
+    if run is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No research run for session {session_id}",
+        )
+    return run
+
+
+@r.get("/runs/{session_id}")
+async def run_status(session_id: str):
+    """
+    Status of the session's research run and the range of cursors that can still be replayed.
+    """
+    return _get_run(session_id).summary()
+
+
+@r.get("/runs/{session_id}/stream")
+async def follow_run(request: Request, session_id: str, cursor: int = 0):
+    """
+    Reconnect to the session's research run, replaying the stream from `cursor` (the cursor of the last received `run` item).
+    """
+    return DetachedRunStreamResponse(request=request, run=_get_run(session_id), cursor=cursor)
+
+
+@r.delete("/runs/{session_id}")
+async def cancel_run(session_id: str):
+    """
+    Stop the session's research run, runs are no longer stopped by the client disconnecting.
+    """
+    run = _get_run(session_id)
+    await run.cancel()
+    return run.summary()
+
+
 @r.post("/qna")
 async def research_qna(
     request: Request,
     data: ChatData,
 ):
     try:
-        agent = create_researcher(session_id=data.sessionId, chat_history=data.get_history_messages(include_agent_messages=True), email=data.email)
+        agent = await create_researcher(session_id=data.sessionId, chat_history=data.get_history_messages(include_agent_messages=True), email=data.email)
         
-        event_handler = agent.run(
-            input=data.get_last_message_content(),
-            streaming=True
-        )
+        with llm_priority(Priority.INTERACTIVE):
+            event_handler = agent.run(
+                input=data.get_last_message_content(),
+                streaming=True
+            )
         
         return VercelStreamResponse(
             request=request,
@@ -0,0 +1,72 @@
+from fastapi import APIRouter
+from llama_index.core.settings import Settings
+
+from app.engine.embedding_cache import CachedEmbedding
+from app.engine.llm_cache import get_llm_cache
+from app.engine.llm_scheduler import scheduler_stats
+from app.engine.tools.page_cache import get_page_cache
+from app.engine.tools.search_cache import get_search_cache
+from app.engine.tools.tts_cache import get_tts_cache
+from app.utils.job_queue import get_job_queue
+from app.utils.json_validator import structured_output_stats
+from app.workflows.critic_loop import critic_loop_stats
+
+metrics_router = r = APIRouter()
+
+
+def _cache_stats(cache):
+    if cache is None:
+        return None
+    return {**cache.stats.model_dump(), "hit_rate": cache.stats.hit_rate}
+
+
+@r.get("/cache")
+async def cache_metrics():
+    """
+    Hit/miss counters of the LLM response, search result, fetched page, embedding and TTS segment caches.
+    """
+    search_cache = get_search_cache()
+    page_cache = get_page_cache()
+    embed_model = Settings._embed_model
+    tts_cache = get_tts_cache()
+    return {
+        "llm": _cache_stats(get_llm_cache()),
+        "search": search_cache.stats() if search_cache is not None else None,
+        "pages": page_cache.stats() if page_cache is not None else None,
+        "embeddings": embed_model.stats() if isinstance(embed_model, CachedEmbedding) else None,
+        "tts": tts_cache.stats() if tts_cache is not None else None,
+    }
+
+
+@r.get("/llm")
+async def llm_scheduler_metrics():
+    """
+    Queue depth, in-flight calls and queue wait times of the LLM scheduler per provider.
+    """
+    return {"schedulers": scheduler_stats()}
+
+
+@r.get("/structured-output")
+async def structured_output_metrics():
+    """
+    How agent JSON outputs were obtained: valid as returned, repaired locally, schema constrained, or via LLM repair calls.
+    """
+    stats = structured_output_stats()
+    return {**stats.model_dump(), "llm_repairs_avoided": stats.llm_repairs_avoided}
+
+
+@r.get("/critic-loops")
+async def critic_loop_metrics():
+    """
+    Analyzer / critic loops per workflow: critiques run and saved by early stops, and draft tokens saved by targeted revisions.
+    """
+    return {name: stats.model_dump() for name, stats in critic_loop_stats().items()}
+
+
+@r.get("/jobs")
+async def job_queue_metrics():
+    """
+    Queued and running research jobs, running jobs per user and the order queued jobs will be picked up in.
+    """
+    job_queue = get_job_queue()
+    return {"jobs": job_queue.stats() if job_queue is not None else None}
@@ -3,8 +3,9 @@ import json
 import logging
 from typing import AsyncGenerator, List
 
-from aiostream import stream
 from app.api.routers.models import ChatData, Message
+from app.api.services.runs import DetachedRun
+from app.api.services.stream_batcher import StreamBatcher, default_max_delay, default_max_frame_bytes, encode_frame
 from app.api.services.suggestion import NextQuestionSuggestion
 from app.workflows.single import AgentRunEvent, AgentRunResult
 from fastapi import Request
@@ -18,8 +19,8 @@ class VercelStreamResponse(StreamingResponse):
     Base class to convert the response from the chat engine to the streaming format expected by Vercel
     """
 
-    TEXT_PREFIX = "0:"
-    DATA_PREFIX = "8:"
+    TEXT_PREFIX = StreamBatcher.TEXT_PREFIX
+    DATA_PREFIX = StreamBatcher.DATA_PREFIX
 
     def __init__(self, request: Request, chat_data: ChatData, *args, **kwargs):
         self.request = request
@@ -28,19 +29,15 @@ class VercelStreamResponse(StreamingResponse):
         super().__init__(content=content)
 
     async def content_generator(self, event_handler, events):
-        stream = self._create_stream(
-            self.request, self.chat_data, event_handler, events
+        batcher = StreamBatcher()
+        producer = asyncio.create_task(
+            self.produce(batcher, self.chat_data, event_handler, events)
         )
-        is_stream_started = False
         try:
-            async with stream.stream() as streamer:
-                async for output in streamer:
-                    if not is_stream_started:
-                        is_stream_started = True
-                        # Stream a blank message to start the stream
-                        yield self.convert_text("")
-
-                    yield output
+            # Stream a blank message to start the stream
+            yield self.convert_text("")
+            async for frame in batcher.frames():
+                yield frame
         except asyncio.CancelledError:
             logger.info("Stopping workflow")
             await event_handler.cancel_run()
@@ -49,51 +46,65 @@ class VercelStreamResponse(StreamingResponse):
                 f"Unexpected error in content_generator: {str(e)}", exc_info=True
             )
         finally:
+            producer.cancel()
+            if batcher.producer_waits:
+                logger.info(f"The run waited {batcher.producer_waits} times for a slow client")
             logger.info("The stream has been stopped!")
 
-    def _create_stream(
-        self,
-        request: Request,
+    @classmethod
+    async def produce(
+        cls,
+        sink: StreamBatcher | DetachedRun,
         chat_data: ChatData,
         event_handler: AgentRunResult | AsyncGenerator,
         events: AsyncGenerator[AgentRunEvent, None],
         verbose: bool = True,
-    ):
-        # Yield the text response
-        async def _chat_response_generator():
+    ) -> None:
+        """
+        Writes the response text and events of a run to `sink` (a stream batcher or a detached run), closing it once done.
+        """
+        # Add the text response
+        async def _chat_response_producer():
             result = await event_handler
-            final_response = ""
+            final_response: List[str] = []
 
             if isinstance(result, AgentRunResult):
-                for token in result.response.message.content:
-                    final_response += token
-                    yield self.convert_text(token)
+                final_response.append(result.response.message.content)
+                await sink.put_text(result.response.message.content)
 
             if isinstance(result, AsyncGenerator):
                 async for token in result:
-                    final_response += token.delta
-                    yield self.convert_text(token.delta)
+                    final_response.append(token.delta)
+                    await sink.put_text(token.delta)
 
             # Generate next questions if next question prompt is configured
-            question_data = await self._generate_next_questions(
-                chat_data.messages, final_response
+            question_data = await cls._generate_next_questions(
+                chat_data.messages, "".join(final_response)
             )
             if question_data:
-                yield self.convert_data(question_data)
+                await sink.put_data(question_data)
 
             # TODO: stream sources
 
-        # Yield the events from the event handler
-        async def _event_generator():
+        # Add the events from the event handler
+        async def _event_producer():
             async for event in events:
-                event_response = self._event_to_response(event)
+                event_response = cls._event_to_response(event)
                 if verbose:
                     logger.debug(event_response)
                 if event_response is not None:
-                    yield self.convert_data(event_response)
+                    await sink.put_data(event_response)
 
-        combine = stream.merge(_chat_response_generator(), _event_generator())
-        return combine
+        async def _guard(producer):
+            try:
+                await producer
+            except Exception as e:
+                logger.error(f"Error producing the stream: {str(e)}", exc_info=True)
+
+        try:
+            await asyncio.gather(_guard(_chat_response_producer()), _guard(_event_producer()))
+        finally:
+            sink.close()
 
     @staticmethod
     def _event_to_response(event: AgentRunEvent) -> dict:
@@ -128,3 +139,47 @@ class VercelStreamResponse(StreamingResponse):
                 "data": questions,
             }
         return None
+
+
+class DetachedRunStreamResponse(VercelStreamResponse):
+    """
+    Streams a detached run from a cursor. Disconnecting only stops following the run, the run
+    itself keeps going. Every frame ends with a `run` data item holding the cursor to resume from.
+    """
+
+    def __init__(self, request: Request, run: DetachedRun, cursor: int = 0):
+        self.request = request
+        self.run = run
+        StreamingResponse.__init__(self, content=self.follow_generator(run, cursor))
+
+    async def follow_generator(self, run: DetachedRun, cursor: int):
+        max_frame_bytes = default_max_frame_bytes()
+        max_delay = default_max_delay()
+        try:
+            yield self.convert_text("")
+            # Pull from the run's log: the next parts are read only once the previous frame was
+            # written to the client, so the cursor of a frame is exactly what the client received
+            while await run.wait(cursor):
+                entries = run.read(cursor, max_frame_bytes)
+                if run.running and entries[-1][0] + 1 >= run.cursor and max_delay:
+                    # Give the run a moment to fill the frame
+                    await asyncio.sleep(max_delay)
+                    entries = run.read(cursor, max_frame_bytes)
+                cursor = entries[-1][0] + 1
+                yield encode_frame([(kind, payload) for _, kind, payload in entries], self._run_status(run, cursor))
+            # The run finished, tell the client its final status
+            yield encode_frame([], self._run_status(run, cursor))
+        except asyncio.CancelledError:
+            logger.info(f"Client stopped following run {run.run_id} at cursor {cursor}, the run continues")
+
+    @staticmethod
+    def _run_status(run: DetachedRun, cursor: int) -> dict:
+        return {
+            "type": "run",
+            "data": {
+                "sessionId": run.session_id,
+                "runId": run.run_id,
+                "status": run.status,
+                "cursor": cursor,
+            },
+        }
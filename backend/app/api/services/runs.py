@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.api.services.stream_batcher import part_size
+
+logger = logging.getLogger("uvicorn")
+
+# (cursor, kind, payload) where kind is "text" (a token) or "data" (a data item)
+RunEntry = Tuple[int, str, Any]
+
+
+class DetachedRun:
+    """
+    A research run executing in the background, independent of the request that started it.
+
+    The run's stream parts (text tokens and data items) are appended to a bounded log, each with a
+    cursor, so any number of clients can follow the run and a client that reconnects resumes from
+    the cursor of the last part it received. Once more than `max_events` parts were produced the
+    oldest are discarded, a client resuming from before the retained window continues from the
+    oldest retained part.
+
+    Args:
+        session_id: Session the run belongs to
+        max_events: Number of stream parts retained for replay
+        input: The message the run answers
+    """
+
+    def __init__(self, session_id: str, max_events: int, input: Optional[str] = None):
+        self.session_id = session_id
+        self.input = input
+        self.run_id = uuid.uuid4().hex
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.on_cancel: Optional[Callable[[], Awaitable[Any]]] = None
+        self._log: Deque[RunEntry] = deque(maxlen=max_events)
+        self._next_cursor = 0
+        self._closed = False
+        self._updated = asyncio.get_running_loop().create_future()
+
+    @property
+    def running(self) -> bool:
+        return not self._closed
+
+    @property
+    def cursor(self) -> int:
+        """Cursor of the next part the run will produce"""
+        return self._next_cursor
+
+    @property
+    def first_cursor(self) -> int:
+        """Cursor of the oldest part retained for replay"""
+        return self._log[0][0] if self._log else self._next_cursor
+
+    def _append(self, kind: str, payload: Any) -> None:
+        if self._closed:
+            return
+        self._log.append((self._next_cursor, kind, payload))
+        self._next_cursor += 1
+        self._notify()
+
+    def _notify(self) -> None:
+        if not self._updated.done():
+            self._updated.set_result(None)
+        self._updated = asyncio.get_running_loop().create_future()
+
+    # Async like `StreamBatcher`'s, but the run never waits for its clients, they replay from the log
+    async def put_text(self, token: str) -> None:
+        if token:
+            self._append("text", token)
+
+    async def put_data(self, item: dict) -> None:
+        self._append("data", item)
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self.finished_at = time.time()
+            self._notify()
+
+    async def wait(self, cursor: int) -> bool:
+        """
+        Waits until the run produced the part at `cursor`, returns False if the run finished without it.
+        """
+        while cursor >= self._next_cursor:
+            if self._closed:
+                return False
+            await asyncio.shield(self._updated)
+        return True
+
+    def read(self, cursor: int, max_bytes: int) -> List[RunEntry]:
+        """
+        Returns the retained parts from `cursor` on, at most `max_bytes` of them but at least one if there is one.
+        """
+        first = self.first_cursor
+        if cursor < first:
+            logger.info(f"Run {self.run_id}: parts {cursor}-{first - 1} are no longer retained, resuming at {first}")
+            cursor = first
+        entries: List[RunEntry] = []
+        size = 0
+        for index in range(cursor - first, len(self._log)):
+            entry = self._log[index]
+            size += part_size(entry[1], entry[2])
+            if entries and size > max_bytes:
+                break
+            entries.append(entry)
+        return entries
+
+    async def cancel(self) -> None:
+        if not self.running:
+            return
+        self.status = "cancelling"
+        if self.on_cancel is not None:
+            await self.on_cancel()
+        if self.task is not None:
+            self.task.cancel()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "sessionId": self.session_id,
+            "runId": self.run_id,
+            "status": self.status,
+            "error": self.error,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+            "cursor": self._next_cursor,
+            "firstCursor": self.first_cursor,
+        }
+
+
+class RunRegistry:
+    """
+    Background research runs keyed by session.
+
+    A run keeps going when its client disconnects, clients re-attach with the session ID and the
+    cursor of the last part they received. Finished runs stay available for `retention` seconds.
+
+    Args:
+        max_events: Number of stream parts each run retains for replay
+        retention: Seconds a finished run is kept for clients to collect its result
+    """
+
+    def __init__(self, max_events: int = 10000, retention: float = 3600):
+        self.max_events = max_events
+        self.retention = retention
+        self._runs: Dict[str, DetachedRun] = {}
+
+    def get(self, session_id: str) -> Optional[DetachedRun]:
+        self._evict_expired()
+        return self._runs.get(session_id)
+
+    def start(
+        self,
+        session_id: str,
+        produce: Callable[[DetachedRun], Awaitable[None]],
+        on_cancel: Optional[Callable[[], Awaitable[Any]]] = None,
+        input: Optional[str] = None,
+    ) -> DetachedRun:
+        """
+        Start a run of the session in the background. `produce(run)` writes the stream parts of the
+        run to it, `on_cancel` is awaited when the run is cancelled, e.g. to stop the workflow.
+        """
+        self._evict_expired()
+        run = DetachedRun(session_id, self.max_events, input=input)
+        run.on_cancel = on_cancel
+        run.task = asyncio.create_task(self._run(run, produce))
+        self._runs[session_id] = run
+        return run
+
+    @staticmethod
+    async def _run(run: DetachedRun, produce: Callable[[DetachedRun], Awaitable[None]]) -> None:
+        try:
+            await produce(run)
+            run.status = "cancelled" if run.status == "cancelling" else "completed"
+        except asyncio.CancelledError:
+            run.status = "cancelled"
+            logger.info(f"Run {run.run_id} of session {run.session_id} was cancelled")
+        except Exception as e:
+            run.status = "cancelled" if run.status == "cancelling" else "failed"
+            run.error = str(e)
+            logger.error(f"Run {run.run_id} of session {run.session_id} failed: {e}", exc_info=True)
+        finally:
+            run.close()
+
+    async def cancel(self, session_id: str) -> Optional[DetachedRun]:
+        run = self._runs.get(session_id)
+        if run is not None:
+            await run.cancel()
+        return run
+
+    def _evict_expired(self) -> None:
+        now = time.time()
+        expired = [
+            session_id
+            for session_id, run in self._runs.items()
+            if run.finished_at is not None and now - run.finished_at > self.retention
+        ]
+        for session_id in expired:
+            del self._runs[session_id]
+
+
+_registry: Optional[RunRegistry] = None
+_registry_initialized = False
+
+
+def get_run_registry() -> Optional[RunRegistry]:
+    """
+    Returns the process wide run registry, or None if runs are tied to their request via DETACHED_RUNS_ENABLED=false.
+    """
+    global _registry, _registry_initialized
+    if not _registry_initialized:
+        _registry_initialized = True
+        if os.getenv("DETACHED_RUNS_ENABLED", "true").lower() == "true":
+            _registry = RunRegistry(
+                max_events=int(os.getenv("RUN_EVENT_BUFFER_SIZE", "10000")),
+                retention=float(os.getenv("RUN_RETENTION_SECONDS", "3600")),
+            )
+    return _registry
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Callable, Iterable, List, Optional, Tuple
+
+TEXT_PREFIX = "0:"
+DATA_PREFIX = "8:"
+
+
+def default_max_frame_bytes() -> int:
+    return int(os.getenv("STREAM_MAX_FRAME_BYTES", "16384"))
+
+
+def default_max_delay() -> float:
+    return float(os.getenv("STREAM_MAX_DELAY_MS", "50")) / 1000
+
+
+def part_size(kind: str, part: Any) -> int:
+    return len(part) if kind == "text" else len(json.dumps(part))
+
+
+def encode_frame(parts: Iterable[Tuple[str, Any]], trailer: Optional[dict] = None) -> str:
+    """
+    Encodes ("text", token) and ("data", item) parts as a frame of the Vercel data stream, merging
+    consecutive tokens into one text line and consecutive items into one data line.
+    """
+    runs: List[List[Any]] = []
+    for kind, part in parts:
+        if runs and runs[-1][0] == kind:
+            runs[-1][1].append(part)
+        else:
+            runs.append([kind, [part]])
+    lines = []
+    for kind, items in runs:
+        if kind == "text":
+            lines.append(f"{TEXT_PREFIX}{json.dumps(''.join(items))}\n")
+        else:
+            lines.append(f"{DATA_PREFIX}{json.dumps(items)}\n")
+    if trailer is not None:
+        lines.append(f"{DATA_PREFIX}{json.dumps([trailer])}\n")
+    return "".join(lines)
+
+
+class StreamBatcher:
+    """
+    Coalesces text tokens and data items into frames of the Vercel data stream.
+
+    Consecutive text tokens are merged into one text line and consecutive data items into one
+    data line. A frame is flushed once it reaches `max_frame_bytes`, or `max_delay` seconds after
+    its first part, so a run produces a few writes per second instead of one per token or event.
+
+    The consumer is the HTTP response. Once `max_pending_bytes` of text and data are waiting to be
+    sent, `put_text` and `put_data` wait until the next frame went out, so a slow client slows the
+    producers down instead of parts piling up here. Nothing is dropped.
+
+    Args:
+        max_frame_bytes: Flush a frame once it holds this many bytes
+        max_delay: Seconds a part may wait for more parts before its frame is flushed
+        max_pending_bytes: Bytes of parts that may wait to be sent before producers wait
+        trailer: Returns a data item appended to every frame, e.g. the stream cursor
+    """
+
+    TEXT_PREFIX = TEXT_PREFIX
+    DATA_PREFIX = DATA_PREFIX
+
+    def __init__(
+        self,
+        max_frame_bytes: Optional[int] = None,
+        max_delay: Optional[float] = None,
+        max_pending_bytes: Optional[int] = None,
+        trailer: Optional[Callable[[], dict]] = None,
+    ):
+        self.max_frame_bytes = max_frame_bytes or default_max_frame_bytes()
+        self.max_delay = max_delay if max_delay is not None else default_max_delay()
+        self.max_pending_bytes = max_pending_bytes or int(os.getenv("STREAM_MAX_PENDING_BYTES", "262144"))
+        self.trailer = trailer
+        # Pending ("text", token) and ("data", item) parts in order
+        self._parts: List[Tuple[str, Any]] = []
+        self._size = 0
+        self._closed = False
+        self._has_parts = asyncio.Event()
+        self._frame_full = asyncio.Event()
+        self._sent = asyncio.Event()
+        self.frames_sent = 0
+        self.parts_received = 0
+        self.producer_waits = 0
+
+    async def _add(self, kind: str, part: Any) -> None:
+        # Wait for the client to catch up, a part larger than the bound still goes into the next frame
+        while self._size >= self.max_pending_bytes and not self._closed:
+            self.producer_waits += 1
+            self._sent.clear()
+            await self._sent.wait()
+        if self._closed:
+            return
+        self._parts.append((kind, part))
+        self.parts_received += 1
+        self._size += part_size(kind, part)
+        self._has_parts.set()
+        if self._size >= self.max_frame_bytes:
+            self._frame_full.set()
+
+    async def put_text(self, token: str) -> None:
+        if token:
+            await self._add("text", token)
+
+    async def put_data(self, item: dict) -> None:
+        await self._add("data", item)
+
+    def close(self) -> None:
+        self._closed = True
+        self._has_parts.set()
+        self._frame_full.set()
+        self._sent.set()
+
+    def _flush(self) -> str:
+        frame = encode_frame(self._parts, self.trailer() if self.trailer is not None else None)
+        self._parts = []
+        self._size = 0
+        self._frame_full.clear()
+        self.frames_sent += 1
+        return frame
+
+    async def frames(self) -> AsyncIterator[str]:
+        while True:
+            if not self._parts:
+                if self._closed:
+                    return
+                self._has_parts.clear()
+                await self._has_parts.wait()
+                continue
+            if not self._frame_full.is_set():
+                # Give the producers a moment to fill the frame
+                try:
+                    await asyncio.wait_for(self._frame_full.wait(), timeout=self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            if self._parts:
+                yield self._flush()
+                # The response only asks for the next frame once this one was written to the client
+                self._sent.set()
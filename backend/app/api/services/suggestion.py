@@ -6,6 +6,7 @@ from typing import List, Optional
 from app.api.routers.models import Message
 from llama_index.core.prompts import PromptTemplate
 from llama_index.core.settings import Settings
+from app.engine.llm_cache import acomplete
 
 logger = logging.getLogger("uvicorn")
 
@@ -51,7 +52,7 @@ class NextQuestionSuggestion:
 
             # Call the LLM and parse questions from the output
             prompt = prompt_template.format(conversation=conversation)
-            output = await Settings.llm.acomplete(prompt)
+            output = await acomplete(Settings.llm, prompt)
             questions = cls._extract_questions(output.text)
 
             return questions
@@ -1 +1,2 @@
 DATA_DIR = "data"
+STORAGE_DIR = "storage"
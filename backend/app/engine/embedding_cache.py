@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from pydantic import PrivateAttr
+
+from app.config import STORAGE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows, the store is then only safe within one process
+    fcntl = None
+
+
+def embedding_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk store of float32 embedding vectors for one embedding model.
+
+    Vectors are appended to a flat `vectors.f32` file and read back through a NumPy memmap,
+    a SQLite table maps the content hash of each embedded text to its row. Writers from several
+    processes are serialized by an exclusive lock on the vectors file.
+
+    Args:
+        directory: Directory of the store, one per embedding model
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self.dim: Optional[int] = None
+        self._memmap: Optional[np.memmap] = None
+        with self._file_lock() as f:
+            self._read_meta()
+            if self.dim is not None:
+                # A writer that died mid append leaves a partial row, which would shift every row after it
+                size = os.fstat(f.fileno()).st_size
+                if size % (self.dim * 4):
+                    f.truncate(size - size % (self.dim * 4))
+
+    @contextmanager
+    def _file_lock(self):
+        # Exclusive lock across processes on the vectors file, yields it opened for appending
+        with open(self.vectors_path, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _read_meta(self) -> None:
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def _vectors(self) -> Optional[np.memmap]:
+        self._read_meta()
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return None
+        rows = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        if rows == 0:
+            return None
+        if self._memmap is None or self._memmap.shape[0] != rows:
+            # The file grew since it was mapped, map it again
+            self._memmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        return self._memmap
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        with self._lock:
+            found: Dict[str, int] = {}
+            for start in range(0, len(keys), 500):
+                batch = list(keys[start:start + 500])
+                placeholders = ",".join("?" * len(batch))
+                found.update(
+                    self._conn.execute(f"SELECT key, row FROM rows WHERE key IN ({placeholders})", batch).fetchall()
+                )
+            vectors = self._vectors()
+            if vectors is None:
+                return {}
+            return {key: np.array(vectors[row]) for key, row in found.items() if row < vectors.shape[0]}
+
+    def put_many(self, items: Sequence[Tuple[str, Sequence[float]]]) -> None:
+        if not items:
+            return
+        matrix = np.asarray([vector for _, vector in items], dtype=np.float32)
+        with self._lock, self._file_lock() as f:
+            # Another process may have created the store since it was opened
+            self._read_meta()
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                with open(self.meta_path, "w", encoding="utf-8") as meta:
+                    json.dump({"dim": self.dim}, meta)
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store dimension {self.dim}")
+            start = os.fstat(f.fileno()).st_size // (self.dim * 4)
+            f.write(matrix.tobytes())
+            f.flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rows (key, row) VALUES (?, ?)",
+                [(key, start + offset) for offset, (key, _) in enumerate(items)],
+            )
+
+
+class _BatchRequest:
+    def __init__(self, texts: List[str], future: asyncio.Future):
+        self.texts = texts
+        self.future = future
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Content-hash keyed, on-disk cache in front of an embedding model, with request batching.
+
+    Texts that were embedded before (by any session, in any process sharing the store) are
+    served from the model's `EmbeddingStore`. Cache misses from concurrent async callers are
+    collected for `batch_window` seconds and sent to the provider together, in batches of the
+    wrapped model's `embed_batch_size`.
+
+    Example:
+        >>> Settings.embed_model = CachedEmbedding.wrap(Settings.embed_model)
+    """
+
+    batch_window: float = 0.01
+    hits: int = 0
+    misses: int = 0
+    provider_calls: int = 0
+
+    _model: BaseEmbedding = PrivateAttr()
+    _store: EmbeddingStore = PrivateAttr()
+    _pending: List[_BatchRequest] = PrivateAttr(default_factory=list)
+    _flush_handle: Optional[asyncio.TimerHandle] = PrivateAttr(default=None)
+    _flush_tasks: Set[asyncio.Task] = PrivateAttr(default_factory=set)
+
+    def __init__(self, model: BaseEmbedding, store: EmbeddingStore, **kwargs: Any):
+        super().__init__(
+            model_name=model.model_name,
+            embed_batch_size=max(model.embed_batch_size, 256),
+            callback_manager=model.callback_manager,
+            **kwargs,
+        )
+        self._model = model
+        self._store = store
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @classmethod
+    def wrap(cls, model: BaseEmbedding, cache_dir: Optional[str] = None) -> "CachedEmbedding":
+        cache_dir = cache_dir or os.getenv("EMBEDDING_CACHE_DIR", os.path.join(STORAGE_DIR, "cache", "embeddings"))
+        namespace = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{model.class_name()}-{model.model_name}")
+        dimensions = getattr(model, "dimensions", None)
+        if dimensions:
+            namespace += f"-{dimensions}"
+        return cls(model=model, store=EmbeddingStore(os.path.join(cache_dir, namespace)))
+
+    def _lookup(self, texts: List[str]) -> Tuple[List[Optional[np.ndarray]], List[str]]:
+        keys = [embedding_key(text) for text in texts]
+        cached = self._store.get_many(list(dict.fromkeys(keys)))
+        vectors = [cached.get(key) for key in keys]
+        self.hits += sum(1 for vector in vectors if vector is not None)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        self.misses += len(missing)
+        return vectors, missing
+
+    def _fill(self, texts: List[str], vectors: List[Optional[np.ndarray]], embedded: Dict[str, Embedding]) -> List[Embedding]:
+        return [
+            vector.tolist() if vector is not None else list(embedded[text])
+            for text, vector in zip(texts, vectors)
+        ]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        vectors, missing = self._lookup(texts)
+        embedded: Dict[str, Embedding] = {}
+        if missing:
+            self.provider_calls += 1
+            results = self._model.get_text_embedding_batch(missing)
+            embedded = dict(zip(missing, results))
+            self._store.put_many([(embedding_key(text), vector) for text, vector in embedded.items()])
+        return self._fill(texts, vectors, embedded)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        vectors, missing = self._lookup(texts)
+        embedded: Dict[str, Embedding] = {}
+        if missing:
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append(_BatchRequest(missing, future))
+            if sum(len(request.texts) for request in self._pending) >= self.embed_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+            embedded = await future
+        return self._fill(texts, vectors, embedded)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        requests, self._pending = self._pending, []
+        if requests:
+            # The event loop only keeps a weak reference to tasks
+            task = asyncio.ensure_future(self._embed_requests(requests))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def _embed_requests(self, requests: List[_BatchRequest]) -> None:
+        texts = list(dict.fromkeys(text for request in requests for text in request.texts))
+        try:
+            self.provider_calls += 1
+            results = await self._model.aget_text_embedding_batch(texts)
+            embedded = dict(zip(texts, results))
+            await asyncio.to_thread(
+                self._store.put_many, [(embedding_key(text), vector) for text, vector in embedded.items()]
+            )
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        for request in requests:
+            if not request.future.done():
+                request.future.set_result({text: embedded[text] for text in request.texts})
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        # Query embeddings can differ from text embeddings (instruction prefixes), do not share the cache
+        return self._model.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self._model.aget_query_embedding(query)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "provider_calls": self.provider_calls,
+            "stored_vectors": len(self._store),
+        }
@@ -2,6 +2,8 @@ from typing import List, Optional
 
 from app.agents.ideator_inc_workflow import create_idea_research_workflow
 from app.agents.example.workflow import create_workflow
+from app.engine.queued_engine import QueuedResearchEngine
+from app.utils.job_queue import get_job_queue
 from llama_index.core.chat_engine.types import ChatMessage
 from llama_index.core.workflow import Workflow
 
@@ -11,10 +13,18 @@ def get_chat_engine(
     chat_history: Optional[List[ChatMessage]] = None, 
     email: Optional[str] = None, 
     mode: str = "test", 
+    resume: bool = False,
     **kwargs
-) -> Workflow:
+) -> Workflow | QueuedResearchEngine:
+    '''
+    If resume is set, the research workflow restores the sub workflow results that were checkpointed by a previous run of the same session instead of re-running them
+    In job queue mode (JOB_QUEUE_ENABLED=true) research runs are enqueued and executed by the worker processes
+    '''
+    job_queue = get_job_queue()
     if mode == "test":
         agent_workflow = create_workflow(session_id, chat_history, email=email, **kwargs)
+    elif job_queue is not None:
+        agent_workflow = QueuedResearchEngine(job_queue, session_id, chat_history, email, resume=resume, **kwargs)
     else:
-        agent_workflow = create_idea_research_workflow(session_id, chat_history, email, **kwargs)
+        agent_workflow = create_idea_research_workflow(session_id, chat_history, email, resume=resume, **kwargs)
     return agent_workflow
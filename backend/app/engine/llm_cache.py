@@ -0,0 +1,256 @@
+import logging
+import os
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence, Tuple, Type, TypeVar
+
+from llama_index.core.llms import LLM, ChatMessage, ChatResponse, CompletionResponse
+from llama_index.core.llms.function_calling import FunctionCallingLLM
+from llama_index.core.prompts import PromptTemplate
+from llama_index.core.tools import ToolSelection
+from llama_index.core.tools.types import BaseTool
+
+from app.config import STORAGE_DIR
+from app.engine.llm_scheduler import estimate_tokens, get_llm_scheduler
+from app.utils.cache import BaseCache, TieredCache, make_cache_key
+from pydantic import BaseModel
+
+logger = logging.getLogger("uvicorn")
+
+T = TypeVar("T", bound=BaseModel)
+
+_llm_cache: Optional[BaseCache] = None
+_llm_cache_initialized = False
+
+
+def _cache_from_env() -> Optional[BaseCache]:
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    max_disk_mb = os.getenv("LLM_CACHE_MAX_DISK_MB", "512")
+    return TieredCache(
+        namespace="llm",
+        path=os.getenv("LLM_CACHE_PATH", os.path.join(STORAGE_DIR, "cache", "llm.sqlite")),
+        ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+        max_memory_entries=int(os.getenv("LLM_CACHE_MAX_MEMORY_ENTRIES", "512")),
+        max_disk_entries=int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "50000")),
+        max_disk_bytes=int(float(max_disk_mb) * 1024 * 1024),
+    )
+
+
+def get_llm_cache() -> Optional[BaseCache]:
+    """
+    Returns the process wide LLM response cache, configured from the environment on first use.
+    Returns None if caching is disabled via LLM_CACHE_ENABLED=false.
+    """
+    global _llm_cache, _llm_cache_initialized
+    if not _llm_cache_initialized:
+        _llm_cache = _cache_from_env()
+        _llm_cache_initialized = True
+    return _llm_cache
+
+
+def agent_turn_caching_enabled() -> bool:
+    """
+    Agent tool calling turns are cached unless LLM_CACHE_AGENT_TURNS=false. A cached turn replays
+    the same tool calls, so within the cache TTL a re-run does not search again for fresh results.
+    """
+    return os.getenv("LLM_CACHE_AGENT_TURNS", "true").lower() == "true"
+
+
+def set_llm_cache(cache: Optional[BaseCache]) -> None:
+    """
+    Plug in a different cache backend (or None to disable caching).
+    """
+    global _llm_cache, _llm_cache_initialized
+    _llm_cache = cache
+    _llm_cache_initialized = True
+
+
+def _llm_fingerprint(llm: LLM) -> Dict[str, Any]:
+    return {
+        "class": llm.class_name(),
+        "model": llm.metadata.model_name,
+        "temperature": getattr(llm, "temperature", None),
+        "max_tokens": getattr(llm, "max_tokens", None),
+    }
+
+
+def _tool_schemas(tools: Sequence[BaseTool]) -> List[Dict[str, Any]]:
+    schemas = []
+    for tool in tools:
+        try:
+            schemas.append(tool.metadata.to_openai_tool(skip_length_check=True))
+        except Exception:
+            schemas.append(
+                {
+                    "name": tool.metadata.get_name(),
+                    "description": tool.metadata.description,
+                    "parameters": tool.metadata.get_parameters_dict(),
+                }
+            )
+    return schemas
+
+
+def _message_to_dict(message: ChatMessage) -> Dict[str, Any]:
+    return {
+        "role": message.role.value,
+        "content": message.content,
+        "additional_kwargs": message.additional_kwargs,
+    }
+
+
+def _message_from_dict(data: Dict[str, Any]) -> ChatMessage:
+    return ChatMessage(
+        role=data["role"],
+        content=data.get("content"),
+        additional_kwargs=data.get("additional_kwargs") or {},
+    )
+
+
+def chat_cache_key(
+    llm: LLM, tools: Sequence[BaseTool], chat_history: Sequence[ChatMessage]
+) -> str:
+    return make_cache_key(
+        "chat_with_tools",
+        _llm_fingerprint(llm),
+        _tool_schemas(tools),
+        [_message_to_dict(message) for message in chat_history],
+    )
+
+
+def completion_cache_key(llm: LLM, prompt: str, **kwargs: Any) -> str:
+    return make_cache_key("complete", _llm_fingerprint(llm), prompt, kwargs)
+
+
+async def achat_with_tools(
+    llm: FunctionCallingLLM,
+    tools: Sequence[BaseTool],
+    chat_history: List[ChatMessage],
+) -> Tuple[ChatResponse, List[ToolSelection]]:
+    """
+    Equivalent of `llm.achat_with_tools` followed by `llm.get_tool_calls_from_response`, through
+    the LLM scheduler. Cached if enabled, see `agent_turn_caching_enabled`.
+
+    The tool calls are cached alongside the message because providers validate the
+    type of the raw tool call objects, which do not survive a JSON round-trip.
+
+    Returns:
+        The chat response and the tool calls requested in it (possibly empty)
+    """
+    cache = get_llm_cache() if agent_turn_caching_enabled() else None
+    key = chat_cache_key(llm, tools, chat_history) if cache is not None else None
+
+    if cache is not None:
+        cached = cache.get_json(key)
+        if cached is not None:
+            logger.debug(f"LLM cache hit for chat with {len(chat_history)} messages")
+            tool_calls = [ToolSelection.model_validate(t) for t in cached["tool_calls"]]
+            return ChatResponse(message=_message_from_dict(cached["message"])), tool_calls
+
+    scheduler = get_llm_scheduler()
+    if scheduler is not None:
+        async with scheduler.slot(estimate_tokens(llm, messages=chat_history)):
+            response = await llm.achat_with_tools(tools, chat_history=chat_history)
+    else:
+        response = await llm.achat_with_tools(tools, chat_history=chat_history)
+    tool_calls = llm.get_tool_calls_from_response(response, error_on_no_tool_call=False)
+
+    if cache is not None:
+        cache.set_json(
+            key,
+            {
+                "message": _message_to_dict(response.message),
+                "tool_calls": [t.model_dump(mode="json") for t in tool_calls],
+            },
+        )
+    return response, tool_calls
+
+
+async def acomplete(llm: LLM, prompt: str, use_cache: bool = True, **kwargs: Any) -> CompletionResponse:
+    """
+    Cached equivalent of `llm.acomplete`, misses go through the LLM scheduler.
+    Pass `use_cache=False` for calls that must not replay a previous answer, e.g. retries.
+    """
+    cache = get_llm_cache() if use_cache else None
+    key = completion_cache_key(llm, prompt, **kwargs) if cache is not None else None
+
+    if cache is not None:
+        cached = cache.get_json(key)
+        if cached is not None:
+            logger.debug("LLM cache hit for completion")
+            return CompletionResponse(text=cached["text"])
+
+    scheduler = get_llm_scheduler()
+    if scheduler is not None:
+        async with scheduler.slot(estimate_tokens(llm, prompt=prompt)):
+            response = await llm.acomplete(prompt, **kwargs)
+    else:
+        response = await llm.acomplete(prompt, **kwargs)
+
+    if cache is not None and response.text:
+        cache.set_json(key, {"text": response.text})
+    return response
+
+
+def supports_structured_output(llm: LLM) -> bool:
+    """
+    Whether the LLM can produce schema constrained output natively (via tool calling), instead of free text that is parsed.
+    """
+    return isinstance(llm, FunctionCallingLLM) and llm.metadata.is_function_calling_model
+
+
+def forget_completion(llm: LLM, prompt: str, **kwargs: Any) -> None:
+    """
+    Drops the cached completion of a prompt, e.g. once its output turned out to be invalid.
+    """
+    cache = get_llm_cache()
+    if cache is not None:
+        cache.delete(completion_cache_key(llm, prompt, **kwargs))
+
+
+async def astructured_predict(llm: LLM, output_cls: Type[T], prompt: str, use_cache: bool = True) -> T:
+    """
+    Cached equivalent of `llm.astructured_predict` for a plain prompt, misses go through the LLM scheduler.
+    """
+    cache = get_llm_cache() if use_cache else None
+    key = (
+        make_cache_key("structured_predict", _llm_fingerprint(llm), output_cls.model_json_schema(), prompt)
+        if cache is not None
+        else None
+    )
+
+    if cache is not None:
+        cached = cache.get_json(key)
+        if cached is not None:
+            logger.debug(f"LLM cache hit for structured prediction of {output_cls.__name__}")
+            return output_cls.model_validate(cached)
+
+    # The prompt is passed as a template variable so the braces in it are not parsed as placeholders
+    template = PromptTemplate("{prompt}")
+    scheduler = get_llm_scheduler()
+    if scheduler is not None:
+        async with scheduler.slot(estimate_tokens(llm, prompt=prompt)):
+            result = await llm.astructured_predict(output_cls, template, prompt=prompt)
+    else:
+        result = await llm.astructured_predict(output_cls, template, prompt=prompt)
+
+    if cache is not None:
+        cache.set_json(key, result.model_dump(mode="json"))
+    return result
+
+
+async def astream_chat_with_tools(
+    llm: FunctionCallingLLM,
+    tools: Sequence[BaseTool],
+    chat_history: List[ChatMessage],
+) -> AsyncGenerator[ChatResponse, None]:
+    """
+    Scheduled equivalent of `llm.astream_chat_with_tools`. Streams are not cached, the
+    scheduler slot is held until the stream is exhausted or closed.
+    """
+    scheduler = get_llm_scheduler()
+    if scheduler is None:
+        async for chunk in await llm.astream_chat_with_tools(tools, chat_history=chat_history):
+            yield chunk
+        return
+    async with scheduler.slot(estimate_tokens(llm, messages=chat_history)):
+        async for chunk in await llm.astream_chat_with_tools(tools, chat_history=chat_history):
+            yield chunk
@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Sequence
+
+from llama_index.core.llms import LLM, ChatMessage
+
+from app.settings import get_llm_rate_limits
+
+logger = logging.getLogger("uvicorn")
+
+
+class Priority(IntEnum):
+    """
+    Scheduling class of an LLM call, lower values are dispatched first.
+    """
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+
+_priority: ContextVar[Priority] = ContextVar("llm_priority", default=Priority.NORMAL)
+
+
+@contextmanager
+def llm_priority(priority: Priority) -> Iterator[None]:
+    """
+    Run the LLM calls made in this context (and in tasks or workflows started from it) with the given priority.
+
+    Example:
+        >>> with llm_priority(Priority.INTERACTIVE):
+        ...     handler = agent.run(input=question, streaming=True)
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def get_llm_priority() -> Priority:
+    return _priority.get()
+
+
+class _TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        self.refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class LLMScheduler:
+    """
+    Admission control for calls to one LLM provider.
+
+    Calls wait in a priority queue and are dispatched while the provider's requests-per-minute
+    and tokens-per-minute budgets (token buckets) and the concurrency cap allow, so bursts from
+    parallel workflows are smoothed out instead of turning into 429 storms. Higher priority
+    calls (interactive chat) are always dispatched before queued background research. When a
+    call is rate limited anyway, the request budget is drained so every caller backs off.
+
+    Args:
+        provider: Provider name, used in metrics
+        rpm: Requests per minute budget
+        tpm: Tokens per minute budget (prompt estimate plus max output tokens)
+        max_concurrency: Maximum calls in flight
+    """
+
+    def __init__(self, provider: str, rpm: int, tpm: int, max_concurrency: int):
+        self.provider = provider
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.completed = 0
+        self.rate_limited = 0
+        self._queue: List[tuple] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for *_, future, _ in self._queue if not future.done())
+
+    async def acquire(self, estimated_tokens: int, priority: Optional[Priority] = None) -> None:
+        priority = get_llm_priority() if priority is None else priority
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(priority), next(self._counter), time.monotonic(), future, estimated_tokens))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as we were cancelled, hand the slot back
+                self.release()
+            raise
+
+    def release(self, rate_limited: bool = False) -> None:
+        self.in_flight -= 1
+        self.completed += 1
+        if rate_limited:
+            self.rate_limited += 1
+            self.requests.refill()
+            self.requests.tokens = 0
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        while self._queue and self.in_flight < self.max_concurrency:
+            _, _, enqueued_at, future, estimated_tokens = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            # Strict priority: the head of the queue blocks everyone behind it
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+            if delay > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self.requests.tokens -= 1
+            self.tokens.tokens -= min(estimated_tokens, self.tokens.capacity)
+            self.in_flight += 1
+            self._wait_times.append(time.monotonic() - enqueued_at)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int, priority: Optional[Priority] = None) -> AsyncIterator[None]:
+        await self.acquire(estimated_tokens, priority)
+        rate_limited = False
+        try:
+            yield
+        except Exception as e:
+            rate_limited = _is_rate_limit_error(e)
+            raise
+        finally:
+            self.release(rate_limited=rate_limited)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_times)
+        depth_by_priority = {p.name.lower(): 0 for p in Priority}
+        for priority, *_, future, _ in self._queue:
+            if not future.done():
+                depth_by_priority[Priority(priority).name.lower()] += 1
+        return {
+            "provider": self.provider,
+            "queue_depth": sum(depth_by_priority.values()),
+            "queue_depth_by_priority": depth_by_priority,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rate_limited": self.rate_limited,
+            "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            "wait_p95_ms": round(waits[int(len(waits) * 0.95) - 1] * 1000, 1) if len(waits) > 1 else 0.0,
+            "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+        }
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status_code == 429 or "rate limit" in str(error).lower()
+
+
+def estimate_tokens(llm: LLM, messages: Sequence[ChatMessage] = (), prompt: str = "") -> int:
+    """
+    Rough token estimate of a call (4 characters per token plus the output budget), cheap enough for every request.
+    """
+    chars = len(prompt) + sum(len(message.content or "") for message in messages)
+    max_tokens = getattr(llm, "max_tokens", None) or 512
+    return chars // 4 + max_tokens
+
+
+_schedulers: Dict[tuple, LLMScheduler] = {}
+
+
+def get_llm_scheduler(provider: Optional[str] = None) -> Optional[LLMScheduler]:
+    """
+    Returns the scheduler for a provider (defaults to MODEL_PROVIDER) on the running event loop,
+    or None if scheduling is disabled via LLM_SCHEDULER_ENABLED=false.
+    """
+    if os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() != "true":
+        return None
+    provider = provider or os.getenv("MODEL_PROVIDER", "openai")
+    key = (provider, asyncio.get_running_loop())
+    if key not in _schedulers:
+        # Drop schedulers of loops that have been closed (e.g. between scripts or tests)
+        for stale in [k for k in _schedulers if k[1].is_closed()]:
+            del _schedulers[stale]
+        limits = get_llm_rate_limits(provider)
+        _schedulers[key] = LLMScheduler(provider=provider, **limits)
+    return _schedulers[key]
+
+
+def scheduler_stats() -> List[Dict[str, Any]]:
+    return [scheduler.stats() for scheduler in _schedulers.values()]
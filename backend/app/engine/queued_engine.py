@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from llama_index.core.llms import ChatMessage, ChatResponse, MessageRole
+
+from app.utils.job_queue import BaseJobQueue, Job
+from app.workflows.single import AgentRunEvent
+
+logger = logging.getLogger("uvicorn")
+
+_DONE = object()
+
+
+def serialize_chat_history(chat_history: Optional[List[ChatMessage]]) -> List[Dict[str, str]]:
+    return [{"role": message.role.value, "content": message.content or ""} for message in chat_history or []]
+
+
+def deserialize_chat_history(messages: List[Dict[str, str]]) -> List[ChatMessage]:
+    return [ChatMessage(role=MessageRole(message["role"]), content=message["content"]) for message in messages]
+
+
+class QueuedRunHandler:
+    """
+    Handle of a research job run by a worker process, used like a workflow handler: awaiting it
+    returns the stream of response tokens and `stream_events` yields the agent events. Both are
+    read from the job's stream parts in the queue, while the job waits its turn the events report
+    its position in the queue.
+
+    The job is enqueued in a thread when the handler is created, so the blocking queue write does
+    not run on the event loop.
+    """
+
+    def __init__(self, queue: BaseJobQueue, user_id: str, session_id: str, payload: Dict[str, Any], poll_interval: Optional[float] = None):
+        self.queue = queue
+        self.user_id = user_id
+        self.session_id = session_id
+        self.payload = payload
+        self.job: Optional[Job] = None
+        self.poll_interval = poll_interval or float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+        self._tokens: asyncio.Queue = asyncio.Queue()
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._follower: Optional[asyncio.Task] = None
+        self._enqueued: Optional[asyncio.Task] = None
+
+    async def _enqueue_job(self) -> Job:
+        job = await asyncio.to_thread(self.queue.enqueue, self.user_id, self.session_id, self.payload)
+        logger.info(f"Queued research job {job.id} for session {self.session_id}")
+        self.job = job
+        return job
+
+    def enqueue(self) -> asyncio.Task:
+        """
+        Starts enqueueing the job, returns the task resolving to it.
+        """
+        if self._enqueued is None:
+            self._enqueued = asyncio.create_task(self._enqueue_job())
+        return self._enqueued
+
+    def _follow(self) -> None:
+        if self._follower is None:
+            self._follower = asyncio.create_task(self._follow_job())
+
+    async def _follow_job(self) -> None:
+        cursor = -1
+        last_position = None
+        attempt = None
+        error = None
+        try:
+            queued = await self.enqueue()
+            while True:
+                job = await asyncio.to_thread(self.queue.get, queued.id)
+                if job is None:
+                    error = "The research job no longer exists"
+                    break
+                if job.status == "queued":
+                    position = await asyncio.to_thread(self.queue.position, job.id)
+                    if position is not None and position != last_position:
+                        last_position = position
+                        self._events.put_nowait(
+                            AgentRunEvent(
+                                name="Ideator Inc Workflow",
+                                msg=f"Waiting for a research worker, position {position} in the queue",
+                                workflow_name="Research Manager",
+                            )
+                        )
+                if job.status == "running" and job.attempts != attempt:
+                    if attempt is not None:
+                        self._events.put_nowait(
+                            AgentRunEvent(
+                                name="Ideator Inc Workflow",
+                                msg="The research worker stopped, another worker resumes the research from its checkpoints",
+                                workflow_name="Research Manager",
+                            )
+                        )
+                    attempt = job.attempts
+                while events := await asyncio.to_thread(self.queue.read_events, job.id, cursor):
+                    for seq, kind, payload in events:
+                        cursor = seq
+                        if kind == "text":
+                            self._tokens.put_nowait(payload)
+                        elif kind == "agent":
+                            self._events.put_nowait(AgentRunEvent(**payload))
+                if job.status not in ("queued", "running"):
+                    if job.status == "failed":
+                        error = job.error or "The research job failed"
+                    break
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            self._tokens.put_nowait(RuntimeError(error) if error else _DONE)
+            self._events.put_nowait(_DONE)
+
+    def __await__(self):
+        async def result():
+            self._follow()
+            return self._stream_tokens()
+
+        return result().__await__()
+
+    async def _stream_tokens(self) -> AsyncGenerator[ChatResponse, None]:
+        while (token := await self._tokens.get()) is not _DONE:
+            if isinstance(token, Exception):
+                raise token
+            yield ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=""), delta=token)
+
+    async def stream_events(self) -> AsyncGenerator[AgentRunEvent, None]:
+        self._follow()
+        while (event := await self._events.get()) is not _DONE:
+            yield event
+
+    async def cancel_run(self) -> None:
+        job = await self.enqueue()
+        await asyncio.to_thread(self.queue.cancel, job.id)
+
+
+class QueuedResearchEngine:
+    """
+    Stands in for the research workflow when research runs in worker processes (`python -m app.worker`):
+    `run` enqueues a research job instead of running the workflow in the API process.
+    """
+
+    def __init__(
+        self,
+        queue: BaseJobQueue,
+        session_id: str,
+        chat_history: Optional[List[ChatMessage]] = None,
+        email: Optional[str] = None,
+        resume: bool = False,
+        **kwargs: Any,
+    ):
+        self.queue = queue
+        self.session_id = session_id
+        self.chat_history = chat_history
+        self.email = email
+        self.resume = resume
+        self.kwargs = kwargs
+        self.handler: Optional[QueuedRunHandler] = None
+
+    def run(self, input: str, streaming: bool = False, **kwargs: Any) -> QueuedRunHandler:
+        payload = {
+            "input": input,
+            "session_id": self.session_id,
+            "chat_history": serialize_chat_history(self.chat_history),
+            "email": self.email,
+            "resume": self.resume,
+            "params": self.kwargs.get("params") or {},
+        }
+        # Fair scheduling is per user, sessions without an email count as their own user
+        self.handler = QueuedRunHandler(self.queue, self.email or self.session_id, self.session_id, payload)
+        self.handler.enqueue()
+        return self.handler
+
+    async def stream_events(self) -> AsyncGenerator[AgentRunEvent, None]:
+        async for event in self.handler.stream_events():
+            yield event
@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from llama_index.core import (
+    SimpleDirectoryReader,
+    StorageContext,
+    VectorStoreIndex,
+    load_index_from_storage,
+)
+
+from app.config import STORAGE_DIR
+from app.utils.paths import get_session_data_path
+
+logger = logging.getLogger("uvicorn")
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SessionIndexStore:
+    """
+    Persisted vector indexes over each session's research files (data/<session_id>).
+
+    An index is built once, persisted under `persist_root/<session_id>` together with a manifest
+    of the indexed files, and kept in an in-process LRU of `max_sessions` indexes. Refreshing only
+    re-embeds files whose content hash changed: files are first compared by size and mtime, so an
+    unchanged session costs a directory listing, and removed files are deleted from the index.
+
+    Args:
+        persist_root: Directory to persist indexes in, defaults to storage/session_indexes
+        max_sessions: Number of session indexes kept in memory
+    """
+
+    def __init__(self, persist_root: Optional[str] = None, max_sessions: Optional[int] = None):
+        self.persist_root = persist_root or os.getenv(
+            "SESSION_INDEX_DIR", os.path.join(STORAGE_DIR, "session_indexes")
+        )
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_INDEX_CACHE_SIZE", "8"))
+        self._indexes: "OrderedDict[str, VectorStoreIndex]" = OrderedDict()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        # Refreshes of different sessions run in parallel threads, the LRU is shared between them
+        self._indexes_lock = threading.Lock()
+
+    def persist_dir(self, session_id: str) -> str:
+        return os.path.join(self.persist_root, session_id)
+
+    def _lock(self, session_id: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(session_id, threading.Lock())
+
+    def _cached(self, session_id: str) -> Optional[VectorStoreIndex]:
+        with self._indexes_lock:
+            return self._indexes.get(session_id)
+
+    def _remember(self, session_id: str, index: VectorStoreIndex) -> None:
+        with self._indexes_lock:
+            self._indexes[session_id] = index
+            self._indexes.move_to_end(session_id)
+            while len(self._indexes) > self.max_sessions:
+                evicted, _ = self._indexes.popitem(last=False)
+                logger.debug(f"Evicted session index {evicted} from memory")
+
+    def _read_manifest(self, session_id: str) -> Dict[str, Any]:
+        path = os.path.join(self.persist_dir(session_id), MANIFEST_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, session_id: str, manifest: Dict[str, Any]) -> None:
+        path = os.path.join(self.persist_dir(session_id), MANIFEST_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _load(self, session_id: str) -> Optional[VectorStoreIndex]:
+        persist_dir = self.persist_dir(session_id)
+        if not os.path.exists(os.path.join(persist_dir, MANIFEST_FILE)):
+            return None
+        try:
+            storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+            return load_index_from_storage(storage_context)
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable session index {persist_dir}: {e}")
+            return None
+
+    def refresh_sync(self, session_id: str) -> VectorStoreIndex:
+        """
+        Load the session's index and bring it up to date with its research files, blocking.
+        """
+        data_dir = get_session_data_path(session_id)
+        if not data_dir.exists():
+            raise ValueError(f"No research data found for session {session_id}")
+
+        with self._lock(session_id):
+            index = self._cached(session_id) or self._load(session_id)
+            manifest = self._read_manifest(session_id) if index is not None else {}
+            if index is None:
+                index = VectorStoreIndex(nodes=[])
+
+            current = {}
+            for path in sorted(data_dir.rglob("*")):
+                if path.is_file():
+                    stat = path.stat()
+                    current[str(path.relative_to(data_dir))] = (str(path), stat.st_size, stat.st_mtime)
+
+            changed = False
+            for name in set(manifest) - set(current):
+                for doc_id in manifest.pop(name)["doc_ids"]:
+                    index.delete_ref_doc(doc_id, delete_from_docstore=True)
+                changed = True
+
+            for name, (path, size, mtime) in current.items():
+                entry = manifest.get(name)
+                if entry and entry["size"] == size and entry["mtime"] == mtime:
+                    continue
+                content_hash = _file_hash(path)
+                if entry and entry["hash"] == content_hash:
+                    entry.update(size=size, mtime=mtime)
+                    changed = True
+                    continue
+                if entry:
+                    for doc_id in entry["doc_ids"]:
+                        index.delete_ref_doc(doc_id, delete_from_docstore=True)
+                documents = SimpleDirectoryReader(input_files=[path], filename_as_id=True).load_data()
+                for document in documents:
+                    index.insert(document)
+                manifest[name] = {
+                    "size": size,
+                    "mtime": mtime,
+                    "hash": content_hash,
+                    "doc_ids": [document.doc_id for document in documents],
+                }
+                logger.info(f"Indexed {name} for session {session_id}")
+                changed = True
+
+            if changed or not os.path.exists(self.persist_dir(session_id)):
+                index.storage_context.persist(persist_dir=self.persist_dir(session_id))
+                self._write_manifest(session_id, manifest)
+            self._remember(session_id, index)
+            return index
+
+    async def refresh(self, session_id: str) -> VectorStoreIndex:
+        """
+        Returns the session's up to date index, building or incrementally updating it when files changed.
+        """
+        return await asyncio.to_thread(self.refresh_sync, session_id)
+
+
+_store: Optional[SessionIndexStore] = None
+
+
+def get_session_index_store() -> SessionIndexStore:
+    global _store
+    if _store is None:
+        _store = SessionIndexStore()
+    return _store
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from crawl4ai import AsyncWebCrawler
+
+logger = logging.getLogger("uvicorn")
+
+
+class _PooledCrawler:
+    def __init__(self):
+        # None while the browser is launching, `launched` is set once it is ready or failed to launch
+        self.crawler: Optional[AsyncWebCrawler] = None
+        self.launched = asyncio.Event()
+        self.error: Optional[BaseException] = None
+        self.active = 0
+        self.pages_served = 0
+        self.retired = False
+
+
+async def _launch_crawler() -> AsyncWebCrawler:
+    crawler = AsyncWebCrawler(verbose=False)
+    await crawler.__aenter__()
+    return crawler
+
+
+class CrawlerPool:
+    """
+    Long lived, bounded pool of crawl4ai browsers shared by all agents.
+
+    crawl4ai opens a fresh browser context per `arun` call, so one browser can serve several
+    pages concurrently. The pool launches up to `size` browsers on demand, hands each out to at
+    most `pages_per_crawler` concurrent readers, and recycles a browser once it has served
+    `max_pages` pages or fails its health check, so page reads only pay navigation cost.
+
+    Args:
+        size: Maximum number of browsers
+        pages_per_crawler: Maximum concurrent pages per browser
+        max_pages: Pages a browser serves before it is recycled
+        factory: Coroutine that launches a ready crawler, override in tests and benchmarks
+
+    Example:
+        >>> async with get_crawler_pool().acquire() as crawler:
+        ...     result = await crawler.arun(url=url, bypass_cache=True)
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        pages_per_crawler: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        factory: Callable[[], Awaitable[AsyncWebCrawler]] = _launch_crawler,
+    ):
+        self.size = size or int(os.getenv("CRAWLER_POOL_SIZE", "2"))
+        self.pages_per_crawler = pages_per_crawler or int(os.getenv("CRAWLER_PAGES_PER_BROWSER", "4"))
+        self.max_pages = max_pages or int(os.getenv("CRAWLER_MAX_PAGES_PER_BROWSER", "100"))
+        self.factory = factory
+        self.launches = 0
+        self.recycles = 0
+        self._crawlers: List[_PooledCrawler] = []
+        self._slots = asyncio.Semaphore(self.size * self.pages_per_crawler)
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    @staticmethod
+    def is_healthy(crawler: AsyncWebCrawler) -> bool:
+        browser = getattr(crawler.crawler_strategy, "browser", None)
+        return crawler.ready and browser is not None and browser.is_connected()
+
+    async def _checkout(self) -> _PooledCrawler:
+        async with self._lock:
+            if self._closed:
+                raise RuntimeError("Crawler pool is closed")
+            for pooled in list(self._crawlers):
+                if pooled.crawler is not None and not pooled.retired and not self.is_healthy(pooled.crawler):
+                    logger.warning("Recycling unhealthy crawler browser")
+                    await self._retire(pooled)
+            live = [pooled for pooled in self._crawlers if not pooled.retired]
+            available = [pooled for pooled in live if pooled.active < self.pages_per_crawler]
+            launch = not (available and (min(p.active for p in available) == 0 or len(live) >= self.size))
+            if launch:
+                # Every browser is busy (or none exist yet) and there is room for another
+                self.launches += 1
+                pooled = _PooledCrawler()
+                self._crawlers.append(pooled)
+            else:
+                pooled = min(available, key=lambda p: p.active)
+            pooled.active += 1
+
+        # Browsers launch outside the lock, so checkouts of running browsers do not wait for them
+        if launch:
+            await self._launch(pooled)
+        else:
+            await pooled.launched.wait()
+        if pooled.error is not None:
+            raise pooled.error
+        return pooled
+
+    async def _launch(self, pooled: _PooledCrawler) -> None:
+        try:
+            crawler = await self.factory()
+        except BaseException as e:
+            pooled.error = RuntimeError(f"Crawler browser failed to launch: {e!r}")
+            async with self._lock:
+                if pooled in self._crawlers:
+                    self._crawlers.remove(pooled)
+            pooled.launched.set()
+            raise
+        async with self._lock:
+            if pooled not in self._crawlers:
+                # The pool was closed while the browser launched
+                pooled.error = RuntimeError("Crawler pool is closed")
+                pooled.crawler = crawler
+                await self._close(pooled)
+            else:
+                pooled.crawler = crawler
+        pooled.launched.set()
+
+    async def _release(self, pooled: _PooledCrawler) -> None:
+        async with self._lock:
+            pooled.active -= 1
+            pooled.pages_served += 1
+            if not pooled.retired and pooled.pages_served >= self.max_pages:
+                await self._retire(pooled)
+            elif pooled.retired and pooled.active == 0:
+                await self._close(pooled)
+
+    async def _retire(self, pooled: _PooledCrawler) -> None:
+        pooled.retired = True
+        self.recycles += 1
+        if pooled.active == 0:
+            await self._close(pooled)
+
+    async def _close(self, pooled: _PooledCrawler) -> None:
+        if pooled in self._crawlers:
+            self._crawlers.remove(pooled)
+        if pooled.crawler is None:
+            # Still launching, `_launch` closes it once it is up
+            return
+        try:
+            await pooled.crawler.__aexit__(None, None, None)
+        except Exception as e:
+            logger.warning(f"Error closing crawler browser: {e}")
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[AsyncWebCrawler]:
+        async with self._slots:
+            pooled = await self._checkout()
+            try:
+                yield pooled.crawler
+            finally:
+                await self._release(pooled)
+
+    async def close(self) -> None:
+        async with self._lock:
+            self._closed = True
+            for pooled in list(self._crawlers):
+                await self._close(pooled)
+
+
+# One pool per event loop, browsers cannot be shared across loops
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, CrawlerPool]" = weakref.WeakKeyDictionary()
+
+
+def get_crawler_pool() -> CrawlerPool:
+    """
+    Returns the crawler pool of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None or pool._closed:
+        pool = _pools[loop] = CrawlerPool()
+    return pool
+
+
+async def close_crawler_pool() -> None:
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
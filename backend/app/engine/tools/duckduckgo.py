@@ -1,5 +1,7 @@
 from llama_index.core.tools.function_tool import FunctionTool
 
+from app.engine.tools.search_cache import get_search_cache
+
 
 def duckduckgo_search(
     query: str,
@@ -13,6 +15,12 @@ def duckduckgo_search(
         region Optional(str): The region to be used for the search in [country-language] convention, ex us-en, uk-en, ru-ru, etc...
         max_results Optional(int): The maximum number of results to be returned. Default is 10.
     """
+    cache = get_search_cache()
+    if cache is not None:
+        cached = cache.get("duckduckgo", query, region=region, max_results=max_results)
+        if cached is not None:
+            return cached
+
     try:
         from duckduckgo_search import DDGS
     except ImportError:
@@ -30,6 +38,8 @@ def duckduckgo_search(
                 max_results=max_results,
             )
         )
+    if cache is not None:
+        cache.set("duckduckgo", query, results, region=region, max_results=max_results)
     return results
 
 
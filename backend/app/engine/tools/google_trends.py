@@ -1,6 +1,8 @@
+import asyncio
 from typing import Dict, List, Optional
 from serpapi import GoogleSearch
 from app.settings import Settings
+from app.engine.tools.search_cache import get_search_cache
 import os
 
 async def google_trends_search(
@@ -27,6 +29,13 @@ async def google_trends_search(
     if not api_key:
         raise ValueError("SerpAPI key is required. Please provide it or set SERP_API_KEY environment variable.")
         
+    cache = get_search_cache()
+    cache_kwargs = dict(data_type=data_type, time_range=time_range, category=category)
+    if cache is not None:
+        cached = cache.get("google_trends", query, **cache_kwargs)
+        if cached is not None:
+            return cached
+
     params = {
         "engine": "google_trends",
         "q": query,
@@ -38,12 +47,24 @@ async def google_trends_search(
     
     try:
         search = GoogleSearch(params)
-        results = search.get_dict()
-        return {
+        # The SerpAPI client is blocking, run it in a thread so the other searches keep going
+        results = await asyncio.to_thread(search.get_dict)
+        # SerpAPI reports errors (invalid key, quota, no results) in the response instead of raising
+        if results.get("error"):
+            return {
+                "success": False,
+                "data": None,
+                "error": results["error"]
+            }
+        response = {
             "success": True,
             "data": results,
             "error": None
         }
+        # Only successful lookups are cached, errors are retried on the next call
+        if cache is not None:
+            cache.set("google_trends", query, response, **cache_kwargs)
+        return response
     except Exception as e:
         return {
             "success": False,
@@ -0,0 +1,167 @@
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from app.config import STORAGE_DIR
+from app.utils.cache import SQLiteCache, make_cache_key
+from app.utils.concurrency import SingleFlight
+
+logger = logging.getLogger("uvicorn")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """
+    URL level cache for pages fetched by `read_webpage`.
+
+    A page entry stores the raw HTML, the crawler markdown, the locally cleaned text and the
+    validators (ETag / Last-Modified) the server sent. Entries younger than `freshness` are used
+    as-is; older entries are revalidated with a conditional GET and only refetched when the
+    server reports a change. Extraction results are stored separately, keyed on the URL, the
+    page content hash and a hash of the instruction/schema, so a changed page never serves
+    stale extractions. Both tiers are evicted least-recently-used on disk, pages get
+    `page_share` of the `max_bytes` budget and extractions, which are much smaller, the rest.
+
+    Concurrent reads of the same URL (or the same extraction) share a single fetch.
+
+    Args:
+        path: SQLite file to store pages in
+        freshness: Seconds a page is used without revalidation
+        ttl: Seconds before a page is dropped from disk
+        max_bytes: Disk budget for the page and extraction entries together
+        page_share: Share of `max_bytes` for the page entries
+    """
+
+    def __init__(
+        self,
+        path: str,
+        freshness: float = 3600,
+        ttl: float = 7 * 24 * 3600,
+        max_bytes: Optional[int] = None,
+        page_share: float = 0.75,
+    ):
+        self.freshness = freshness
+        page_bytes = int(max_bytes * page_share) if max_bytes is not None else None
+        extraction_bytes = max_bytes - page_bytes if max_bytes is not None else None
+        self.pages = SQLiteCache(path, namespace="pages", ttl=ttl, max_bytes=page_bytes)
+        self.extractions = SQLiteCache(path, namespace="page_extractions", ttl=ttl, max_bytes=extraction_bytes)
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.extraction_hits = 0
+        self.extraction_misses = 0
+        self._flight = SingleFlight()
+
+    async def get_page(
+        self,
+        url: str,
+        fetch: Callable[[str], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        Returns the cached page for `url`, calling `fetch(url)` on a miss or when the page changed.
+        `fetch` returns a dict with at least html, markdown and headers.
+        """
+        return await self._flight.run(("page", url), lambda: self._get_page(url, fetch))
+
+    async def _get_page(self, url: str, fetch: Callable[[str], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        page = self.pages.get_json(url)
+        if page is not None:
+            if time.time() - page["fetched_at"] < self.freshness:
+                self.hits += 1
+                return page
+            if await self._is_unchanged(url, page):
+                self.revalidated += 1
+                page["fetched_at"] = time.time()
+                self.pages.set_json(url, page)
+                return page
+
+        self.misses += 1
+        page = await fetch(url)
+        headers = {k.lower(): v for k, v in (page.pop("headers", None) or {}).items()}
+        page.update(
+            etag=headers.get("etag"),
+            last_modified=headers.get("last-modified"),
+            content_hash=content_hash(page.get("markdown") or ""),
+            fetched_at=time.time(),
+        )
+        self.pages.set_json(url, page)
+        return page
+
+    async def _is_unchanged(self, url: str, page: Dict[str, Any]) -> bool:
+        headers = {}
+        if page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
+        if not headers:
+            return False
+        try:
+            async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
+                response = await client.get(url, headers=headers)
+            return response.status_code == 304
+        except httpx.HTTPError as e:
+            logger.debug(f"Revalidation of {url} failed: {e}")
+            return False
+
+    async def get_extraction(
+        self,
+        page: Dict[str, Any],
+        url: str,
+        extract: Callable[[], Awaitable[str]],
+        **params: Any,
+    ) -> str:
+        """
+        Returns the cached extraction of `page` for the given instruction/schema params,
+        running `extract()` once on a miss.
+        """
+        key = make_cache_key(url, page["content_hash"], params)
+        cached = self.extractions.get_json(key)
+        if cached is not None:
+            self.extraction_hits += 1
+            return cached
+
+        async def run() -> str:
+            self.extraction_misses += 1
+            content = await extract()
+            self.extractions.set_json(key, content)
+            return content
+
+        return await self._flight.run(("extraction", key), run)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "extraction_hits": self.extraction_hits,
+            "extraction_misses": self.extraction_misses,
+            "coalesced": self._flight.coalesced,
+        }
+
+
+_page_cache: Optional[PageCache] = None
+_page_cache_initialized = False
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """
+    Returns the process wide page cache, or None if disabled via PAGE_CACHE_ENABLED=false.
+    """
+    global _page_cache, _page_cache_initialized
+    if not _page_cache_initialized:
+        _page_cache_initialized = True
+        if os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true":
+            _page_cache = PageCache(
+                path=os.getenv("PAGE_CACHE_PATH", os.path.join(STORAGE_DIR, "cache", "pages.sqlite")),
+                freshness=float(os.getenv("PAGE_CACHE_FRESHNESS", "3600")),
+                ttl=float(os.getenv("PAGE_CACHE_TTL", str(7 * 24 * 3600))),
+                max_bytes=int(float(os.getenv("PAGE_CACHE_MAX_MB", "512")) * 1024 * 1024),
+            )
+    return _page_cache
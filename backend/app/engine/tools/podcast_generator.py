@@ -1,14 +1,23 @@
+import asyncio
+import io
 import requests
+import httpx
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Optional
 import logging
 from pydantic import BaseModel, Field
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from llama_index.core.tools import FunctionTool
 
+from app.engine.tools.podcast_stream import PLAYLIST_NAME, HLSPlaylistWriter
+from app.engine.tools.tts_cache import TTSCache, get_tts_cache
+from app.utils.concurrency import SingleFlight
+
 logger = logging.getLogger(__name__)
 
+ELEVENLABS_API_URL = "https://api.elevenlabs.io"
 OUTPUT_DIR = "output/tools"
 
 class VoiceSettings(BaseModel):
@@ -23,10 +32,22 @@ class TTSRequest(BaseModel):
     voice_settings: VoiceSettings = Field(default_factory=VoiceSettings)
 
 class ElevenLabsGenerator:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: float = 120.0,
+    ):
         self.api_key = api_key or os.getenv("ELEVENLABS_API_KEY")
         if not self.api_key:
             raise ValueError("ElevenLabs API key not provided")
+        self.base_url = base_url or os.getenv("ELEVENLABS_API_URL", ELEVENLABS_API_URL)
+        # ElevenLabs plans cap concurrent requests (2-15 depending on tier)
+        self.max_concurrency = max_concurrency or int(os.getenv("ELEVENLABS_MAX_CONCURRENCY", "4"))
+        self.timeout = timeout
+        self.cache = get_tts_cache()
+        self._flight = SingleFlight()
         
         self.output_dir = Path(OUTPUT_DIR)
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -42,10 +63,21 @@ class ElevenLabsGenerator:
         """Get voice ID for speaker role"""
         return self.voice_mapping.get(speaker.lower(), self.voice_mapping["default"])
 
+    def segment_key(self, text: str, speaker: str) -> str:
+        """Cache key of a segment, the voice, model and voice settings it is synthesized with and its text"""
+        request = TTSRequest(text=text)
+        return TTSCache.key(self._get_voice_id(speaker), request.model_id, request.voice_settings, text)
+
     def generate_audio_segment(self, text: str, speaker: str) -> bytes:
         """Generate audio for a single segment"""
+        key = self.segment_key(text, speaker)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
         voice_id = self._get_voice_id(speaker)
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+        url = f"{self.base_url}/v1/text-to-speech/{voice_id}"
         
         headers = {
             "Content-Type": "application/json",
@@ -58,9 +90,12 @@ class ElevenLabsGenerator:
             response = requests.post(
                 url, 
                 headers=headers,
-                json=request.model_dump()
+                json=request.model_dump(),
+                timeout=self.timeout
             )
             response.raise_for_status()
+            if self.cache is not None:
+                self.cache.set(key, response.content)
             return response.content
             
         except Exception as e:
@@ -68,6 +103,103 @@ class ElevenLabsGenerator:
             logger.exception(e)
             raise
 
+    def _client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"xi-api-key": self.api_key},
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+
+    async def agenerate_audio_segment(self, text: str, speaker: str, client: Optional[httpx.AsyncClient] = None) -> bytes:
+        """Generate audio for a single segment, over the given pooled client if any"""
+        key = self.segment_key(text, speaker)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        if client is None:
+            async with self._client() as client:
+                return await self._post_segment(text, speaker, client, key)
+        return await self._post_segment(text, speaker, client, key)
+
+    async def _post_segment(self, text: str, speaker: str, client: httpx.AsyncClient, key: str) -> bytes:
+        voice_id = self._get_voice_id(speaker)
+        request = TTSRequest(text=text)
+        try:
+            response = await client.post(f"/v1/text-to-speech/{voice_id}", json=request.model_dump())
+            response.raise_for_status()
+            if self.cache is not None:
+                self.cache.set(key, response.content)
+            return response.content
+        except Exception as e:
+            logger.error(f"Failed to generate audio for text: {text[:50]}...")
+            logger.exception(e)
+            raise
+
+    async def synthesize_segments(
+        self,
+        segments: List[Tuple[str, str]],
+        on_segment: Optional[Callable[[int, bytes], Awaitable[None]]] = None,
+    ) -> List[bytes]:
+        """
+        Synthesize all segments concurrently, at most max_concurrency at a time over one connection pool.
+        Cached segments are served without a request and repeated segments are only synthesized once.
+        `on_segment(index, audio)` is awaited as each segment completes, in completion order.
+        Returns the audio of each segment in script order.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._client() as client:
+            async def synthesize(index: int, speaker: str, text: str) -> bytes:
+                key = self.segment_key(text, speaker)
+                audio = self.cache.get(key) if self.cache is not None else None
+                if audio is None:
+                    async def fetch() -> bytes:
+                        async with semaphore:
+                            return await self._post_segment(text, speaker, client, key)
+                    
+                    audio = await self._flight.run(key, fetch)
+                if on_segment is not None:
+                    await on_segment(index, audio)
+                return audio
+            
+            return await asyncio.gather(*[synthesize(index, speaker, text) for index, (speaker, text) in enumerate(segments)])
+
+    def decode_segment(self, audio: bytes, key: Optional[str] = None) -> Any:
+        """
+        Decode a segment's mp3 in memory, reusing the cached decoded segment for a known key.
+        """
+        from pydub import AudioSegment
+        
+        segment = self.cache.get_decoded(key) if key and self.cache is not None else None
+        if segment is None:
+            segment = AudioSegment.from_file(io.BytesIO(audio), format="mp3")
+            if key and self.cache is not None:
+                self.cache.set_decoded(key, segment)
+        return segment
+
+    def assemble_audio(self, audio_segments: List[bytes], output_path: str, keys: Optional[List[str]] = None) -> None:
+        """
+        Decode the mp3 segments in memory and export them as one file. The decoded PCM frames are
+        joined once, instead of growing the podcast segment by segment which copies it every time.
+        With segment keys, decoded segments are reused from the cache so only changed segments are decoded.
+        """
+        decoded = [self.decode_segment(audio, keys[index] if keys else None) for index, audio in enumerate(audio_segments)]
+        self.export_audio(decoded, output_path)
+
+    @staticmethod
+    def export_audio(decoded: List[Any], output_path: str) -> None:
+        first = decoded[0]
+        frames = [
+            segment.set_frame_rate(first.frame_rate).set_channels(first.channels).set_sample_width(first.sample_width).raw_data
+            for segment in decoded
+        ]
+        first._spawn(b"".join(frames)).export(output_path, format="mp3")
+
     def _sanitize_filename(self, filename: str) -> str:
         """
         Sanitize filename by:
@@ -86,44 +218,43 @@ class ElevenLabsGenerator:
             clean_name = f"{clean_name}.mp3"
         return clean_name
 
-    def generate_podcast(self, segments: List[Tuple[str, str]], filename: str, session_id: str) -> str:
-        """Generate podcast audio from segments"""
+    def _output_path(self, filename: str, session_id: str) -> str:
+        clean_filename = self._sanitize_filename(filename)
+        os.makedirs(self.output_dir / session_id, exist_ok=True)
+        return str(self.output_dir / session_id / clean_filename)
+
+    @staticmethod
+    def _file_url(path: str) -> str:
+        return f"{os.getenv('FILESERVER_URL_PREFIX')}/{path}"
+
+    async def agenerate_podcast(
+        self,
+        segments: List[Tuple[str, str]],
+        filename: str,
+        session_id: str,
+        on_stream_ready: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """
+        Generate podcast audio from segments.
+        With `on_stream_ready`, the podcast is also published as an HLS playlist while it is synthesized,
+        and `on_stream_ready(playlist_url)` is called as soon as the first segment is playable.
+        """
         try:
-            # Sanitize the filename
-            clean_filename = self._sanitize_filename(filename)
-            os.makedirs(self.output_dir / session_id, exist_ok=True)
-            output_path = str(self.output_dir / session_id / clean_filename)
-            
-            # Generate and concatenate audio segments
-            from pydub import AudioSegment
-            final_audio = None
-            
-            for speaker, text in segments:
-                # Generate audio bytes
-                audio_bytes = self.generate_audio_segment(text, speaker)
-                
-                # Save to temporary file
-                temp_path = str(self.output_dir / session_id / f"temp_{speaker}.mp3")
-                with open(temp_path, "wb") as f:
-                    f.write(audio_bytes)
-                
-                # Load audio segment
-                audio_segment = AudioSegment.from_mp3(temp_path)
-                
-                # Add to final audio
-                if final_audio is None:
-                    final_audio = audio_segment
-                else:
-                    final_audio += audio_segment
-                
-                # Clean up temp file
-                Path(temp_path).unlink()
+            if not segments:
+                raise ValueError("No segments to generate the podcast from")
+            output_path = self._output_path(filename, session_id)
+            keys = [self.segment_key(text, speaker) for speaker, text in segments]
             
-            # Export final audio
-            final_audio.export(output_path, format="mp3")
+            if on_stream_ready is None:
+                audio_segments = await self.synthesize_segments(segments)
+                # Decoding and encoding are CPU bound, keep them off the event loop
+                await asyncio.to_thread(self.assemble_audio, audio_segments, output_path, keys)
+            else:
+                decoded = await self._synthesize_progressively(segments, keys, output_path, on_stream_ready)
+                await asyncio.to_thread(self.export_audio, decoded, output_path)
             logger.info(f"Podcast generated at: {output_path}")
             
-            file_url = f"{os.getenv('FILESERVER_URL_PREFIX')}/{output_path}"
+            file_url = self._file_url(output_path)
             return file_url
             
         except Exception as e:
@@ -131,9 +262,59 @@ class ElevenLabsGenerator:
             logger.exception(e)
             raise 
 
+    async def _synthesize_progressively(
+        self,
+        segments: List[Tuple[str, str]],
+        keys: List[str],
+        output_path: str,
+        on_stream_ready: Callable[[str], None],
+    ) -> List[Any]:
+        stream_dir = str(Path(output_path).with_suffix("")) + "_stream"
+        writer = HLSPlaylistWriter(stream_dir)
+        decoded: Dict[int, Any] = {}
+        
+        async def on_segment(index: int, audio: bytes) -> None:
+            # Decoding gives the segment duration for the playlist, and is reused for the final export
+            decoded[index] = await asyncio.to_thread(self.decode_segment, audio, keys[index])
+            was_playable = bool(writer.published)
+            writer.add(index, audio, decoded[index].duration_seconds)
+            if writer.published and not was_playable:
+                on_stream_ready(self._file_url(os.path.join(stream_dir, PLAYLIST_NAME)))
+        
+        await self.synthesize_segments(segments, on_segment=on_segment)
+        writer.finish()
+        return [decoded[index] for index in range(len(segments))]
+
+    def generate_podcast(self, segments: List[Tuple[str, str]], filename: str, session_id: str) -> str:
+        """
+        Generate podcast audio from segments, blocking. Safe to call from a thread with a running event
+        loop, async callers should await `agenerate_podcast` which pools connections and can stream.
+        """
+        try:
+            if not segments:
+                raise ValueError("No segments to generate the podcast from")
+            output_path = self._output_path(filename, session_id)
+            keys = [self.segment_key(text, speaker) for speaker, text in segments]
+            
+            # Repeated segments are only synthesized once, at most max_concurrency requests at a time
+            unique = {key: segment for key, segment in zip(keys, segments)}
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                audio = dict(zip(unique, executor.map(lambda segment: self.generate_audio_segment(segment[1], segment[0]), unique.values())))
+            self.assemble_audio([audio[key] for key in keys], output_path, keys)
+            logger.info(f"Podcast generated at: {output_path}")
+            
+            return self._file_url(output_path)
+            
+        except Exception as e:
+            logger.error("Failed to generate podcast audio")
+            logger.exception(e)
+            raise
+
 def get_tools(**kwargs):
+    generator = ElevenLabsGenerator(**kwargs)
     return [FunctionTool.from_defaults(
-        ElevenLabsGenerator(**kwargs).generate_podcast,
+        fn=generator.generate_podcast,
+        async_fn=generator.agenerate_podcast,
         name="generate_podcast",
         description="Generate a podcast from a list of text segments with different speakers"
     )]
\ No newline at end of file
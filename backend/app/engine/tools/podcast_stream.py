@@ -0,0 +1,77 @@
+import math
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PLAYLIST_NAME = "playlist.m3u8"
+
+
+class HLSPlaylistWriter:
+    """
+    Writes a podcast as a growing HLS event playlist of mp3 segments while it is synthesized.
+
+    Segments may complete in any order, they are buffered and published in script order as
+    soon as the next one is available: the segment file is written first, then the playlist
+    is atomically replaced, so a player polling the playlist never sees a missing segment.
+    `finish` closes the playlist (#EXT-X-ENDLIST) so players stop polling.
+
+    Args:
+        directory: Directory to write the playlist and segments to, served by the static file mount
+        target_duration: Upper bound on segment duration advertised to players, in seconds
+    """
+
+    def __init__(self, directory: str, target_duration: int = 30):
+        self.directory = Path(directory)
+        self.target_duration = target_duration
+        self.published: List[Tuple[str, float]] = []
+        self.finished = False
+        self._pending: Dict[int, Tuple[bytes, float]] = {}
+        # Start from an empty directory, a previous run of the same podcast may have left segments behind
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def playlist_path(self) -> str:
+        return str(self.directory / PLAYLIST_NAME)
+
+    def add(self, index: int, audio: bytes, duration: float) -> int:
+        """
+        Buffer the segment at `index` and publish every segment that is now next in line.
+        Returns the number of published segments.
+        """
+        self._pending[index] = (audio, duration)
+        published = len(self.published)
+        while published in self._pending:
+            audio, duration = self._pending.pop(published)
+            name = f"segment_{published:04d}.mp3"
+            with open(self.directory / name, "wb") as f:
+                f.write(audio)
+            self.published.append((name, duration))
+            published += 1
+        if published:
+            self._write_playlist()
+        return published
+
+    def finish(self) -> None:
+        self.finished = True
+        self._write_playlist()
+
+    def _write_playlist(self) -> None:
+        # Players cope with a target duration that grows, not with segments longer than it
+        target_duration = max([self.target_duration] + [math.ceil(duration) for _, duration in self.published])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{target_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for name, duration in self.published:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(name)
+        if self.finished:
+            lines.append("#EXT-X-ENDLIST")
+        with open(f"{self.playlist_path}.tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(f"{self.playlist_path}.tmp", self.playlist_path)
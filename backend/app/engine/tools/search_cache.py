@@ -0,0 +1,105 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from app.config import STORAGE_DIR
+from app.utils.cache import TieredCache, make_cache_key
+
+# Default freshness window per search tool in seconds, override with SEARCH_CACHE_TTL_<TOOL>
+DEFAULT_FRESHNESS = {
+    "tavily": 6 * 60 * 60,
+    "duckduckgo": 6 * 60 * 60,
+    "google_trends": 24 * 60 * 60,
+}
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so trivially different spellings share a cache entry.
+
+    Example:
+        >>> normalize_query('  Best  AI sales-email tools? ')
+        'best ai sales-email tools'
+    """
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.strip(" ?!.,;:\"'")
+
+
+class SearchResultCache:
+    """
+    Disk backed cache for search tool results shared across sessions.
+
+    Entries are keyed on the tool, the normalized query, the domain filter, the topic and any
+    other parameters that change the results, and expire after the tool's freshness window.
+
+    Args:
+        path: SQLite file to store results in
+        freshness: Freshness window in seconds per tool name
+    """
+
+    def __init__(self, path: str, freshness: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.freshness = {**DEFAULT_FRESHNESS, **(freshness or {})}
+        self._caches: Dict[str, TieredCache] = {}
+
+    def _cache(self, tool: str) -> TieredCache:
+        if tool not in self._caches:
+            self._caches[tool] = TieredCache(
+                namespace=f"search:{tool}",
+                path=self.path,
+                ttl=self.freshness.get(tool, DEFAULT_FRESHNESS["tavily"]),
+                max_memory_entries=256,
+                max_disk_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "20000")),
+            )
+        return self._caches[tool]
+
+    @staticmethod
+    def key(
+        tool: str,
+        query: str,
+        include_domains: Optional[List[str]] = None,
+        topic: Optional[str] = None,
+        **params: Any,
+    ) -> str:
+        return make_cache_key(
+            tool,
+            normalize_query(query),
+            sorted(d.strip().lower() for d in include_domains or []),
+            topic,
+            params,
+        )
+
+    def get(self, tool: str, query: str, **kwargs: Any) -> Optional[Any]:
+        return self._cache(tool).get_json(self.key(tool, query, **kwargs))
+
+    def set(self, tool: str, query: str, result: Any, **kwargs: Any) -> None:
+        self._cache(tool).set_json(self.key(tool, query, **kwargs), result)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            tool: {**cache.stats.model_dump(), "hit_rate": cache.stats.hit_rate}
+            for tool, cache in self._caches.items()
+        }
+
+
+_search_cache: Optional[SearchResultCache] = None
+_search_cache_initialized = False
+
+
+def get_search_cache() -> Optional[SearchResultCache]:
+    """
+    Returns the process wide search result cache, or None if disabled via SEARCH_CACHE_ENABLED=false.
+    """
+    global _search_cache, _search_cache_initialized
+    if not _search_cache_initialized:
+        _search_cache_initialized = True
+        if os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true":
+            freshness = {
+                tool: float(os.getenv(f"SEARCH_CACHE_TTL_{tool.upper()}", ttl))
+                for tool, ttl in DEFAULT_FRESHNESS.items()
+            }
+            _search_cache = SearchResultCache(
+                path=os.getenv("SEARCH_CACHE_PATH", os.path.join(STORAGE_DIR, "cache", "search.sqlite")),
+                freshness=freshness,
+            )
+    return _search_cache
@@ -1,14 +1,166 @@
-from llama_index.core.tools.function_tool import FunctionTool
-from typing import Literal, Optional, List
+import asyncio
+import logging
 import os
+import weakref
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import httpx
+from llama_index.core.tools.function_tool import FunctionTool
+
+from app.engine.tools.search_cache import SearchResultCache, get_search_cache
+from app.utils.concurrency import SingleFlight
+
+logger = logging.getLogger("uvicorn")
 
 MAX_RESULTS = 5
+TAVILY_API_URL = "https://api.tavily.com"
 
-def tavily_search(
+
+def _get_api_key(api_key: Optional[str] = None) -> str:
+    api_key = api_key or os.getenv("TAVILY_API_KEY")
+    if not api_key:
+        raise ValueError("Tavily API key is required. Please provide it or set TAVILY_API_KEY environment variable.")
+    return api_key
+
+
+def _search_payload(
+    query: str,
+    search_depth: str,
+    max_results: int,
+    topic: str,
+    include_domains: Optional[List[str]],
+    include_answer: bool = False,
+) -> Dict[str, Any]:
+    return {
+        "query": query,
+        "search_depth": search_depth,
+        "max_results": max_results,
+        "topic": topic,
+        "include_domains": include_domains or [],
+        "include_answer": include_answer,
+    }
+
+
+class AsyncTavilySearchBackend:
+    """
+    Async Tavily search client shared by all agents.
+
+    All requests go through one pooled HTTP connection pool, at most `max_concurrency`
+    requests are in flight at a time, and identical lookups issued concurrently by
+    parallel agents are coalesced into a single network round-trip. Results are served
+    from the shared search cache while they are within the Tavily freshness window.
+
+    Args:
+        api_key: Tavily API key, defaults to the TAVILY_API_KEY env variable
+        base_url: Tavily API URL, set TAVILY_API_URL to point it at a local stub server
+        max_concurrency: Maximum number of requests in flight
+        max_connections: Size of the HTTP connection pool
+        timeout: Request timeout in seconds
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        max_connections: Optional[int] = None,
+        timeout: float = 60.0,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url or os.getenv("TAVILY_API_URL", TAVILY_API_URL)
+        self.max_concurrency = max_concurrency or int(os.getenv("TAVILY_MAX_CONCURRENCY", "8"))
+        self.max_connections = max_connections or int(os.getenv("TAVILY_MAX_CONNECTIONS", "20"))
+        self.timeout = timeout
+        self.requests_sent = 0
+        self._flight = SingleFlight()
+        # httpx clients and semaphores are bound to the event loop they are first used on, each loop
+        # gets its own, they are dropped along with their loop
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def coalesced(self) -> int:
+        return self._flight.coalesced
+
+    def _ensure_client(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None or entry[0].is_closed:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            entry = self._clients[loop] = (client, asyncio.Semaphore(self.max_concurrency))
+        return entry
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        client, semaphore = self._ensure_client()
+        async with semaphore:
+            self.requests_sent += 1
+            response = await client.post(
+                path, json={"api_key": _get_api_key(self.api_key), **payload}
+            )
+        response.raise_for_status()
+        return response.json()
+
+    async def search(
+        self,
+        query: str,
+        search_depth: str = "advanced",
+        max_results: int = MAX_RESULTS,
+        topic: str = "general",
+        include_domains: Optional[List[str]] = None,
+        include_answer: bool = False,
+    ) -> Dict[str, Any]:
+        cache = get_search_cache()
+        cache_kwargs = dict(
+            include_domains=include_domains,
+            topic=topic,
+            search_depth=search_depth,
+            max_results=max_results,
+            include_answer=include_answer,
+        )
+        if cache is not None:
+            cached = cache.get("tavily", query, **cache_kwargs)
+            if cached is not None:
+                return cached
+
+        async def fetch() -> Dict[str, Any]:
+            payload = _search_payload(query, search_depth, max_results, topic, include_domains, include_answer)
+            result = await self._post("/search", payload)
+            if cache is not None:
+                cache.set("tavily", query, result, **cache_kwargs)
+            return result
+
+        return await self._flight.run(SearchResultCache.key("tavily", query, **cache_kwargs), fetch)
+
+    async def aclose(self) -> None:
+        """
+        Closes the client of the running event loop.
+        """
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].aclose()
+
+
+_backend: Optional[AsyncTavilySearchBackend] = None
+_sync_client: Optional[httpx.Client] = None
+
+
+def get_tavily_backend() -> AsyncTavilySearchBackend:
+    global _backend
+    if _backend is None:
+        _backend = AsyncTavilySearchBackend()
+    return _backend
+
+
+async def atavily_search(
     query: str,
     search_depth: str = "advanced",
     max_results: int = MAX_RESULTS,
-    api_key: Optional[str] = None,
     topic: Literal["general", "news"] = "general",
     include_domains: Optional[List[str]] = None,
 ):
@@ -17,62 +169,81 @@ def tavily_search(
     Args:
         query (str): The query to search.
         search_depth (str): The search depth to use ('basic' or 'advanced'). Default is 'advanced'.
-        max_results (int): The maximum number of results to be returned. Default is 10.
-        api_key (Optional[str]): Tavily API key. If not provided, will look for TAVILY_API_KEY env variable.
+        max_results (int): The maximum number of results to be returned. Default is 5.
+        topic (str): The category of the search ('general' or 'news'). Default is 'general'.
+        include_domains (Optional[List[str]]): Only return results from these domains.
     """
-    try:
-        from tavily import TavilyClient
-    except ImportError:
-        raise ImportError(
-            "tavily-python package is required to use this function. "
-            "Please install it by running: `poetry add tavily-python` or `pip install tavily-python`"
-        )
-
-    api_key = api_key or os.getenv("TAVILY_API_KEY")
-    if not api_key:
-        raise ValueError("Tavily API key is required. Please provide it or set TAVILY_API_KEY environment variable.")
-
-    client = TavilyClient(api_key=api_key)
-    response = client.search(
+    return await get_tavily_backend().search(
         query=query,
         search_depth=search_depth,
         max_results=max_results,
         topic=topic,
         include_domains=include_domains,
     )
-    
-    return response
 
 
-def tavily_qna_search(
+async def atavily_qna_search(
     query: str,
 ):
     """
     Use this function to get quick answers to questions using Tavily's API.
     Args:
         query (str): The question to ask.
-        api_key (Optional[str]): Tavily API key. If not provided, will look for TAVILY_API_KEY env variable.
     """
-    try:
-        from tavily import TavilyClient
-    except ImportError:
-        raise ImportError(
-            "tavily-python package is required to use this function. "
-            "Please install it by running: `poetry add tavily-python` or `pip install tavily-python`"
-        )
+    response = await get_tavily_backend().search(
+        query=query, search_depth="advanced", include_answer=True
+    )
+    return response.get("answer")
 
-    api_key = api_key or os.getenv("TAVILY_API_KEY")
-    if not api_key:
-        raise ValueError("Tavily API key is required. Please provide it or set TAVILY_API_KEY environment variable.")
 
-    client = TavilyClient(api_key=api_key)
-    response = client.qna_search(query=query)
-    
-    return response
+def tavily_search(
+    query: str,
+    search_depth: str = "advanced",
+    max_results: int = MAX_RESULTS,
+    api_key: Optional[str] = None,
+    topic: Literal["general", "news"] = "general",
+    include_domains: Optional[List[str]] = None,
+):
+    """
+    Use this function to search for any query using Tavily's API.
+    Blocking variant of `atavily_search` for callers without an event loop, prefer the async version in agents.
+    Args:
+        query (str): The query to search.
+        search_depth (str): The search depth to use ('basic' or 'advanced'). Default is 'advanced'.
+        max_results (int): The maximum number of results to be returned. Default is 5.
+        api_key (Optional[str]): Tavily API key. If not provided, will look for TAVILY_API_KEY env variable.
+    """
+    global _sync_client
+    cache = get_search_cache()
+    cache_kwargs = dict(
+        include_domains=include_domains,
+        topic=topic,
+        search_depth=search_depth,
+        max_results=max_results,
+        include_answer=False,
+    )
+    if cache is not None:
+        cached = cache.get("tavily", query, **cache_kwargs)
+        if cached is not None:
+            return cached
+
+    if _sync_client is None:
+        _sync_client = httpx.Client(
+            base_url=os.getenv("TAVILY_API_URL", TAVILY_API_URL), timeout=60.0
+        )
+    payload = _search_payload(query, search_depth, max_results, topic, include_domains)
+    response = _sync_client.post(
+        "/search", json={"api_key": _get_api_key(api_key), **payload}
+    )
+    response.raise_for_status()
+    result = response.json()
+    if cache is not None:
+        cache.set("tavily", query, result, **cache_kwargs)
+    return result
 
 
 def get_tools(**kwargs):
     return [
-        FunctionTool.from_defaults(tavily_search, description="Search the web for information, it returns a list of urls and content"),
-        FunctionTool.from_defaults(tavily_qna_search, description="Ask a question to the web, it returns a detailed answer"),
-    ]
\ No newline at end of file
+        FunctionTool.from_defaults(async_fn=atavily_search, name="tavily_search", description="Search the web for information, it returns a list of urls and content"),
+        FunctionTool.from_defaults(async_fn=atavily_qna_search, name="tavily_qna_search", description="Ask a question to the web, it returns a detailed answer"),
+    ]
@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+import unicodedata
+from typing import Any, Dict, Optional
+
+from cachetools import LRUCache
+from pydantic import BaseModel
+
+from app.config import STORAGE_DIR
+from app.utils.cache import SQLiteCache, make_cache_key
+
+logger = logging.getLogger("uvicorn")
+
+
+def normalize_tts_text(text: str) -> str:
+    """
+    Canonical form of a segment's text for cache keys: NFC unicode and collapsed whitespace.
+    """
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+class TTSCache:
+    """
+    Persistent cache of synthesized podcast segments.
+
+    Segment audio is stored on disk keyed on the voice, model, voice settings and normalized
+    text, so revising a script or re-running an idea only pays for the segments whose text
+    changed. The disk tier is evicted least-recently-used once it exceeds `max_bytes`. Decoded
+    segments are additionally kept in a bounded in-memory LRU, so re-assembling a podcast after
+    a small edit only decodes the changed segments.
+
+    Args:
+        path: SQLite file to store segment audio in
+        max_bytes: Disk budget for segment audio
+        max_decoded_bytes: Memory budget for decoded (PCM) segments
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, max_decoded_bytes: int = 256 * 1024 * 1024):
+        self.segments = SQLiteCache(path, namespace="tts_segments", max_bytes=max_bytes)
+        self.decoded: LRUCache = LRUCache(maxsize=max_decoded_bytes, getsizeof=lambda segment: len(segment.raw_data))
+        self._decoded_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.decode_hits = 0
+        self.decode_misses = 0
+
+    @staticmethod
+    def key(voice_id: str, model_id: str, voice_settings: BaseModel, text: str) -> str:
+        return make_cache_key("tts", voice_id, model_id, voice_settings, normalize_tts_text(text))
+
+    def get(self, key: str) -> Optional[bytes]:
+        audio = self.segments.get(key)
+        if audio is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return audio
+
+    def set(self, key: str, audio: bytes) -> None:
+        self.segments.set(key, audio)
+
+    def get_decoded(self, key: str) -> Optional[Any]:
+        with self._decoded_lock:
+            segment = self.decoded.get(key)
+        if segment is None:
+            self.decode_misses += 1
+        else:
+            self.decode_hits += 1
+        return segment
+
+    def set_decoded(self, key: str, segment: Any) -> None:
+        with self._decoded_lock:
+            try:
+                self.decoded[key] = segment
+            except ValueError:
+                # Larger than the whole memory budget
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "decode_hits": self.decode_hits,
+            "decode_misses": self.decode_misses,
+            "evictions": self.segments.evictions,
+        }
+
+
+_tts_cache: Optional[TTSCache] = None
+_tts_cache_initialized = False
+
+
+def get_tts_cache() -> Optional[TTSCache]:
+    """
+    Returns the process wide TTS segment cache, or None if disabled via TTS_CACHE_ENABLED=false.
+    """
+    global _tts_cache, _tts_cache_initialized
+    if not _tts_cache_initialized:
+        _tts_cache_initialized = True
+        if os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true":
+            _tts_cache = TTSCache(
+                path=os.getenv("TTS_CACHE_PATH", os.path.join(STORAGE_DIR, "cache", "tts.sqlite")),
+                max_bytes=int(float(os.getenv("TTS_CACHE_MAX_MB", "1024")) * 1024 * 1024),
+                max_decoded_bytes=int(float(os.getenv("TTS_CACHE_DECODED_MAX_MB", "256")) * 1024 * 1024),
+            )
+    return _tts_cache
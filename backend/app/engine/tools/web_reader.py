@@ -1,67 +1,190 @@
+import asyncio
 import logging
 import os
-from typing import List, Optional, Dict, Any, Union
+import re
+from typing import List, Literal, Optional, Dict, Any, Union
 import json
 
 from llama_index.core.tools import FunctionTool
+from llama_index.core.utils import get_tokenizer
 from pydantic import BaseModel, Field
-from crawl4ai import AsyncWebCrawler
 from crawl4ai.extraction_strategy import LLMExtractionStrategy
 
+from app.engine.tools.browser_pool import get_crawler_pool
+from app.engine.tools.page_cache import get_page_cache
+
 logger = logging.getLogger("uvicorn")
 
+# Pages whose cleaned markdown fits this many tokens are returned without an LLM extraction pass
+DEFAULT_TOKEN_BUDGET = 6000
+# Pages where more than this share of the text is links are treated as noisy (index pages, link farms)
+MAX_LINK_RATIO = 0.5
+# Pages with fewer words than this after cleaning are likely rendered client side or blocked
+MIN_WORDS = 80
+
+MARKDOWN_LINK = re.compile(r"!?\[([^\]]*)\]\(([^)]*)\)")
+
 
 class WebReaderResult(BaseModel):
     content: str | None = None
     url: str
     is_error: bool
     error_message: Optional[str] = None
+    extraction_mode: Optional[str] = None
 
 class DefaultSchema(BaseModel):
     content: str = Field(description="The main content of the page, filtering out all the noise, do not summarize the content, include all important details including statistics, quotes, examples, stories, etc")
 
+
+def clean_markdown(markdown: str) -> str:
+    """
+    Local boilerplate removal on the crawler's markdown: drops images, link-only lines
+    (navigation, footers, share buttons) and repeated lines, and collapses blank lines.
+    """
+    lines = []
+    seen = set()
+    for line in markdown.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("!["):
+            continue
+        text = MARKDOWN_LINK.sub(r"\1", stripped).strip(" *-|#>")
+        if stripped and len(text.split()) <= 3 and MARKDOWN_LINK.search(stripped):
+            continue
+        if len(text) > 20:
+            if text in seen:
+                continue
+            seen.add(text)
+        # Keep the link text, the URLs only cost tokens
+        lines.append(MARKDOWN_LINK.sub(r"\1", line).rstrip())
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def link_ratio(markdown: str) -> float:
+    if not markdown:
+        return 1.0
+    link_chars = sum(len(match.group(1)) for match in MARKDOWN_LINK.finditer(markdown))
+    return link_chars / max(len(MARKDOWN_LINK.sub(r"\1", markdown)), 1)
+
+
+def needs_llm_extraction(raw_markdown: str, cleaned: str, token_budget: int) -> bool:
+    """
+    Decide whether the locally cleaned page is good enough to hand to the agent as-is.
+    """
+    if len(cleaned.split()) < MIN_WORDS:
+        return True
+    if link_ratio(raw_markdown) > MAX_LINK_RATIO:
+        return True
+    return len(get_tokenizer()(cleaned)) > token_budget
+
+
+async def _crawl(url: str) -> Dict[str, Any]:
+    async with get_crawler_pool().acquire() as crawler:
+        result = await crawler.arun(
+            url=url,
+            remove_overlay_elements=True,
+            magic=True,
+            bypass_cache=True,
+        )
+    if not result.success:
+        raise ValueError(result.error_message or "Failed to fetch the page")
+    markdown = result.markdown or ""
+    return {
+        "html": result.html,
+        "markdown": markdown,
+        "cleaned": clean_markdown(markdown),
+        "headers": result.response_headers or {},
+    }
+
+
+async def fetch_page(url: str) -> Dict[str, Any]:
+    """
+    Fetch a page through the shared page cache, falling back to a direct crawl when it is disabled.
+    """
+    cache = get_page_cache()
+    if cache is None:
+        return await _crawl(url)
+    return await cache.get_page(url, _crawl)
+
+
 async def read_webpage(
     url: str,
     instruction: str = "Extract the main content of the page, do not summarize the content, include all important details including statistics, quotes, examples, stories, etc",
     provider: str = "openai/gpt-4o-mini",
-    schema: Dict | None = DefaultSchema.model_json_schema(),
+    schema: Dict | None = None,
     openai_api_key: Optional[str] = None,
+    extraction_mode: Literal["auto", "fast", "llm"] = "auto",
+    token_budget: Optional[int] = None,
 ) -> WebReaderResult:
     """
     Read and extract structured content from a webpage using crawl4ai.
-    
+
+    Extraction is tiered: in "auto" mode the page is cleaned locally and returned as markdown when it
+    fits the token budget and is not dominated by links, an LLM extraction pass only runs for noisy
+    or oversized pages, or when a schema is given.
+
     Parameters:
         url (str): The URL to read content from
-        schema (Dict): Pydantic model schema defining the structure to extract
+        schema (Dict): Pydantic model schema defining the structure to extract, forces LLM extraction
         instruction (str): Instructions for the LLM on what to extract
         provider (str): LLM provider to use
         openai_api_key (Optional[str]): OpenAI API key. If not provided, will try to get from env
+        extraction_mode (str): "auto", "fast" (local cleaning only) or "llm" (always use the LLM)
+        token_budget (Optional[int]): Maximum tokens of cleaned markdown returned without LLM extraction
     """
-    api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY is required for LLM extraction")
+    token_budget = token_budget or int(os.getenv("WEB_READER_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
 
     try:
-        async with AsyncWebCrawler(verbose=True) as crawler:
-            result = await crawler.arun(
+        page = await fetch_page(url)
+        raw_markdown = page["markdown"]
+        cleaned = page["cleaned"]
+        if extraction_mode == "fast" or (
+            extraction_mode == "auto"
+            and schema is None
+            and not needs_llm_extraction(raw_markdown, cleaned, token_budget)
+        ):
+            if extraction_mode == "fast":
+                tokenizer = get_tokenizer()
+                tokens = tokenizer(cleaned)
+                if len(tokens) > token_budget:
+                    # Truncate at the budget rather than pay for an LLM pass
+                    cleaned = cleaned[: len(cleaned) * token_budget // len(tokens)]
+            return WebReaderResult(
+                content=cleaned,
                 url=url,
-                remove_overlay_elements=True,
-                strategy=LLMExtractionStrategy(
-                    instruction=instruction,
-                    schema=schema,
-                    provider=provider,
-                    openai_api_key=api_key
-                ),
-                magic=True,
-                bypass_cache=True,
+                is_error=False,
+                extraction_mode="fast",
             )
-        
+
+        api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY is required for LLM extraction")
+
+        strategy = LLMExtractionStrategy(
+            instruction=instruction,
+            schema=schema or DefaultSchema.model_json_schema(),
+            provider=provider,
+            api_token=api_key,
+        )
+
+        async def extract() -> str:
+            # Extract from the already fetched page, the strategy makes blocking LLM calls
+            extracted = await asyncio.to_thread(strategy.run, url, [cleaned or raw_markdown])
+            return json.dumps(extracted, ensure_ascii=False, default=str)
+
+        cache = get_page_cache()
+        if cache is not None:
+            content = await cache.get_extraction(
+                page, url, extract, instruction=instruction, schema=strategy.schema, provider=provider
+            )
+        else:
+            content = await extract()
         return WebReaderResult(
-            content=result.extracted_content,
+            content=content,
             url=url,
-            is_error=False
+            is_error=False,
+            extraction_mode="llm",
         )
-            
+
     except Exception as e:
         error_message = f"Error reading webpage: {str(e)}"
         logger.error(error_message)
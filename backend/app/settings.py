@@ -3,6 +3,28 @@ from typing import Dict
 
 from llama_index.core.settings import Settings
 
+# Default rate limit budgets per model provider, used by the LLM scheduler (app/engine/llm_scheduler.py).
+# Override for the active provider with LLM_RPM, LLM_TPM and LLM_MAX_CONCURRENCY.
+LLM_RATE_LIMITS: Dict[str, Dict[str, int]] = {
+    "openai": {"rpm": 500, "tpm": 200_000, "max_concurrency": 32},
+    "azure-openai": {"rpm": 300, "tpm": 120_000, "max_concurrency": 16},
+    "nvidia": {"rpm": 40, "tpm": 100_000, "max_concurrency": 8},
+    "groq": {"rpm": 30, "tpm": 30_000, "max_concurrency": 8},
+    "anthropic": {"rpm": 50, "tpm": 40_000, "max_concurrency": 8},
+    "gemini": {"rpm": 60, "tpm": 120_000, "max_concurrency": 8},
+    "mistral": {"rpm": 60, "tpm": 100_000, "max_concurrency": 8},
+    "ollama": {"rpm": 10_000, "tpm": 10_000_000, "max_concurrency": 4},
+}
+
+
+def get_llm_rate_limits(provider: str) -> Dict[str, int]:
+    limits = dict(LLM_RATE_LIMITS.get(provider, LLM_RATE_LIMITS["openai"]))
+    if provider == os.getenv("MODEL_PROVIDER"):
+        for name, env in (("rpm", "LLM_RPM"), ("tpm", "LLM_TPM"), ("max_concurrency", "LLM_MAX_CONCURRENCY")):
+            if os.getenv(env):
+                limits[name] = int(os.getenv(env))
+    return limits
+
 
 def init_settings():
     model_provider = os.getenv("MODEL_PROVIDER")
@@ -33,6 +55,11 @@ def init_settings():
     Settings.chunk_size = int(os.getenv("CHUNK_SIZE", "1024"))
     Settings.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "20"))
 
+    if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true":
+        from app.engine.embedding_cache import CachedEmbedding
+
+        Settings.embed_model = CachedEmbedding.wrap(Settings.embed_model)
+
 
 def init_ollama():
     try:
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Any, Optional, Tuple
+
+from cachetools import LRUCache
+from pydantic import BaseModel
+
+logger = logging.getLogger("uvicorn")
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    Build a stable content hash from arbitrary JSON-serializable parts.
+
+    Args:
+        parts: Values that identify the cached item (model name, messages, etc.)
+
+    Returns:
+        str: A sha256 hex digest of the canonical JSON encoding of the parts
+
+    Example:
+        >>> make_cache_key("gpt-4o", 0.1, [{"role": "user", "content": "hi"}])
+        '3b0c...'
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=_json_default)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class BaseCache(ABC):
+    """
+    Minimal byte-oriented cache interface so backends can be swapped out.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    def get_json(self, key: str) -> Optional[Any]:
+        value = self.get(key)
+        if value is None:
+            return None
+        try:
+            return json.loads(value.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            self.delete(key)
+            return None
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set(key, json.dumps(value, default=_json_default).encode("utf-8"), ttl=ttl)
+
+
+class SQLiteCache(BaseCache):
+    """
+    On-disk cache backed by a single SQLite file. Entries are namespaced so several
+    caches can share one file, expire after their TTL and are evicted least-recently-used
+    first once the namespace exceeds max_entries or max_bytes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries (namespace, accessed_at)"
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                )
+                return None
+            self._conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            return bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, sqlite3.Binary(value), len(value), expires_at, now),
+            )
+            self._evict(now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at < ?",
+            (self.namespace, now),
+        )
+        if self.max_entries is None and self.max_bytes is None:
+            return
+
+        count, total_size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()
+        if (self.max_entries is None or count <= self.max_entries) and (
+            self.max_bytes is None or total_size <= self.max_bytes
+        ):
+            return
+
+        # Walk the namespace from least to most recently used and drop entries until we fit
+        rows = self._conn.execute(
+            "SELECT key, size FROM cache_entries WHERE namespace = ? ORDER BY accessed_at ASC",
+            (self.namespace,),
+        ).fetchall()
+        to_delete = []
+        for key, size in rows:
+            if (self.max_entries is None or count <= self.max_entries) and (
+                self.max_bytes is None or total_size <= self.max_bytes
+            ):
+                break
+            to_delete.append((self.namespace, key))
+            count -= 1
+            total_size -= size
+        self._conn.executemany(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", to_delete
+        )
+        self.evictions += len(to_delete)
+
+
+class TieredCache(BaseCache):
+    """
+    An in-memory LRU in front of an optional SQLiteCache. Reads check memory first,
+    then disk (promoting disk hits into memory); writes go to both tiers.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_memory_entries: int = 1024,
+        max_disk_entries: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._memory: LRUCache = LRUCache(maxsize=max_memory_entries)
+        self._memory_lock = threading.Lock()
+        self._disk: Optional[SQLiteCache] = None
+        if path:
+            self._disk = SQLiteCache(
+                path=path,
+                namespace=namespace,
+                ttl=ttl,
+                max_entries=max_disk_entries,
+                max_bytes=max_disk_bytes,
+            )
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._memory_lock:
+            entry: Optional[Tuple[Optional[float], bytes]] = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at >= time.time():
+                    self.stats.hits += 1
+                    self.stats.memory_hits += 1
+                    return value
+                self._memory.pop(key, None)
+
+        if self._disk is not None:
+            value = self._disk.get(key)
+            if value is not None:
+                self._set_memory(key, value, self.ttl)
+                self.stats.hits += 1
+                self.stats.disk_hits += 1
+                return value
+
+        self.stats.misses += 1
+        return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        self._set_memory(key, value, ttl)
+        if self._disk is not None:
+            try:
+                self._disk.set(key, value, ttl=ttl)
+                self.stats.evictions = self._disk.evictions
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write {self.namespace} cache entry to disk: {e}")
+        self.stats.writes += 1
+
+    def delete(self, key: str) -> None:
+        with self._memory_lock:
+            self._memory.pop(key, None)
+        if self._disk is not None:
+            self._disk.delete(key)
+
+    def clear(self) -> None:
+        with self._memory_lock:
+            self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def _set_memory(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        with self._memory_lock:
+            self._memory[key] = (expires_at, value)
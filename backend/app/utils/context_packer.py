@@ -0,0 +1,225 @@
+import math
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Union
+
+from llama_index.core.llms import LLM
+from llama_index.core.utils import get_tokenizer
+from pydantic import BaseModel
+
+from app.utils.dedup import NearDuplicateIndex
+
+# Share of the model's context window research context may use, the rest is left for
+# the instructions, the agent's memory and the answer
+DEFAULT_CONTEXT_RATIO = 0.5
+DEFAULT_CHUNK_TOKENS = 400
+# Lines with fewer words (JSON keys, brackets, list bullets) are never dropped as duplicates
+MIN_DUPLICATE_LINE_WORDS = 8
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with we you your our they their".split()
+)
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str) -> int:
+    """
+    Token count of a text, memoized so the same chunk is only tokenized once per process.
+    """
+    return len(get_tokenizer()(text))
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in WORD.findall(text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+
+class ContextChunk(BaseModel):
+    source: str
+    position: int
+    text: str
+    tokens: int
+    score: float = 0.0
+
+
+def get_context_budget(llm: Optional[LLM] = None) -> int:
+    """
+    Token budget for packed research context, CONTEXT_TOKEN_BUDGET or a share of the model's context window.
+    """
+    if os.getenv("CONTEXT_TOKEN_BUDGET"):
+        return int(os.getenv("CONTEXT_TOKEN_BUDGET"))
+    if llm is None:
+        from llama_index.core.settings import Settings
+
+        llm = Settings.llm
+    ratio = float(os.getenv("CONTEXT_TOKEN_RATIO", DEFAULT_CONTEXT_RATIO))
+    return int(llm.metadata.context_window * ratio)
+
+
+class ContextPacker:
+    """
+    Packs research material into a token budget for an analyzer prompt.
+
+    The sources are split into paragraph chunks, near duplicate paragraphs and lines (e.g. the
+    same quote or competitor description returned by several agents, see `NearDuplicateIndex`)
+    are dropped, the chunks are ranked by BM25 relevance to the task, and the best chunks that
+    fit the budget are returned in their original order under their source headings.
+
+    Args:
+        token_budget: Maximum tokens of packed context, defaults to `get_context_budget()`
+        chunk_tokens: Target size of a chunk
+
+    Example:
+        >>> packer = ContextPacker(token_budget=8000)
+        >>> context = packer.pack(task, {"Initial research": initial, "Refined research": refined})
+    """
+
+    def __init__(self, token_budget: Optional[int] = None, chunk_tokens: int = DEFAULT_CHUNK_TOKENS):
+        self.token_budget = token_budget
+        self.chunk_tokens = chunk_tokens
+
+    def chunk(self, source: str, text: str, seen: Optional[NearDuplicateIndex] = None) -> List[ContextChunk]:
+        """
+        Split a text into chunks of about `chunk_tokens`, skipping paragraphs and lines that are near duplicates of ones in `seen`.
+        """
+        seen = NearDuplicateIndex() if seen is None else seen
+        chunks: List[ContextChunk] = []
+        current: List[str] = []
+        current_tokens = 0
+        # Duplicates are dropped before long paragraphs are broken up, which joins their lines
+        text = "\n\n".join(self._drop_duplicate_lines(paragraph.strip(), seen) for paragraph in re.split(r"\n\s*\n", text))
+        for paragraph in self._paragraphs(text):
+            tokens = count_tokens(paragraph)
+            if current and current_tokens + tokens > self.chunk_tokens:
+                chunks.append(self._make_chunk(source, len(chunks), current))
+                current, current_tokens = [], 0
+            current.append(paragraph)
+            current_tokens += tokens
+        if current:
+            chunks.append(self._make_chunk(source, len(chunks), current))
+        return chunks
+
+    @staticmethod
+    def _drop_duplicate_lines(paragraph: str, seen: NearDuplicateIndex) -> str:
+        """
+        The paragraph without the lines that repeat earlier content, empty if it repeats earlier content as a whole.
+        Everything is checked before anything is added to `seen`, so the kept text never matches itself.
+        """
+        if not paragraph or seen.contains(paragraph):
+            return ""
+        lines = paragraph.split("\n")
+        if len(lines) == 1:
+            seen.add(paragraph)
+            return paragraph
+
+        def is_long(line: str) -> bool:
+            return len(WORD.findall(line.lower())) >= MIN_DUPLICATE_LINE_WORDS
+
+        kept = [line for line in lines if not is_long(line) or not seen.contains(line)]
+        if len(kept) < len(lines) and not any(is_long(line) for line in kept):
+            # Only the scaffolding around the duplicate lines is left
+            return ""
+        if not any(line.strip() for line in kept):
+            return ""
+        unique = []
+        for line in kept:
+            # A line repeated within the paragraph itself is kept once
+            if not is_long(line) or seen.add(line):
+                unique.append(line)
+        text = "\n".join(unique)
+        seen.add(text)
+        return text
+
+    def _paragraphs(self, text: str) -> List[str]:
+        paragraphs = []
+        for paragraph in re.split(r"\n\s*\n", text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if count_tokens(paragraph) <= self.chunk_tokens:
+                paragraphs.append(paragraph)
+                continue
+            # Break up walls of text (e.g. a whole scraped page) so they can be ranked piecewise
+            current = ""
+            for sentence in re.split(r"(?<=[.!?])\s+|\n", paragraph):
+                if current and count_tokens(current) + count_tokens(sentence) > self.chunk_tokens:
+                    paragraphs.append(current)
+                    current = ""
+                current = f"{current} {sentence}".strip()
+            if current:
+                paragraphs.append(current)
+        return paragraphs
+
+    @staticmethod
+    def _make_chunk(source: str, position: int, paragraphs: List[str]) -> ContextChunk:
+        text = "\n\n".join(paragraphs)
+        return ContextChunk(source=source, position=position, text=text, tokens=count_tokens(text))
+
+    @staticmethod
+    def rank(task: str, chunks: List[ContextChunk], k1: float = 1.5, b: float = 0.75) -> List[ContextChunk]:
+        query = set(_terms(task))
+        documents = [Counter(_terms(chunk.text)) for chunk in chunks]
+        if not documents:
+            return []
+        avg_length = sum(sum(doc.values()) for doc in documents) / len(documents) or 1
+        document_frequency = Counter(term for doc in documents for term in query if term in doc)
+        for chunk, doc in zip(chunks, documents):
+            length = sum(doc.values())
+            score = 0.0
+            for term in query:
+                frequency = doc.get(term, 0)
+                if not frequency:
+                    continue
+                idf = math.log(1 + (len(documents) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / avg_length))
+            chunk.score = score
+        return sorted(chunks, key=lambda c: c.score, reverse=True)
+
+    def pack(
+        self,
+        task: str,
+        sources: Union[Dict[str, Union[str, Sequence[str]]], Sequence[str]],
+        token_budget: Optional[int] = None,
+    ) -> str:
+        """
+        Returns the most relevant content of `sources` that fits the budget, as markdown sections.
+        `sources` maps a heading to a text or a list of texts (e.g. one per search result).
+        """
+        budget = token_budget or self.token_budget or get_context_budget()
+        if not isinstance(sources, dict):
+            sources = {"Research": sources}
+
+        chunks: List[ContextChunk] = []
+        seen = NearDuplicateIndex()
+        for source, texts in sources.items():
+            if isinstance(texts, str):
+                texts = [texts]
+            chunks.extend(self.chunk(source, "\n\n".join(str(text) for text in texts), seen))
+
+        if sum(chunk.tokens for chunk in chunks) <= budget:
+            selected = chunks
+        else:
+            selected, used = [], 0
+            for chunk in self.rank(task, chunks):
+                if used + chunk.tokens > budget:
+                    continue
+                selected.append(chunk)
+                used += chunk.tokens
+
+        # Restore the original order so each source still reads coherently
+        order = {source: index for index, source in enumerate(sources)}
+        selected.sort(key=lambda c: (order[c.source], c.position))
+        sections: Dict[str, List[str]] = {}
+        for chunk in selected:
+            sections.setdefault(chunk.source, []).append(chunk.text)
+        return "\n\n".join(f"#### {source}\n\n" + "\n\n".join(texts) for source, texts in sections.items())
+
+
+def pack_context(
+    task: str,
+    sources: Union[Dict[str, Union[str, Sequence[str]]], Sequence[str]],
+    token_budget: Optional[int] = None,
+) -> str:
+    return ContextPacker(token_budget=token_budget).pack(task, sources)
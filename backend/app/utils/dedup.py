@@ -0,0 +1,250 @@
+import hashlib
+import os
+import re
+from difflib import SequenceMatcher
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, TypeVar
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+T = TypeVar("T")
+
+WORD = re.compile(r"[a-z0-9]+")
+_URL = re.compile(r"https?://[^\s<>\"'\])]+")
+
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|dclid|msclkid|mc_cid|mc_eid|igshid|ref|ref_src|source|si)$")
+_COMPANY_SUFFIXES = {"inc", "incorporated", "llc", "ltd", "limited", "corp", "corporation", "co", "company", "gmbh", "plc", "ag", "sa", "hq"}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Canonical form of a URL, so links to the same page compare equal: lower case scheme and host,
+    no "www.", default port, fragment, tracking parameters or trailing slash, sorted query parameters.
+
+    Example:
+        >>> canonicalize_url("HTTP://www.Example.com:80/pricing/?utm_source=x&b=2&a=1#plans")
+        'https://example.com/pricing?a=1&b=2'
+    """
+    url = url.strip()
+    if "://" not in url:
+        url = f"https://{url}"
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url
+    if host.startswith("www."):
+        host = host[4:]
+    netloc = host if port in (None, 80, 443) else f"{host}:{port}"
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAMS.match(key.lower()))
+    # http and https links to the same page are the same source
+    return urlunsplit(("https", netloc, parts.path.rstrip("/"), urlencode(query), ""))
+
+
+def dedupe_urls(urls: Iterable[str], seen: Optional[set] = None) -> List[str]:
+    """
+    The URLs without duplicates by canonical form, in their original form and order.
+    Pass `seen` to also drop the URLs collected before, it is updated in place.
+    """
+    seen = set() if seen is None else seen
+    unique = []
+    for url in urls:
+        if not isinstance(url, str) or not url.strip():
+            continue
+        canonical = canonicalize_url(url)
+        if canonical in seen:
+            continue
+        seen.add(canonical)
+        unique.append(url)
+    return unique
+
+
+def extract_urls(texts: Iterable[str]) -> List[str]:
+    """
+    The http(s) URLs in the texts (e.g. agent outputs), without duplicates by canonical form.
+    """
+    return dedupe_urls(url.rstrip(".,;:'\"") for text in texts for url in _URL.findall(text))
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalized name of a company or product, e.g. "Notion Labs, Inc." and "notion labs" both become "notionlabs".
+    """
+    name = re.sub(r"\(.*?\)", " ", name.lower())
+    name = re.sub(r"\.(com|io|ai|app|co)\b", " ", name)
+    words = WORD.findall(name)
+    while len(words) > 1 and words[-1] in _COMPANY_SUFFIXES:
+        words.pop()
+    return "".join(words)
+
+
+def same_name(name: str, other: str, threshold: float = 0.9) -> bool:
+    """
+    Whether two names refer to the same entity, equal once normalized or fuzzy similar.
+    Short names only match exactly, one letter apart they are often different companies (e.g. Linear and LinearB).
+    """
+    key, other_key = normalize_name(name), normalize_name(other)
+    if key == other_key:
+        return True
+    return min(len(key), len(other_key)) >= 8 and SequenceMatcher(None, key, other_key).ratio() >= threshold
+
+
+def shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    """
+    The word `size`-grams of a text, ignoring case and punctuation.
+    """
+    words = WORD.findall(text.lower())
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def simhash(features: Iterable[str]) -> int:
+    """
+    64 bit SimHash of a set of features (e.g. `shingles(text)`), similar sets differ in few bits.
+    """
+    features = list(features)
+    if not features:
+        return 0
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little") for feature in features),
+        dtype=np.uint64,
+        count=len(features),
+    )
+    # Each bit of the fingerprint is the majority vote of that bit across the feature hashes
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(-1, 64)
+    majority = bits.sum(axis=0) * 2 > len(features)
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class NearDuplicateIndex:
+    """
+    Finds texts that are near duplicates of texts added before: their word shingles overlap by
+    at least `min_similarity` (Jaccard).
+
+    Candidates are found by SimHash of the shingles, fingerprints are split into `max_distance + 1`
+    bands and two fingerprints at most `max_distance` bits apart share at least one band, so only
+    the texts sharing a band are compared. Texts with few shingles (e.g. two URLs that only differ
+    in an id) can be close by SimHash, so candidates are confirmed on their shingles. Texts too
+    short to shingle are matched exactly, ignoring case and punctuation.
+
+    Example:
+        >>> index = NearDuplicateIndex()
+        >>> index.add("The app keeps crashing when I upload photos from my phone, support never answered.")
+        True
+        >>> index.add("The app keeps crashing when I upload photos from my phone! Support never answered")
+        False
+    """
+
+    def __init__(self, max_distance: int = 3, min_similarity: float = 0.8, min_words: int = 6):
+        self.max_distance = max_distance
+        self.min_similarity = min_similarity
+        self.min_words = min_words
+        self.bands = max_distance + 1
+        self._band_bits = 64 // self.bands
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(self.bands)]
+        self._shingles: List[FrozenSet[str]] = []
+        self._exact: set = set()
+        self.duplicates = 0
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        mask = (1 << self._band_bits) - 1
+        return [(fingerprint >> (band * self._band_bits)) & mask for band in range(self.bands)]
+
+    def _key(self, text: str):
+        words = WORD.findall(text.lower())
+        if len(words) < self.min_words:
+            return " ".join(words), None, None
+        features = shingles(text)
+        return None, features, self._band_keys(simhash(features))
+
+    def _contains(self, exact, features, band_keys) -> bool:
+        if exact is not None:
+            return exact in self._exact
+        candidates = {entry for band, key in enumerate(band_keys) for entry in self._buckets[band].get(key, ())}
+        return any(jaccard(features, self._shingles[entry]) >= self.min_similarity for entry in candidates)
+
+    def contains(self, text: str) -> bool:
+        """
+        Whether the text is a near duplicate of one added before, without adding it.
+        """
+        return self._contains(*self._key(text))
+
+    def add(self, text: str) -> bool:
+        """
+        Add a text, returns False (and does not add it) if it is a near duplicate of one added before.
+        """
+        exact, features, band_keys = self._key(text)
+        if self._contains(exact, features, band_keys):
+            self.duplicates += 1
+            return False
+        if exact is not None:
+            self._exact.add(exact)
+            return True
+        entry = len(self._shingles)
+        self._shingles.append(features)
+        for band, key in enumerate(band_keys):
+            self._buckets[band].setdefault(key, []).append(entry)
+        return True
+
+
+def dedupe_texts(items: Sequence[T], key: Callable[[T], str] = str, max_distance: int = 3) -> List[T]:
+    """
+    The items without near duplicates (see `NearDuplicateIndex`) by `key(item)`, keeping the first of each.
+    """
+    index = NearDuplicateIndex(max_distance=max_distance)
+    return [item for item in items if index.add(key(item))]
+
+
+def embedding_dedup_enabled() -> bool:
+    return os.getenv("DEDUP_EMBEDDINGS", "false").lower() == "true"
+
+
+def unique_by_similarity(embeddings: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Indices of the rows to keep so that no two kept rows have a cosine similarity of `threshold`
+    or more, earlier rows win. Compares all pairs with one matrix product.
+    """
+    if len(embeddings) == 0:
+        return np.arange(0)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    unit = embeddings / np.where(norms == 0, 1, norms)
+    similar = (unit @ unit.T) >= threshold
+    keep = np.ones(len(unit), dtype=bool)
+    for row in range(len(unit)):
+        if keep[row]:
+            keep[row + 1:] &= ~similar[row, row + 1:]
+    return np.flatnonzero(keep)
+
+
+async def dedupe_by_embedding(
+    items: Sequence[T],
+    key: Callable[[T], str] = str,
+    threshold: Optional[float] = None,
+    embed_model: Optional[BaseEmbedding] = None,
+) -> List[T]:
+    """
+    The items without semantic duplicates, by cosine similarity of the embeddings of `key(item)`
+    (DEDUP_SIMILARITY_THRESHOLD, 0.95 by default). Returns the items unchanged if embedding fails.
+    """
+    if len(items) < 2:
+        return list(items)
+    if threshold is None:
+        threshold = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", "0.95"))
+    if embed_model is None:
+        from llama_index.core.settings import Settings
+
+        embed_model = Settings.embed_model
+    try:
+        embeddings = np.asarray(await embed_model.aget_text_embedding_batch([key(item) for item in items]), dtype=np.float32)
+    except Exception:
+        return list(items)
+    return [items[index] for index in unique_by_similarity(embeddings, threshold)]
@@ -0,0 +1,459 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.config import STORAGE_DIR
+
+logger = logging.getLogger("uvicorn")
+
+# (seq, kind, payload) of a stream part written by the worker running a job
+JobEvent = Tuple[int, str, Any]
+
+class Job(BaseModel):
+    id: str
+    user_id: str
+    session_id: str
+    payload: Dict[str, Any]
+    status: str
+    enqueued_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    worker_id: Optional[str] = None
+    attempts: int = 0
+    cancel_requested: bool = False
+    error: Optional[str] = None
+
+
+def fair_order(queued: List[Job], running_by_user: Dict[str, int]) -> List[Job]:
+    """
+    Orders queued jobs round robin across users: a user's n-th waiting job is scheduled after
+    every other user's earlier jobs, counting the runs the user already has in progress, so one
+    user submitting many ideas does not hold back everyone else. Ties go to the oldest job.
+    """
+    seen: Dict[str, int] = defaultdict(int)
+    ranked = []
+    for job in sorted(queued, key=lambda job: job.enqueued_at):
+        ranked.append((running_by_user.get(job.user_id, 0) + seen[job.user_id], job.enqueued_at, job))
+        seen[job.user_id] += 1
+    return [job for _, _, job in sorted(ranked, key=lambda item: item[:2])]
+
+
+class BaseJobQueue(ABC):
+    """
+    Queue of research jobs shared between the API processes, which enqueue jobs and follow their
+    stream, and the worker processes, which claim and run them. The SQLite queue is the local
+    implementation, a Redis backed queue can implement the same interface for multi host setups.
+    """
+
+    @abstractmethod
+    def enqueue(self, user_id: str, session_id: str, payload: Dict[str, Any]) -> Job:
+        pass
+
+    @abstractmethod
+    def claim(self, worker_id: str, max_running: int, max_running_per_user: int) -> Optional[Job]:
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        pass
+
+    @abstractmethod
+    def position(self, job_id: str) -> Optional[int]:
+        pass
+
+    @abstractmethod
+    def append_events(self, job_id: str, worker_id: str, events: List[Tuple[str, Any]]) -> bool:
+        pass
+
+    @abstractmethod
+    def read_events(self, job_id: str, after: int = -1, limit: int = 1000) -> List[JobEvent]:
+        pass
+
+    @abstractmethod
+    def heartbeat(self, worker_id: str, job_ids: List[str]) -> Tuple[List[str], List[str]]:
+        pass
+
+    @abstractmethod
+    def finish(self, job_id: str, worker_id: str, status: str, error: Optional[str] = None) -> bool:
+        pass
+
+    @abstractmethod
+    def release(self, job_id: str, worker_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def cancel(self, job_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def requeue_stale(self, timeout: float) -> int:
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        pass
+
+
+class SQLiteJobQueue(BaseJobQueue):
+    """
+    Job queue in a single SQLite file, safe to share between the processes of one host.
+
+    Claims run in an immediate transaction so two workers never claim the same job, and respect
+    a global limit of running jobs as well as a per user limit. Workers heartbeat their running
+    jobs, a job whose worker stopped heartbeating is put back in the queue and resumed from its
+    checkpoints by the next worker, up to `max_attempts` claims, after that it fails. The stream
+    parts of each job (text tokens and agent events) are stored alongside so the API process
+    serving the client can follow the job, only the parts of the job's latest attempt are read.
+
+    Workers only write to the jobs they hold the claim of (`worker_id`), a worker that was
+    presumed dead and whose job was claimed again can no longer change it.
+    """
+
+    def __init__(self, path: str, retention: float = 7 * 24 * 3600, max_attempts: int = 3):
+        self.path = path
+        self.retention = retention
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker_id TEXT,
+                heartbeat_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, enqueued_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs (session_id, status)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempt INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (job_id, seq)
+            )
+            """
+        )
+        # Queues created before the stream parts were scoped by attempt
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(job_events)")]
+        if "attempt" not in columns:
+            self._conn.execute("ALTER TABLE job_events ADD COLUMN attempt INTEGER NOT NULL DEFAULT 1")
+
+    _COLUMNS = "id, user_id, session_id, payload, status, enqueued_at, started_at, finished_at, worker_id, attempts, cancel_requested, error"
+
+    @staticmethod
+    def _to_job(row: Tuple) -> Job:
+        return Job(
+            id=row[0],
+            user_id=row[1],
+            session_id=row[2],
+            payload=json.loads(row[3]),
+            status=row[4],
+            enqueued_at=row[5],
+            started_at=row[6],
+            finished_at=row[7],
+            worker_id=row[8],
+            attempts=row[9],
+            cancel_requested=bool(row[10]),
+            error=row[11],
+        )
+
+    def _active_jobs(self) -> Tuple[List[Job], Dict[str, int]]:
+        rows = self._conn.execute(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        queued, running_by_user = [], defaultdict(int)
+        for row in rows:
+            job = self._to_job(row)
+            if job.status == "queued":
+                queued.append(job)
+            else:
+                running_by_user[job.user_id] += 1
+        return queued, running_by_user
+
+    def enqueue(self, user_id: str, session_id: str, payload: Dict[str, Any]) -> Job:
+        """
+        Queue a job, or return the session's job if one is already queued or running.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {self._COLUMNS} FROM jobs WHERE session_id = ? AND status IN ('queued', 'running')",
+                    (session_id,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("COMMIT")
+                    return self._to_job(row)
+                job = Job(
+                    id=uuid.uuid4().hex,
+                    user_id=user_id,
+                    session_id=session_id,
+                    payload=payload,
+                    status="queued",
+                    enqueued_at=time.time(),
+                )
+                self._conn.execute(
+                    "INSERT INTO jobs (id, user_id, session_id, payload, status, enqueued_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job.id, job.user_id, job.session_id, json.dumps(payload), job.status, job.enqueued_at),
+                )
+                self._conn.execute("COMMIT")
+                return job
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def claim(self, worker_id: str, max_running: int, max_running_per_user: int) -> Optional[Job]:
+        """
+        Claim the next job in fair order, if fewer than `max_running` jobs are running. Users already
+        running `max_running_per_user` jobs are skipped.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued, running_by_user = self._active_jobs()
+                exhausted = [job for job in queued if job.attempts >= self.max_attempts]
+                if exhausted:
+                    self._conn.executemany(
+                        "UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                        [(time.time(), self._attempts_error(job.attempts), job.id) for job in exhausted],
+                    )
+                    queued = [job for job in queued if job.attempts < self.max_attempts]
+                if not queued or sum(running_by_user.values()) >= max_running:
+                    self._conn.execute("COMMIT")
+                    return None
+                job = next(
+                    (job for job in fair_order(queued, running_by_user) if running_by_user[job.user_id] < max_running_per_user),
+                    None,
+                )
+                if job is not None:
+                    now = time.time()
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker_id = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (worker_id, now, now, job.id),
+                    )
+                    job = job.model_copy(update={"status": "running", "worker_id": worker_id, "started_at": now, "attempts": job.attempts + 1})
+                self._conn.execute("COMMIT")
+                return job
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def position(self, job_id: str) -> Optional[int]:
+        """
+        1-based position of a queued job in the order workers will claim jobs, None once it is no longer queued.
+        """
+        with self._lock:
+            queued, running_by_user = self._active_jobs()
+        for index, job in enumerate(fair_order(queued, running_by_user)):
+            if job.id == job_id:
+                return index + 1
+        return None
+
+    def append_events(self, job_id: str, worker_id: str, events: List[Tuple[str, Any]]) -> bool:
+        """
+        Append stream parts of a job, returns False (and drops them) if the worker no longer holds the job's claim.
+        """
+        if not events:
+            return True
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._holds_claim(job_id, worker_id):
+                    self._conn.execute("COMMIT")
+                    return False
+                # Sequence numbers keep increasing across attempts, so followers keep their cursor
+                (last, attempt) = self._conn.execute(
+                    "SELECT (SELECT COALESCE(MAX(seq), -1) FROM job_events WHERE job_id = ?), attempts FROM jobs WHERE id = ?",
+                    (job_id, job_id),
+                ).fetchone()
+                self._conn.executemany(
+                    "INSERT INTO job_events (job_id, seq, kind, payload, attempt) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, last + 1 + index, kind, json.dumps(payload), attempt) for index, (kind, payload) in enumerate(events)],
+                )
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def read_events(self, job_id: str, after: int = -1, limit: int = 1000) -> List[JobEvent]:
+        """
+        Stream parts of the job's latest attempt, the parts of an interrupted attempt are not replayed.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, kind, payload FROM job_events WHERE job_id = ? AND seq > ? "
+                "AND attempt = (SELECT attempts FROM jobs WHERE id = ?) ORDER BY seq LIMIT ?",
+                (job_id, after, job_id, limit),
+            ).fetchall()
+        return [(seq, kind, json.loads(payload)) for seq, kind, payload in rows]
+
+    def heartbeat(self, worker_id: str, job_ids: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Mark the worker's jobs as alive, returns the ones that were asked to cancel and the ones
+        the worker lost the claim of (requeued as stale, then claimed again or finished).
+        """
+        if not job_ids:
+            return [], []
+        placeholders = ", ".join("?" * len(job_ids))
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({placeholders}) AND status = 'running' AND worker_id = ?",
+                (time.time(), *job_ids, worker_id),
+            )
+            rows = self._conn.execute(
+                f"SELECT id, cancel_requested FROM jobs WHERE id IN ({placeholders}) AND status = 'running' AND worker_id = ?",
+                (*job_ids, worker_id),
+            ).fetchall()
+        held = dict(rows)
+        cancel = [job_id for job_id in job_ids if held.get(job_id)]
+        lost = [job_id for job_id in job_ids if job_id not in held]
+        return cancel, lost
+
+    def finish(self, job_id: str, worker_id: str, status: str, error: Optional[str] = None) -> bool:
+        """
+        Record the outcome of a job, returns False if the worker no longer holds the job's claim.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ? AND status = 'running' AND worker_id = ?",
+                (status, time.time(), error, job_id, worker_id),
+            )
+        self._prune()
+        return cursor.rowcount > 0
+
+    def release(self, job_id: str, worker_id: str) -> None:
+        """
+        Put a running job back in the queue, e.g. when its worker shuts down.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL WHERE id = ? AND status = 'running' AND worker_id = ?",
+                (job_id, worker_id),
+            )
+
+    def cancel(self, job_id: str) -> None:
+        """
+        Cancel a queued job right away, a running job is cancelled by its worker on its next heartbeat.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+
+    def requeue_stale(self, timeout: float) -> int:
+        """
+        Put running jobs whose worker stopped heartbeating for `timeout` seconds back in the queue,
+        the ones that used up their attempts fail instead.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                failed = self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, error = ?, worker_id = NULL "
+                    "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                    (now, self._attempts_error(self.max_attempts), now - timeout, self.max_attempts),
+                ).rowcount
+                requeued = self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker_id = NULL WHERE status = 'running' AND heartbeat_at < ?",
+                    (now - timeout,),
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if failed:
+            logger.warning(f"Failed {failed} jobs of unresponsive workers after {self.max_attempts} attempts")
+        if requeued:
+            logger.warning(f"Requeued {requeued} jobs of unresponsive workers")
+        return requeued
+
+    def _holds_claim(self, job_id: str, worker_id: str) -> bool:
+        row = self._conn.execute("SELECT worker_id, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is not None and row == (worker_id, "running")
+
+    @staticmethod
+    def _attempts_error(attempts: int) -> str:
+        return f"The research job was interrupted {attempts} times, giving up"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            queued, running_by_user = self._active_jobs()
+        oldest = min((job.enqueued_at for job in queued), default=None)
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "cancelled": counts.get("cancelled", 0),
+            "running_by_user": dict(running_by_user),
+            "oldest_queued_seconds": round(time.time() - oldest, 1) if oldest is not None else None,
+            "queue": [
+                {"job_id": job.id, "session_id": job.session_id, "user_id": job.user_id}
+                for job in fair_order(queued, running_by_user)
+            ],
+        }
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE finished_at < ?)", (cutoff,)
+            )
+            self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+
+
+_job_queue: Optional[BaseJobQueue] = None
+_job_queue_initialized = False
+
+
+def get_job_queue() -> Optional[BaseJobQueue]:
+    """
+    Returns the research job queue, or None if research runs in the API process (JOB_QUEUE_ENABLED is not true).
+    """
+    global _job_queue, _job_queue_initialized
+    if not _job_queue_initialized:
+        _job_queue_initialized = True
+        if os.getenv("JOB_QUEUE_ENABLED", "false").lower() == "true":
+            _job_queue = SQLiteJobQueue(
+                os.getenv("JOB_QUEUE_PATH", os.path.join(STORAGE_DIR, "jobs.sqlite")),
+                max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+            )
+    return _job_queue
@@ -1,6 +1,6 @@
 import json
 import re
-from typing import Any, Optional
+from typing import Any, List, Optional
 
 def extract_json_from_response(response: str) -> Optional[Any]:
     """
@@ -67,4 +67,126 @@ def extract_code_block_from_response(response: str) -> Optional[str]:
     if block_match:
         return block_match.group(1)
 
-    return response.strip()
\ No newline at end of file
+    return response.strip()
+
+_CLOSERS = {"{": "}", "[": "]"}
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def repair_json(response: str) -> Optional[Any]:
+    """
+    Deterministically repair and parse the JSON in a response string, without another LLM call.
+
+    Fixes the usual ways LLM output breaks JSON: markdown fences and surrounding text, single
+    quoted strings, Python literals, raw newlines in strings, trailing commas, mismatched or
+    missing closing brackets and output truncated mid value (the incomplete last element is dropped).
+
+    Args:
+        response: String that should contain a JSON object or array
+
+    Returns:
+        Parsed JSON content or None if it could not be repaired
+
+    Example:
+        >>> repair_json("{'queries': ['a', 'b',], 'done': True")
+        {'queries': ['a', 'b'], 'done': True}
+    """
+    block_match = re.search(r'```(?:json)?\n(.*?)(?:\n```|$)', response, re.DOTALL)
+    if block_match:
+        response = block_match.group(1)
+    starts = [index for index in (response.find("{"), response.find("[")) if index != -1]
+    if not starts:
+        return None
+
+    out: List[str] = []
+    # Open containers with the output index they were opened at and of their last comma
+    stack: List[List[Any]] = []
+    quote = None
+    escape = False
+    index = min(starts)
+    while index < len(response):
+        char = response[index]
+        if quote is not None:
+            if escape:
+                out.append(char)
+                escape = False
+            elif char == "\\":
+                out.append(char)
+                escape = True
+            elif char == quote:
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            else:
+                out.append(char)
+        elif char in "\"'":
+            out.append('"')
+            quote = char
+        elif char in _CLOSERS:
+            stack.append([char, len(out), None])
+            out.append(char)
+        elif char in "}]":
+            if any(opener == ("{" if char == "}" else "[") for opener, _, _ in stack):
+                # Close containers the output forgot to close first
+                while stack:
+                    opener = stack.pop()[0]
+                    _strip_trailing_comma(out)
+                    out.append(_CLOSERS[opener])
+                    if _CLOSERS[opener] == char:
+                        break
+                if not stack:
+                    break
+        elif char == ",":
+            if stack:
+                stack[-1][2] = len(out)
+            out.append(char)
+        elif char.isalpha():
+            end = index
+            while end < len(response) and (response[end].isalnum() or response[end] == "_"):
+                end += 1
+            word = response[index:end]
+            out.append(_LITERALS.get(word, word))
+            index = end
+            continue
+        else:
+            out.append(char)
+        index += 1
+
+    if quote is not None:
+        out.append('"')
+    # Truncated output: close what is open, dropping incomplete trailing elements until it parses
+    while True:
+        try:
+            return json.loads(_close(out, stack))
+        except json.JSONDecodeError:
+            if not stack:
+                return None
+            _, opened_at, comma_at = stack[-1]
+            if comma_at is not None:
+                del out[comma_at:]
+                stack[-1][2] = None
+            elif len(out) > opened_at + 1 and len(stack) == 1:
+                del out[opened_at + 1:]
+            else:
+                # A nested container cut off before its first complete element is dropped with it
+                del out[opened_at:]
+                stack.pop()
+                if not stack:
+                    return None
+
+
+def _strip_trailing_comma(out: List[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def _close(out: List[str], stack: List[List[Any]]) -> str:
+    text = "".join(out).rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    return text + "".join(_CLOSERS[opener] for opener, _, _ in reversed(stack))
@@ -0,0 +1,290 @@
+import json
+import logging
+import re
+from typing import Any, Callable, Generic, Iterator, List, Optional, Sequence, Set, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger("uvicorn")
+
+T = TypeVar("T", bound=BaseModel)
+
+# Path of a value in the document, object keys and array indices, e.g. ("competitors", 2)
+JsonPath = Tuple[Any, ...]
+
+_STRUCTURAL = re.compile(r'[{}\[\]",:]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_PROSE = re.compile(r"`+|[{\[]")
+
+
+class _Frame:
+    __slots__ = ("kind", "key", "index", "expecting_key")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.key: Any = None
+        self.index = 0
+        self.expecting_key = kind == "{"
+
+
+class _Capture:
+    __slots__ = ("path", "depth", "pieces", "start")
+
+    def __init__(self, path: JsonPath, depth: int, start: int):
+        self.path = path
+        self.depth = depth
+        self.pieces: List[str] = []
+        self.start = start
+
+
+class IncrementalJsonParser:
+    """
+    Parses the JSON document in a streamed LLM response chunk by chunk.
+
+    Values are emitted as soon as they are complete, instead of once the whole response arrived:
+    `feed` returns the (path, value) of every completed object or array whose path matches one of
+    `paths`, where "*" matches any key or index, e.g. ("competitors", "*") yields each competitor.
+    Text before the document (prose, a markdown fence) is skipped. Each character is looked at once,
+    string contents and whitespace are skipped with a regex, so parsing the whole response costs
+    about as much as one pass of the regex extractor.
+
+    The document is the first complete JSON value of the expected root type (an object, or an array
+    when `paths` start with an index), other brackets in the prose (e.g. "see [1]") are skipped.
+    A document inside a markdown code fence wins over one in the prose before it. Each path is
+    emitted once, so the items of a fenced document repeating a draft in the prose are not emitted
+    again, only the ones the draft did not have.
+
+    Example:
+        >>> parser = IncrementalJsonParser(paths=[("competitors", "*")])
+        >>> parser.feed('```json\\n{"competitors": [{"name": "A"}, {"na')
+        [(('competitors', 0), {'name': 'A'})]
+        >>> parser.feed('me": "B"}]}\\n```')
+        [(('competitors', 1), {'name': 'B'})]
+        >>> parser.result()
+        {'competitors': [{'name': 'A'}, {'name': 'B'}]}
+    """
+
+    def __init__(self, paths: Sequence[JsonPath] = ()):
+        self.paths = [tuple(path) for path in paths]
+        self.done = False
+        self._stack: List[_Frame] = []
+        self._captures: List[_Capture] = []
+        self._document: Optional[_Capture] = None
+        self._in_string = False
+        self._escape = False
+        self._key_pieces: Optional[List[str]] = None
+        self._key_start = 0
+        self._value: Any = None
+        self._candidate: Any = None
+        self._fenced = False
+        self._backticks = 0
+        self._document_fenced = False
+        self._emitted: Set[JsonPath] = set()
+        # Types the document can have, an object unless the paths start with an index
+        roots = {path[0] for path in self.paths if path}
+        if () in self.paths or "*" in roots:
+            self._root_types: Tuple[type, ...] = (dict, list)
+        else:
+            self._root_types = tuple({list if isinstance(root, int) else dict for root in roots} or {dict})
+
+    def _reset(self) -> None:
+        self._stack = []
+        self._captures = []
+        self._document = None
+        self._in_string = False
+        self._escape = False
+        self._key_pieces = None
+
+    def _matches(self, path: JsonPath) -> bool:
+        return any(
+            len(pattern) == len(path) and all(part == "*" or part == value for part, value in zip(pattern, path))
+            for pattern in self.paths
+        )
+
+    def _scan_string(self, chunk: str, position: int) -> int:
+        """Skips to the end of the current string, returns the position after it (or the chunk length)."""
+        while position < len(chunk):
+            if self._escape:
+                self._escape = False
+                position += 1
+                continue
+            match = _STRING_SPECIAL.search(chunk, position)
+            if match is None:
+                return len(chunk)
+            position = match.start()
+            if chunk[position] == "\\":
+                self._escape = True
+                position += 1
+            else:
+                self._in_string = False
+                return position + 1
+        return position
+
+    def _skip_prose(self, chunk: str, position: int) -> int:
+        """Skips the text before the document, tracking code fences, returns the position of the next `{` / `[` (or the chunk length)."""
+        while position < len(chunk):
+            match = _PROSE.search(chunk, position)
+            if match is None:
+                self._end_backticks()
+                return len(chunk)
+            if match.group()[0] != "`":
+                self._end_backticks()
+                return match.start()
+            # A fence can be split across chunks, count the backticks until the run ends
+            if match.start() > position:
+                self._end_backticks()
+            self._backticks += len(match.group())
+            position = match.end()
+            if position < len(chunk):
+                self._end_backticks()
+        return position
+
+    def _end_backticks(self) -> None:
+        if self._backticks >= 3:
+            self._fenced = not self._fenced
+        self._backticks = 0
+
+    def feed(self, chunk: str) -> List[Tuple[JsonPath, Any]]:
+        """
+        Consume the next chunk of the response, returns the values it completed.
+        """
+        completed: List[Tuple[JsonPath, Any]] = []
+        if self.done or not chunk:
+            return completed
+        for capture in self._captures:
+            capture.start = 0
+        self._key_start = 0
+
+        position = 0
+        while position < len(chunk):
+            if self._in_string:
+                position = self._scan_string(chunk, position)
+                if not self._in_string and self._key_pieces is not None:
+                    self._key_pieces.append(chunk[self._key_start:position])
+                    self._stack[-1].key = json.loads("".join(self._key_pieces))
+                    self._key_pieces = None
+                continue
+
+            if not self._stack:
+                # Prose before the document
+                position = self._skip_prose(chunk, position)
+                if position == len(chunk):
+                    break
+
+            match = _STRUCTURAL.search(chunk, position)
+            if match is None:
+                break
+            position = match.start()
+            char = chunk[position]
+
+            if char == '"':
+                self._in_string = True
+                frame = self._stack[-1]
+                if frame.kind == "{" and frame.expecting_key:
+                    self._key_pieces = []
+                    self._key_start = position
+                position += 1
+            elif char in "{[":
+                # Path of the new container, the keys / indices of its parents
+                path = tuple(frame.key if frame.kind == "{" else frame.index for frame in self._stack)
+                self._stack.append(_Frame(char))
+                if self._document is None:
+                    self._document = _Capture((), 1, position)
+                    self._document_fenced = self._fenced
+                    self._captures.append(self._document)
+                elif self._matches(path):
+                    self._captures.append(_Capture(path, len(self._stack), position))
+                position += 1
+            elif char in "}]":
+                depth = len(self._stack)
+                self._stack.pop()
+                position += 1
+                while self._captures and self._captures[-1].depth == depth:
+                    capture = self._captures.pop()
+                    capture.pieces.append(chunk[capture.start:position])
+                    try:
+                        value = json.loads("".join(capture.pieces))
+                    except json.JSONDecodeError:
+                        if capture is self._document:
+                            # Braces in the prose before the document, e.g. "{idea}", look for the next document
+                            self._reset()
+                        continue
+                    if capture is self._document:
+                        self._reset()
+                        if not isinstance(value, self._root_types):
+                            # A bracket in the prose, e.g. "see [1]", look for the next document
+                            continue
+                        if self._document_fenced:
+                            self._value = value
+                            self.done = True
+                        elif self._candidate is None:
+                            # A fenced document later in the response is preferred over one in the prose
+                            self._candidate = value
+                    elif capture.path not in self._emitted:
+                        self._emitted.add(capture.path)
+                        completed.append((capture.path, value))
+                if self.done:
+                    break
+            elif char == ":":
+                self._stack[-1].expecting_key = False
+                position += 1
+            elif char == ",":
+                frame = self._stack[-1]
+                if frame.kind == "{":
+                    frame.expecting_key = True
+                else:
+                    frame.index += 1
+                position += 1
+            else:
+                position += 1
+
+        if self._in_string and self._key_pieces is not None:
+            self._key_pieces.append(chunk[self._key_start:])
+        if not self.done:
+            for capture in self._captures:
+                capture.pieces.append(chunk[capture.start:])
+        return completed
+
+    def result(self) -> Optional[Any]:
+        """
+        The parsed document, the first one outside a code fence until a fenced one completes, else None.
+        """
+        return self._value if self.done else self._candidate
+
+
+class StreamingModelParser(Generic[T]):
+    """
+    Validates the items of a streamed JSON response into a Pydantic model as each one completes,
+    e.g. every `CompetitorInfo` of a `CompetitorSearchResponse` while the searcher is still writing.
+    Items that do not validate are skipped, the full response is still validated at the end.
+
+    Args:
+        model: Model of the items
+        path: Path of the items in the document
+        on_item: Called with each validated item
+    """
+
+    def __init__(self, model: Type[T], path: JsonPath, on_item: Optional[Callable[[T], None]] = None):
+        self.model = model
+        self.parser = IncrementalJsonParser(paths=[path])
+        self.on_item = on_item
+        self.items: List[T] = []
+        self.invalid = 0
+
+    def feed(self, chunk: str) -> List[T]:
+        items = []
+        for path, value in self.parser.feed(chunk):
+            try:
+                item = self.model.model_validate(value)
+            except ValidationError as e:
+                self.invalid += 1
+                logger.debug(f"Skipping streamed {self.model.__name__} at {path}: {e}")
+                continue
+            items.append(item)
+            self.items.append(item)
+            if self.on_item is not None:
+                self.on_item(item)
+        return items
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.items)
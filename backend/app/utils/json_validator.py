@@ -1,54 +1,173 @@
-from typing import Type, Optional, Any, Generic, TypeVar
-from app.utils.json_extractor import extract_json_from_response
+import logging
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Type, Optional, Any, Generic, Iterator, TypeVar
+from app.engine.llm_cache import acomplete, astructured_predict, forget_completion, supports_structured_output
+from app.utils.json_extractor import extract_json_from_response, repair_json
 from pydantic import BaseModel
 from textwrap import dedent
 from llama_index.core.llms.function_calling import FunctionCallingLLM
 
 T = TypeVar('T', bound=BaseModel)
 
+logger = logging.getLogger("uvicorn")
+
+
+class StructuredOutputStats(BaseModel):
+    parsed: int = 0  # Valid as returned by the agent
+    repaired_locally: int = 0  # Fixed by the local repair pass, each saves at least one LLM repair call
+    native: int = 0  # Generated or fixed with schema constrained decoding
+    llm_repair_calls: int = 0  # Free text LLM repair calls made
+    failed: int = 0
+
+    @property
+    def llm_repairs_avoided(self) -> int:
+        return self.repaired_locally
+
+
+_stats = StructuredOutputStats()
+_run_stats: ContextVar[Optional[StructuredOutputStats]] = ContextVar("structured_output_stats", default=None)
+
+
+@contextmanager
+def track_structured_output() -> Iterator[StructuredOutputStats]:
+    """
+    Count the structured outputs of the workflows started in this context (and their tasks) separately.
+
+    Example:
+        >>> with track_structured_output() as stats:
+        ...     handler = workflow.run(input=idea)
+    """
+    stats = StructuredOutputStats()
+    token = _run_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _run_stats.reset(token)
+
+
+def structured_output_stats() -> StructuredOutputStats:
+    """
+    Process wide structured output counters.
+    """
+    return _stats
+
+
+def _record(field: str, count: int = 1) -> None:
+    for stats in (_stats, _run_stats.get()):
+        if stats is not None:
+            setattr(stats, field, getattr(stats, field) + count)
+
+
+def native_structured_output_enabled(llm: FunctionCallingLLM) -> bool:
+    """
+    Schema constrained decoding is used when the provider supports it, unless STRUCTURED_OUTPUT_MODE=text.
+    """
+    return os.getenv("STRUCTURED_OUTPUT_MODE", "native").lower() == "native" and supports_structured_output(llm)
+
+
 class JsonValidationHelper(Generic[T]):
     """
     A utility class that helps validate and correct JSON outputs against a Pydantic schema.
+
+    Invalid output is first repaired locally (see `repair_json`), only output that is still invalid
+    costs an LLM call: one schema constrained call where the provider supports structured output,
+    otherwise up to `max_retries` free text correction round-trips.
     """
-    def __init__(self, 
+    def __init__(self,
                  model: Type[T],
                  llm: FunctionCallingLLM,
                  max_retries: int = 3):
         self.model = model
         self.llm = llm
         self.max_retries = max_retries
-        
+
+    def _validate(self, content: Any) -> Optional[T]:
+        if content is None:
+            return None
+        try:
+            return self.model.model_validate(content)
+        except Exception:
+            return None
+
+    async def generate(self, prompt: str) -> Optional[T]:
+        """
+        Generates output for the prompt that follows the schema, with schema constrained decoding where the provider supports it.
+        """
+        if native_structured_output_enabled(self.llm):
+            try:
+                result = await astructured_predict(self.llm, self.model, prompt)
+                _record("native")
+                return result
+            except Exception as e:
+                logger.warning(f"Structured prediction of {self.model.__name__} failed, falling back to parsing text: {e}")
+        output = await acomplete(self.llm, prompt)
+        result = await self.validate_and_fix(output.text)
+        if result is None:
+            # Do not replay the invalid output on the next run
+            forget_completion(self.llm, prompt)
+        return result
+
     async def validate_and_fix(self, content: str) -> Optional[T]:
         """
-        Attempts to validate JSON content against the schema, retrying with AI assistance if needed.
+        Attempts to validate JSON content against the schema, repairing it locally and then retrying with AI assistance if needed.
         """
-        retries = 0
-        last_error = None
         current_content = extract_json_from_response(content)
+        result = self._validate(current_content)
+        if result is not None:
+            _record("parsed")
+            return result
+
+        repaired = repair_json(content)
+        result = self._validate(repaired)
+        if result is not None:
+            _record("repaired_locally")
+            return result
         if current_content is None:
-            current_content = content
+            current_content = repaired if repaired is not None else content
+
+        last_error = ""
+        try:
+            self.model.model_validate(current_content)
+        except Exception as e:
+            last_error = str(e)
+
+        if native_structured_output_enabled(self.llm):
+            try:
+                result = await astructured_predict(
+                    self.llm, self.model, self._generate_reflection_prompt(current_content, last_error), use_cache=False
+                )
+                _record("native")
+                return result
+            except Exception as e:
+                logger.warning(f"Structured repair of {self.model.__name__} failed, falling back to text repair: {e}")
 
+        retries = 0
         while retries < self.max_retries:
+            # Generate a reflection prompt to fix the JSON
+            prompt = self._generate_reflection_prompt(current_content, last_error)
+            logger.debug(prompt)
+
+            # Get corrected JSON from LLM, a cached correction would repeat the same mistake on every retry
+            response = await acomplete(self.llm, prompt, use_cache=False)
+            _record("llm_repair_calls")
+            logger.debug(response)
+            current_content = extract_json_from_response(response.text.strip())
+            if current_content is None:
+                current_content = repair_json(response.text)
             try:
                 # Try to validate the current content
                 return self.model.model_validate(current_content)
             except Exception as e:
                 last_error = str(e)
-                
-                # Generate a reflection prompt to fix the JSON
-                prompt = self._generate_reflection_prompt(current_content, last_error)
-                print(prompt)
-                
-                # Get corrected JSON from LLM
-                response = await self.llm.acomplete(prompt)
-                print(response)
-                current_content = extract_json_from_response(response.text.strip())
-                retries += 1
-        
+            retries += 1
+
         # If we've exhausted retries, return None
+        _record("failed")
         return None
-    
-    def _generate_reflection_prompt(self, wrong_output: str, error: str) -> str:
+
+    def _generate_reflection_prompt(self, wrong_output: Any, error: str) -> str:
         return dedent(f"""
             You are a JSON correction assistant. The following JSON output failed validation:
             ---------------------
@@ -62,4 +181,4 @@ class JsonValidationHelper(Generic[T]):
 
             Return ONLY the corrected JSON object. Do not include any explanations or additional text.
             Make sure the output is valid JSON that matches the schema exactly and that no other content is modified or summarized.
-        """).strip()
\ No newline at end of file
+        """).strip()
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.utils.concurrency import SingleFlight
+from app.utils.paths import get_session_data_path
+
+logger = logging.getLogger("uvicorn")
+
+# (relative path, size, mtime) of every file in the session directory
+Signature = Tuple[Tuple[str, int, float], ...]
+
+
+class ResearchDocument(BaseModel):
+    name: str
+    path: str
+    content: str
+    size: int
+    mtime: float
+
+
+class ResearchCorpus(BaseModel):
+    session_id: str
+    data_dir: str
+    documents: List[ResearchDocument]
+
+    @property
+    def file_names(self) -> List[str]:
+        return [document.name for document in self.documents]
+
+    def as_dict(self) -> Dict[str, str]:
+        return {document.name: document.content for document in self.documents}
+
+    def render(self) -> str:
+        return "\n".join(f"=== {document.name} ===\n\n{document.content}\n\n" for document in self.documents)
+
+
+class ResearchCorpusLoader:
+    """
+    Loads the research files of a session (data/<session_id>) off the event loop, once.
+
+    The parsed corpus is cached in memory per session together with the size and mtime of
+    every file, so the post production workflows share a single read: a later load only
+    lists the directory, and re-reads just the files that changed. Concurrent loads of the
+    same session are coalesced. Binary files (e.g. generated audio) are skipped.
+
+    The cache is an LRU of at most `max_sessions` corpora and `max_bytes` of file content, the
+    least recently loaded sessions are evicted first and simply read again when loaded later.
+
+    Args:
+        max_sessions: Number of session corpora kept in memory
+        max_bytes: Bytes of file content kept in memory across sessions
+    """
+
+    def __init__(self, max_sessions: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_sessions = max_sessions or int(os.getenv("RESEARCH_CORPUS_CACHE_SIZE", "16"))
+        self.max_bytes = max_bytes or int(os.getenv("RESEARCH_CORPUS_CACHE_BYTES", str(64 * 1024 * 1024)))
+        self._corpora: "OrderedDict[str, Tuple[Signature, ResearchCorpus]]" = OrderedDict()
+        self._bytes = 0
+        # Loads run in threads
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.reads = 0
+
+    @staticmethod
+    def _size(corpus: ResearchCorpus) -> int:
+        return sum(document.size for document in corpus.documents)
+
+    def _remember(self, session_id: str, signature: Signature, corpus: ResearchCorpus) -> None:
+        with self._lock:
+            self._forget(session_id)
+            self._corpora[session_id] = (signature, corpus)
+            self._bytes += self._size(corpus)
+            # The session just loaded is kept even if it alone exceeds max_bytes
+            while len(self._corpora) > 1 and (len(self._corpora) > self.max_sessions or self._bytes > self.max_bytes):
+                evicted = next(iter(self._corpora))
+                self._forget(evicted)
+                logger.debug(f"Evicted research corpus of session {evicted} from memory")
+
+    def _forget(self, session_id: str) -> None:
+        cached = self._corpora.pop(session_id, None)
+        if cached is not None:
+            self._bytes -= self._size(cached[1])
+
+    @staticmethod
+    def _signature(data_dir: Path) -> Signature:
+        if not data_dir.exists():
+            return ()
+        files = []
+        for path in sorted(data_dir.rglob("*")):
+            if path.is_file():
+                stat = path.stat()
+                files.append((str(path.relative_to(data_dir)), stat.st_size, stat.st_mtime))
+        return tuple(files)
+
+    def load_sync(self, session_id: str) -> ResearchCorpus:
+        data_dir = get_session_data_path(session_id)
+        signature = self._signature(data_dir)
+        with self._lock:
+            cached = self._corpora.get(session_id)
+            if cached is not None:
+                self._corpora.move_to_end(session_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        previous = {document.path: document for document in cached[1].documents} if cached else {}
+        documents = []
+        for relative_path, size, mtime in signature:
+            document = previous.get(relative_path)
+            if document is None or document.size != size or document.mtime != mtime:
+                try:
+                    content = (data_dir / relative_path).read_text(encoding="utf-8")
+                except UnicodeDecodeError:
+                    continue
+                self.reads += 1
+                document = ResearchDocument(
+                    name=Path(relative_path).name, path=relative_path, content=content, size=size, mtime=mtime
+                )
+            documents.append(document)
+
+        corpus = ResearchCorpus(session_id=session_id, data_dir=str(data_dir), documents=documents)
+        self._remember(session_id, signature, corpus)
+        return corpus
+
+    async def load(self, session_id: str) -> ResearchCorpus:
+        return await self._flight.run(session_id, lambda: asyncio.to_thread(self.load_sync, session_id))
+
+    def invalidate(self, session_id: Optional[str] = None) -> None:
+        with self._lock:
+            if session_id is None:
+                self._corpora.clear()
+                self._bytes = 0
+            else:
+                self._forget(session_id)
+
+
+_loader: Optional[ResearchCorpusLoader] = None
+
+
+def get_research_corpus_loader() -> ResearchCorpusLoader:
+    global _loader
+    if _loader is None:
+        _loader = ResearchCorpusLoader()
+    return _loader
+
+
+async def load_research_corpus(session_id: str, coalesce: bool = True) -> ResearchCorpus:
+    """
+    Returns the structured research of a session, read from disk only when files changed.
+    Pass coalesce=False right after writing research, so the load does not join a read that started before the write.
+    """
+    loader = get_research_corpus_loader()
+    if not coalesce:
+        return await asyncio.to_thread(loader.load_sync, session_id)
+    return await loader.load(session_id)
@@ -0,0 +1,253 @@
+# flake8: noqa: E402
+"""
+Research worker pool, runs the research jobs the API enqueues in job queue mode (JOB_QUEUE_ENABLED=true).
+
+Starts JOB_WORKERS processes, each running up to JOB_WORKER_CONCURRENCY research workflows at a time,
+with at most JOB_MAX_CONCURRENT_RUNS runs across all workers and JOB_MAX_RUNS_PER_USER per user.
+
+Usage (from the backend directory):
+    poetry run python -m app.worker
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+from typing import AsyncGenerator, Any, Dict, List, Set, Tuple
+
+from app.agents.ideator_inc_workflow import create_idea_research_workflow
+from app.engine.llm_scheduler import Priority, llm_priority
+from app.engine.queued_engine import deserialize_chat_history
+from app.observability import init_observability
+from app.settings import init_settings
+from app.utils.job_queue import BaseJobQueue, Job, get_job_queue
+from app.workflows.single import AgentRunEvent, AgentRunResult
+
+logger = logging.getLogger("uvicorn")
+
+
+class JobEventSink:
+    """
+    Collects the stream parts of a job and writes them to the queue in batches, every `flush_interval` seconds.
+    Once the worker lost the job's claim the parts are dropped, `lost` is set.
+    """
+
+    def __init__(self, queue: BaseJobQueue, job_id: str, worker_id: str, flush_interval: float = 0.2):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.flush_interval = flush_interval
+        self.lost = False
+        self._parts: List[Tuple[str, Any]] = []
+
+    def put_text(self, token: str) -> None:
+        if token:
+            self._parts.append(("text", token))
+
+    def put_event(self, event: AgentRunEvent) -> None:
+        self._parts.append(("agent", {"workflow_name": event.workflow_name, "name": event.name, "msg": event.msg}))
+
+    async def flush(self) -> None:
+        parts, self._parts = self._parts, []
+        if parts and not self.lost:
+            self.lost = not await asyncio.to_thread(self.queue.append_events, self.job_id, self.worker_id, parts)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+class ResearchWorker:
+    """
+    Claims research jobs from the queue and runs them, up to `concurrency` at a time.
+
+    Running jobs are heartbeated, cancelled when the API asks for it, and handed back to the
+    queue when the worker shuts down so another worker resumes them from their checkpoints. A job
+    whose claim the worker lost (it missed heartbeats and was requeued) is stopped without writing
+    its outcome, the job now belongs to another worker.
+    """
+
+    def __init__(
+        self,
+        queue: BaseJobQueue,
+        worker_id: str,
+        concurrency: int = 2,
+        max_running: int = 4,
+        max_running_per_user: int = 1,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = 10.0,
+        heartbeat_timeout: float = 120.0,
+    ):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.max_running = max_running
+        self.max_running_per_user = max_running_per_user
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self._active: Dict[str, asyncio.Task] = {}
+        self._handlers: Dict[str, Any] = {}
+        self._cancel_requested: Set[str] = set()
+        self._lost: Set[str] = set()
+
+    async def run(self) -> None:
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+
+        logger.info(f"Research worker {self.worker_id} started")
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            while not stopping.is_set():
+                if len(self._active) < self.concurrency:
+                    job = await asyncio.to_thread(
+                        self.queue.claim, self.worker_id, self.max_running, self.max_running_per_user
+                    )
+                    if job is not None:
+                        logger.info(f"Worker {self.worker_id} claimed job {job.id} of session {job.session_id}")
+                        self._active[job.id] = asyncio.create_task(self.execute(job))
+                        continue
+                try:
+                    await asyncio.wait_for(stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            heartbeat.cancel()
+            for task in self._active.values():
+                task.cancel()
+            await asyncio.gather(*self._active.values(), return_exceptions=True)
+            logger.info(f"Research worker {self.worker_id} stopped")
+
+    async def execute(self, job: Job) -> None:
+        payload = job.payload
+        sink = JobEventSink(self.queue, job.id, self.worker_id)
+        flusher = asyncio.create_task(sink.run())
+        try:
+            workflow = create_idea_research_workflow(
+                session_id=job.session_id,
+                chat_history=deserialize_chat_history(payload["chat_history"]),
+                email=payload.get("email"),
+                # A job picked up again after its worker stopped continues from its checkpoints
+                resume=payload.get("resume", False) or job.attempts > 1,
+                params=payload.get("params", {}),
+            )
+            with llm_priority(Priority.BACKGROUND):
+                handler = workflow.run(input=payload["input"], streaming=True)
+            self._handlers[job.id] = handler
+
+            async for event in handler.stream_events():
+                if isinstance(event, AgentRunEvent):
+                    sink.put_event(event)
+            result = await handler
+            if isinstance(result, AgentRunResult):
+                sink.put_text(result.response.message.content)
+            if isinstance(result, AsyncGenerator):
+                async for token in result:
+                    sink.put_text(token.delta)
+            status, error = "completed", None
+        except asyncio.CancelledError:
+            if job.id in self._lost:
+                logger.warning(f"Stopped research job {job.id}, worker {self.worker_id} lost its claim")
+                return
+            if job.id not in self._cancel_requested:
+                # The worker is shutting down, hand the job to another worker
+                await self._stop_workflow(job.id)
+                await asyncio.to_thread(self.queue.release, job.id, self.worker_id)
+                logger.info(f"Released job {job.id} back to the queue")
+                return
+            status, error = "cancelled", None
+        except Exception as e:
+            logger.error(f"Research job {job.id} failed: {e}", exc_info=True)
+            status, error = "failed", str(e)
+        finally:
+            flusher.cancel()
+            await sink.flush()
+            self._active.pop(job.id, None)
+            self._handlers.pop(job.id, None)
+            self._cancel_requested.discard(job.id)
+            self._lost.discard(job.id)
+        if not await asyncio.to_thread(self.queue.finish, job.id, self.worker_id, status, error):
+            logger.warning(f"Dropped the outcome of research job {job.id}, worker {self.worker_id} lost its claim")
+            return
+        logger.info(f"Research job {job.id} {status}")
+
+    async def _stop_workflow(self, job_id: str) -> None:
+        handler = self._handlers.get(job_id)
+        if handler is not None:
+            try:
+                await handler.cancel_run()
+            except Exception as e:
+                logger.warning(f"Failed to stop the workflow of job {job_id}: {e}")
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                cancel, lost = await asyncio.to_thread(self.queue.heartbeat, self.worker_id, list(self._active))
+                for job_id in lost:
+                    if job_id in self._active and job_id not in self._lost:
+                        logger.warning(f"Worker {self.worker_id} lost the claim of research job {job_id}, stopping it")
+                        self._lost.add(job_id)
+                        await self._stop_workflow(job_id)
+                        self._active[job_id].cancel()
+                for job_id in cancel:
+                    if job_id in self._active and job_id not in self._cancel_requested:
+                        logger.info(f"Cancelling research job {job_id}")
+                        self._cancel_requested.add(job_id)
+                        await self._stop_workflow(job_id)
+                        self._active[job_id].cancel()
+                await asyncio.to_thread(self.queue.requeue_stale, self.heartbeat_timeout)
+            except Exception as e:
+                logger.warning(f"Worker {self.worker_id} heartbeat failed: {e}")
+
+
+def run_worker() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    init_settings()
+    init_observability()
+    worker = ResearchWorker(
+        queue=get_job_queue(),
+        worker_id=f"{socket.gethostname()}-{os.getpid()}",
+        concurrency=int(os.getenv("JOB_WORKER_CONCURRENCY", "2")),
+        max_running=int(os.getenv("JOB_MAX_CONCURRENT_RUNS", "4")),
+        max_running_per_user=int(os.getenv("JOB_MAX_RUNS_PER_USER", "1")),
+        poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "0.5")),
+        heartbeat_interval=float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10")),
+        heartbeat_timeout=float(os.getenv("JOB_HEARTBEAT_TIMEOUT", "120")),
+    )
+    asyncio.run(worker.run())
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    if get_job_queue() is None:
+        raise SystemExit("Set JOB_QUEUE_ENABLED=true to run research in worker processes")
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, name=f"research-worker-{index}")
+        for index in range(int(os.getenv("JOB_WORKERS", "2")))
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # The workers got the signal too, give them time to hand their jobs back to the queue
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+
+if __name__ == "__main__":
+    main()
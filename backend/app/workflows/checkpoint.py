@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.config import STORAGE_DIR
+
+logger = logging.getLogger("uvicorn")
+
+CHECKPOINT_DIR = os.path.join(STORAGE_DIR, "checkpoints")
+
+
+class WorkflowCheckpoint:
+    """
+    Durable per-step checkpoints for a long running workflow, keyed by session id.
+
+    Each completed step persists the values it produced together with a completion marker,
+    so a restarted run can skip the steps that already finished instead of re-running them.
+    The checkpoint is a small JSON file that is rewritten atomically after every step. Workflows
+    use the async methods, which read and write the file in a thread instead of on the event loop.
+
+    Args:
+        session_id: The session the workflow run belongs to
+        workflow_name: Namespace for the checkpoint, so several workflows can share a session
+        checkpoint_dir: Directory to store checkpoints in, defaults to storage/checkpoints
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        workflow_name: str,
+        checkpoint_dir: Optional[str] = None,
+    ):
+        self.session_id = session_id
+        self.workflow_name = workflow_name
+        self.path = os.path.join(
+            checkpoint_dir or os.getenv("CHECKPOINT_DIR", CHECKPOINT_DIR),
+            workflow_name,
+            f"{session_id}.json",
+        )
+        self._lock = threading.Lock()
+        self._state: Optional[Dict[str, Any]] = None
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        if self._state is None:
+            self._state = self._read()
+        return self._state
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return self.state["data"]
+
+    @property
+    def completed_steps(self) -> List[str]:
+        return self.state["completed_steps"]
+
+    def is_completed(self, step_name: str) -> bool:
+        return step_name in self.completed_steps
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def save(self, **data: Any) -> None:
+        """
+        Persist values without marking a step as completed (e.g. the run input).
+        """
+        with self._lock:
+            self.data.update(data)
+            self._write()
+
+    def save_step(self, step_name: str, **data: Any) -> None:
+        """
+        Persist the values produced by a step and mark the step as completed.
+        """
+        with self._lock:
+            self.data.update(data)
+            if step_name not in self.completed_steps:
+                self.completed_steps.append(step_name)
+            self._write()
+
+    async def astart(self, resume: bool, **identity: Any) -> bool:
+        """
+        Start a run: keep the checkpoint to resume from if `resume` is set and it was saved for the same
+        `identity` values (e.g. the idea), otherwise start a fresh checkpoint holding them.
+        Returns whether the run resumes.
+        """
+        return await asyncio.to_thread(self._start, resume, identity)
+
+    def _start(self, resume: bool, identity: Dict[str, Any]) -> bool:
+        with self._lock:
+            if resume and all(self.data.get(key) == value for key, value in identity.items()):
+                return True
+        self.clear()
+        self.save(**identity)
+        return False
+
+    async def asave_step(self, step_name: str, **data: Any) -> None:
+        await asyncio.to_thread(self.save_step, step_name, **data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._state = self._empty_state()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _empty_state(self) -> Dict[str, Any]:
+        return {"data": {}, "completed_steps": [], "updated_at": None}
+
+    def _read(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return self._empty_state()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            state.setdefault("data", {})
+            state.setdefault("completed_steps", [])
+            return state
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return self._empty_state()
+
+    def _write(self) -> None:
+        self.state["updated_at"] = time.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Write to a temporary file first so a crash mid-write never corrupts the checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, default=str)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,317 @@
+import difflib
+import os
+import re
+import time
+from textwrap import dedent
+from typing import Dict, List, Optional, Tuple
+
+from llama_index.core.workflow import Context
+from pydantic import BaseModel
+
+from app.utils.context_packer import count_tokens
+from app.utils.dedup import jaccard, shingles
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$", re.MULTILINE)
+NO_CHANGES = "NO CHANGES"
+
+
+class CriticLoopStats(BaseModel):
+    loops: int = 0
+    iterations: int = 0  # Critiques requested
+    iterations_saved: int = 0  # Critiques not needed because the loop stopped before max_iterations
+    tokens_saved: int = 0  # Draft tokens not resent to the critic or rewritten by the analyzer
+    critic_satisfied: int = 0
+    converged: int = 0  # Stopped because successive drafts were nearly identical
+    over_budget: int = 0  # Stopped because another iteration would exceed the latency budget
+
+
+_stats: Dict[str, CriticLoopStats] = {}
+
+
+def critic_loop_stats() -> Dict[str, CriticLoopStats]:
+    """
+    Process wide critic loop counters, per workflow.
+    """
+    return _stats
+
+
+def _section_level(text: str) -> Optional[int]:
+    # Sections are split at the highest heading level used more than once, e.g. "##" under a "# Title"
+    levels = [len(match.group(1)) for match in _HEADING.finditer(text)]
+    for level in sorted(set(levels)):
+        if levels.count(level) >= 2:
+            return level
+    return None
+
+
+def _heading_key(heading: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", heading.lower()))
+
+
+def _spans(text: str, level: int) -> List[Tuple[str, int, int]]:
+    # (heading key, start, end) of the sections at `level`, a section ends at the next heading of the same or a higher level
+    headings = list(_HEADING.finditer(text))
+    spans = []
+    for index, match in enumerate(headings):
+        if len(match.group(1)) != level:
+            continue
+        end = next((later.start() for later in headings[index + 1:] if len(later.group(1)) <= level), len(text))
+        spans.append((_heading_key(match.group(2)), match.start(), end))
+    return spans
+
+
+def split_sections(text: str, level: int) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Splits a markdown text at the headings of `level`, returns the text before the first one and the (heading key, section) pairs.
+    """
+    spans = _spans(text, level)
+    if not spans:
+        return text, []
+    return text[:spans[0][1]].strip(), [(key, text[start:end].strip()) for key, start, end in spans]
+
+
+def _replace_subsections(draft: str, revision: str, level: int) -> Optional[str]:
+    # Replaces the draft's sub-sections at `level` with the revision's, None if one of them is not in the draft
+    _, revised = split_sections(revision, level)
+    spans = _spans(draft, level)
+    replacements = {}
+    for key, section in revised:
+        match = next((span for span in spans if span[0] == key and span[1] not in replacements), None)
+        if match is None:
+            return None
+        replacements[match[1]] = (match[2], section)
+    merged, position = [], 0
+    for start in sorted(replacements):
+        end, section = replacements[start]
+        merged.append(draft[position:start])
+        merged.append(section + ("\n\n" if end < len(draft) else "\n"))
+        position = end
+    merged.append(draft[position:])
+    return "".join(merged)
+
+
+def apply_section_revision(draft: str, revision: str) -> Tuple[str, str]:
+    """
+    Merges a revision that only contains the changed sections of the draft into it: sections with
+    the heading of a draft section replace it, sections with new headings are appended, and a
+    revision of sub-sections only (e.g. "### TAM" in a report split at "##") replaces those.
+
+    Returns the revised draft and how the revision was applied: "merged" by section, "replaced"
+    for a complete new draft (it restates the title, covers all sections, or has no sections and
+    is about as long as the draft), or "rejected" when it is neither, then the draft is kept.
+    """
+    level = _section_level(draft)
+    if level is None:
+        return revision, "replaced"
+    if NO_CHANGES in revision and len(revision) < 200:
+        return draft, "merged"
+    preamble, sections = split_sections(draft, level)
+    _, revised = split_sections(revision, level)
+    title = next((match.group(2) for match in _HEADING.finditer(preamble)), None)
+    restates_title = title is not None and any(_heading_key(match.group(2)) == _heading_key(title) for match in _HEADING.finditer(revision))
+
+    if restates_title or (revised and {key for key, _ in revised} >= {key for key, _ in sections}):
+        # The analyzer rewrote the whole report
+        return revision, "replaced"
+    if revised:
+        merged = list(sections)
+        for key, section in revised:
+            for index, (existing, _) in enumerate(merged):
+                if existing == key:
+                    merged[index] = (key, section)
+                    break
+            else:
+                merged.append((key, section))
+        return "\n\n".join(part for part in [preamble] + [section for _, section in merged] if part), "merged"
+    if len(revision) >= 0.6 * len(draft):
+        return revision, "replaced"
+
+    levels = sorted({len(match.group(1)) for match in _HEADING.finditer(revision) if len(match.group(1)) > level})
+    if levels:
+        merged_draft = _replace_subsections(draft, revision, levels[0])
+        if merged_draft is not None:
+            return merged_draft, "merged"
+    return draft, "rejected"
+
+
+class CriticLoop:
+    """
+    Drives an analyzer → critic → analyzer loop, shared by the research and post production workflows.
+
+    After the first full draft, the analyzer is asked to return only the sections it changes, which
+    are merged into the draft, and the critic is sent only what changed since its last review (the
+    changed sections, else a diff). Both are on unless CRITIC_TARGETED_REVISIONS=false, drafts that
+    must be rewritten in full (e.g. a JSON script) pass `section_revisions=False` to only get the
+    critic diffs.
+
+    The loop stops before `max_iterations` when the critic is satisfied, when successive drafts
+    converge (their shingles overlap by `convergence` or more, CRITIC_CONVERGENCE_THRESHOLD) or when
+    another iteration would not finish within `latency_budget` seconds (CRITIC_LOOP_BUDGET_SECONDS,
+    unlimited by default).
+    Iterations and tokens saved are counted per workflow, see `critic_loop_stats`.
+
+    The loop keeps its state in the workflow run's context data.
+
+    Example:
+        >>> loop = CriticLoop.of(ctx, "Competitor analysis", self.max_critic_iterations)
+        >>> draft = loop.add_draft(result.response.message.content)
+        >>> if loop.should_stop():
+        ...     return ReportEvent(input=draft)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_iterations: int,
+        convergence: Optional[float] = None,
+        latency_budget: Optional[float] = None,
+        section_revisions: Optional[bool] = None,
+    ):
+        self.name = name
+        self.max_iterations = max_iterations
+        self.convergence = convergence if convergence is not None else float(os.getenv("CRITIC_CONVERGENCE_THRESHOLD", "0.95"))
+        if latency_budget is None and os.getenv("CRITIC_LOOP_BUDGET_SECONDS"):
+            latency_budget = float(os.getenv("CRITIC_LOOP_BUDGET_SECONDS"))
+        self.latency_budget = latency_budget
+        self.targeted = os.getenv("CRITIC_TARGETED_REVISIONS", "true").lower() == "true"
+        self.section_revisions = self.targeted and (section_revisions if section_revisions is not None else True)
+        self.iteration = 0
+        self.draft: Optional[str] = None
+        self.similarity: Optional[float] = None
+        self.stop_reason: Optional[str] = None
+        self.tokens_saved = 0
+        self.rejected_revision = False
+        self._reviewed: Optional[str] = None
+        self._started = time.monotonic()
+        self._finished = False
+
+    @classmethod
+    def of(cls, ctx: Context, name: str, max_iterations: int, **kwargs) -> "CriticLoop":
+        """
+        The critic loop of the workflow run, created on first use.
+        """
+        loop = ctx.data.get("critic_loop")
+        if loop is None:
+            loop = ctx.data["critic_loop"] = cls(name, max_iterations, **kwargs)
+        return loop
+
+    @property
+    def stats(self) -> CriticLoopStats:
+        return _stats.setdefault(self.name, CriticLoopStats())
+
+    def revision_request(self, critique: str) -> str:
+        """
+        Instructions for the analyzer to revise its draft based on the critique, only the sections it changes when the draft has sections.
+        """
+        level = _section_level(self.draft or "") if self.section_revisions else None
+        if level is None:
+            return f"Refine your report based on this feedback from the critic: {critique}"
+        heading = "#" * level
+        retry = ""
+        if self.rejected_revision:
+            retry = f"Your last revision could not be applied, return each changed section complete, starting with its `{heading} ` heading.\n\n"
+        return retry + dedent(f"""
+            The critic reviewed your report and gave this feedback: {critique}
+
+            Revise the report based on the feedback. Only return the sections you change, each complete and
+            starting with its exact `{heading} ` heading from your current report, sections you do not return are kept as
+            they are. Add missing content as new `{heading} ` sections. If nothing needs to change, return only: {NO_CHANGES}
+        """).strip()
+
+    def add_draft(self, text: str) -> str:
+        """
+        Records the analyzer's output, merging a section revision into the current draft. Returns the complete draft.
+        """
+        if self.draft is None:
+            self.draft = text
+            return text
+        previous = self.draft
+        if self.section_revisions:
+            self.draft, applied = apply_section_revision(previous, text)
+            self.rejected_revision = applied == "rejected"
+            if applied == "merged":
+                self._save_tokens(count_tokens(self.draft) - count_tokens(text))
+        else:
+            self.draft = text
+        # An unchanged draft because the revision could not be applied says nothing about convergence
+        self.similarity = None if self.rejected_revision else jaccard(shingles(previous), shingles(self.draft))
+        return self.draft
+
+    def critique_material(self, draft: Optional[str] = None) -> str:
+        """
+        What the critic is sent: the full draft on the first review, afterwards only what changed since its last review.
+        """
+        draft = draft if draft is not None else self.draft
+        reviewed, self._reviewed = self._reviewed, draft
+        if reviewed is None or not self.targeted:
+            return draft
+
+        level = _section_level(reviewed)
+        if level is not None:
+            _, before = split_sections(reviewed, level)
+            _, after = split_sections(draft, level)
+            previous = dict(before)
+            changed = [section for key, section in after if previous.get(key) != section]
+            unchanged = [section.splitlines()[0] for key, section in after if previous.get(key) == section]
+            if changed and len(changed) < len(after):
+                material = (
+                    "This is a revision of the draft you reviewed before. These sections changed:\n\n"
+                    + "\n\n".join(changed)
+                    + f"\n\nThese sections are unchanged: {', '.join(unchanged)}"
+                )
+                self._save_tokens(count_tokens(draft) - count_tokens(material))
+                return material
+
+        diff = "\n".join(difflib.unified_diff(reviewed.splitlines(), draft.splitlines(), "reviewed", "revised", lineterm="", n=2))
+        if diff and len(diff) < len(draft) // 2:
+            material = f"This is a revision of the draft you reviewed before, as a diff of what changed:\n{diff}"
+            self._save_tokens(count_tokens(draft) - count_tokens(material))
+            return material
+        return draft
+
+    def _save_tokens(self, tokens: int) -> None:
+        if tokens > 0:
+            self.tokens_saved += tokens
+            self.stats.tokens_saved += tokens
+
+    def should_stop(self) -> bool:
+        """
+        Whether to stop the loop instead of asking for another critique, counts the critique otherwise.
+        """
+        if self.iteration >= self.max_iterations:
+            self.finish("max_iterations")
+        elif self.similarity is not None and self.similarity >= self.convergence:
+            self.finish("converged")
+        elif self.latency_budget is not None and self.iteration > 0:
+            elapsed = time.monotonic() - self._started
+            if elapsed + elapsed / self.iteration > self.latency_budget:
+                self.finish("over_budget")
+        if self.stop_reason is not None:
+            return True
+        self.iteration += 1
+        self.stats.iterations += 1
+        return False
+
+    def finish(self, reason: str) -> None:
+        """
+        Ends the loop, e.g. with "critic_satisfied", and records its stats.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        self.stop_reason = reason
+        stats = self.stats
+        stats.loops += 1
+        stats.iterations_saved += max(0, self.max_iterations - self.iteration)
+        if reason in ("critic_satisfied", "converged", "over_budget"):
+            setattr(stats, reason, getattr(stats, reason) + 1)
+
+    def describe(self) -> str:
+        reasons = {
+            "max_iterations": f"after {self.iteration} critiques",
+            "converged": f"the last revision barely changed the draft ({self.similarity:.0%} similar)" if self.similarity is not None else "the draft converged",
+            "over_budget": "another iteration would exceed the latency budget",
+            "critic_satisfied": "the critic is satisfied",
+        }
+        saved = f", saved {self.tokens_saved} tokens with targeted revisions" if self.tokens_saved else ""
+        return f"Critic loop finished: {reasons.get(self.stop_reason, self.stop_reason)}{saved}"
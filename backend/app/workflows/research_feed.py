@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from pydantic import BaseModel
+
+from app.utils.research_corpus import load_research_corpus
+
+logger = logging.getLogger("uvicorn")
+
+T = TypeVar("T")
+
+
+class ResearchSection(BaseModel):
+    name: str
+    # Research files written by the section's workflow, file name to content
+    files: Dict[str, str]
+    # Seconds since the feed was created
+    landed_at: float
+
+
+class ResearchFeed:
+    """
+    Hands completed research sections from the research team to the post production workflows.
+
+    Every research workflow publishes its section when it finishes, together with the paths of
+    the research files it wrote to the session data directory.
+    Consumers iterate over the sections as they land, so they can start briefing the early
+    sections while the slowest analyst is still researching, and only their final synthesis
+    waits for the feed to be complete.
+
+    Args:
+        session_id: The session whose data directory the research files are written to
+        expected: Number of sections to wait for
+    """
+
+    def __init__(self, session_id: str, expected: int):
+        self.session_id = session_id
+        self.expected = expected
+        self.sections: List[ResearchSection] = []
+        self.started_at = time.monotonic()
+        self.completed_at: Optional[float] = None
+        # Seconds of briefing each consumer got done before the research was complete
+        self.head_starts: Dict[str, float] = {}
+        self._changed = asyncio.Event()
+
+    @property
+    def complete(self) -> bool:
+        return len(self.sections) >= self.expected
+
+    async def publish(self, name: str, paths: Sequence[str]) -> ResearchSection:
+        """
+        Publish the section `name` with its research files, `paths` relative to the session data directory.
+        """
+        corpus = await load_research_corpus(self.session_id, coalesce=False)
+        files = {document.name: document.content for document in corpus.documents if document.path in paths}
+        missing = set(paths) - {document.path for document in corpus.documents}
+        if missing:
+            logger.warning(f"Research section {name} is missing its files {sorted(missing)}")
+        section = ResearchSection(name=name, files=files, landed_at=time.monotonic() - self.started_at)
+        self.sections.append(section)
+        if self.complete and self.completed_at is None:
+            self.completed_at = time.monotonic()
+        logger.info(f"Research section {name} landed after {section.landed_at:.1f}s with {len(files)} files")
+        # Wake up the consumers waiting for the next section
+        self._changed.set()
+        self._changed = asyncio.Event()
+        return section
+
+    async def landed(self) -> AsyncIterator[ResearchSection]:
+        """
+        Yields the sections in landing order, waiting for new ones until the feed is complete.
+        """
+        index = 0
+        while True:
+            while index < len(self.sections):
+                yield self.sections[index]
+                index += 1
+            if self.complete:
+                return
+            await self._changed.wait()
+
+    async def map(self, consumer: str, fn: Callable[[ResearchSection], Awaitable[T]]) -> List[T]:
+        """
+        Run `fn` on each section as soon as it lands and return the results once the feed is complete.
+        Sections are processed one at a time, so an agent used by `fn` keeps a consistent memory.
+        """
+        results: List[T] = []
+        intervals: List[Tuple[float, float]] = []
+        async for section in self.landed():
+            started_at = time.monotonic()
+            try:
+                results.append(await fn(section))
+            finally:
+                intervals.append((started_at, time.monotonic()))
+        self.head_starts[consumer] = sum(
+            max(0.0, min(end, self.completed_at) - start) for start, end in intervals
+        )
+        return results
+
+    def research(self) -> Dict[str, str]:
+        return {file_name: content for section in self.sections for file_name, content in section.files.items()}
+
+    def report(self, finished_at: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """
+        Timings of the run: when the research was complete, per consumer the briefing work it got done
+        before then, and the estimated end-to-end saving over a sequential hand-off, where each consumer
+        would have finished its head start later. `finished_at` maps consumers to their monotonic finish time.
+        """
+        research_seconds = (self.completed_at or time.monotonic()) - self.started_at
+        report = {
+            "research_seconds": round(research_seconds, 1),
+            **{f"{consumer}_head_start_seconds": round(seconds, 1) for consumer, seconds in self.head_starts.items()},
+        }
+        if finished_at:
+            pipelined_end = max(finished_at.values())
+            sequential_end = max(end + self.head_starts.get(consumer, 0.0) for consumer, end in finished_at.items())
+            report["post_production_seconds"] = round(pipelined_end - (self.completed_at or self.started_at), 1)
+            report["estimated_saving_seconds"] = round(sequential_end - pipelined_end, 1)
+        return report
@@ -1,5 +1,10 @@
+import asyncio
+import os
+import weakref
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from typing import Any, AsyncGenerator, List, Optional
 
 from llama_index.core.llms import ChatMessage, ChatResponse
@@ -18,6 +23,8 @@ from llama_index.core.workflow import (
 )
 from pydantic import BaseModel, Field
 
+from app.engine.llm_cache import achat_with_tools, astream_chat_with_tools
+
 
 class InputEvent(Event):
     input: list[ChatMessage]
@@ -51,6 +58,38 @@ Today's date is {datetime.now().strftime("%Y-%m-%d")}.
 You are an agent that thinks step by step and uses tools to satisfy the user's request. You first make a plan and execute it step by step through an observation - reason - action loop. In your responses, you always include all reasoning before taking an action or concluding. If you are unable to complete the task because of the tools not working, you should respond with "I am unable to complete the task because <reason>."
 """
 
+# Caps tool calls in flight across all agents, on top of each agent's own cap
+MAX_CONCURRENT_TOOL_CALLS = int(os.getenv("MAX_CONCURRENT_TOOL_CALLS", "16"))
+# Default cap for the tool calls a single agent runs at once from one LLM turn
+AGENT_MAX_PARALLEL_TOOL_CALLS = int(os.getenv("AGENT_MAX_PARALLEL_TOOL_CALLS", "4"))
+
+_tool_call_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_sync_tool_executor: ThreadPoolExecutor | None = None
+
+
+def get_tool_call_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _tool_call_semaphores:
+        _tool_call_semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENT_TOOL_CALLS)
+    return _tool_call_semaphores[loop]
+
+
+def get_sync_tool_executor() -> ThreadPoolExecutor:
+    global _sync_tool_executor
+    if _sync_tool_executor is None:
+        _sync_tool_executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_TOOL_CALLS, thread_name_prefix="sync-tool"
+        )
+    return _sync_tool_executor
+
+
+def is_sync_tool(tool: BaseTool) -> bool:
+    # FunctionTool wraps plain functions with llama-index's sync_to_async adapter
+    return isinstance(tool, FunctionTool) and getattr(
+        tool.async_fn, "__qualname__", ""
+    ).startswith("sync_to_async.")
+
+
 class FunctionCallingAgent(Workflow):
     def __init__(
         self,
@@ -65,6 +104,7 @@ class FunctionCallingAgent(Workflow):
         write_events: bool = True,
         description: str | None = None,
         use_name_as_workflow_name: bool = False,
+        max_parallel_tool_calls: int = AGENT_MAX_PARALLEL_TOOL_CALLS,
         **kwargs: Any,
     ) -> None:
         super().__init__(*args, verbose=verbose, timeout=timeout, **kwargs)
@@ -73,6 +113,7 @@ class FunctionCallingAgent(Workflow):
         self.write_events = write_events
         self.description = description
         self.use_name_as_workflow_name = use_name_as_workflow_name
+        self.max_parallel_tool_calls = max_parallel_tool_calls
         if llm is None:
             llm = Settings.llm.model_copy()
         self.llm = llm
@@ -117,18 +158,14 @@ class FunctionCallingAgent(Workflow):
 
         chat_history = ev.input
 
-        response = await self.llm.achat_with_tools(
-            self.tools, chat_history=chat_history
+        response, tool_calls = await achat_with_tools(
+            self.llm, self.tools, chat_history=chat_history
         )
         self.memory.put(response.message)
         ctx.write_event_to_stream(
             AgentRunEvent(name=self.name, msg="Got response: \n" + str(response.message), workflow_name=self.name if self.use_name_as_workflow_name else None)
         )
 
-        tool_calls = self.llm.get_tool_calls_from_response(
-            response, error_on_no_tool_call=False
-        )
-
         if not tool_calls:
             ctx.write_event_to_stream(
                 AgentRunEvent(name=self.name, msg="Finished task", workflow_name=self.name if self.use_name_as_workflow_name else None)
@@ -148,8 +185,8 @@ class FunctionCallingAgent(Workflow):
         chat_history = ev.input
 
         async def response_generator() -> AsyncGenerator:
-            response_stream = await self.llm.astream_chat_with_tools(
-                self.tools, chat_history=chat_history
+            response_stream = astream_chat_with_tools(
+                self.llm, self.tools, chat_history=chat_history
             )
 
             full_response = None
@@ -195,63 +232,68 @@ class FunctionCallingAgent(Workflow):
         )
         return StopEvent(result=generator)
 
+    async def call_tool(self, ctx: Context, tool: BaseTool, tool_call: ToolSelection) -> ToolOutput:
+        if isinstance(tool, ContextAwareTool):
+            # inject context for calling an context aware tool
+            return await tool.acall(ctx=ctx, **tool_call.tool_kwargs)
+        if is_sync_tool(tool):
+            # Keep blocking tools off the event loop, in a pool sized to the global cap
+            return await asyncio.get_running_loop().run_in_executor(
+                get_sync_tool_executor(), partial(tool.call, **tool_call.tool_kwargs)
+            )
+        return await tool.acall(**tool_call.tool_kwargs)
+
     @step()
     async def handle_tool_calls(self, ctx: Context, ev: ToolCallEvent) -> InputEvent:
         tool_calls = ev.tool_calls
         tools_by_name = {tool.metadata.get_name(): tool for tool in self.tools}
+        agent_semaphore = asyncio.Semaphore(self.max_parallel_tool_calls)
 
-        tool_msgs = []
-
-        # call tools -- safely!
-        for tool_call in tool_calls:
-            tool = tools_by_name.get(tool_call.tool_name)
+        # call tools -- safely, and concurrently as the calls of one turn are independent
+        async def run_tool_call(tool_call: ToolSelection) -> tuple[ChatMessage, ToolOutput | None]:
             additional_kwargs = {
                 "tool_call_id": tool_call.tool_id,
-                "name": tool.metadata.get_name(),
+                "name": tool_call.tool_name,
             }
-            if not tool:
-                tool_msgs.append(
-                    ChatMessage(
-                        role="tool",
-                        content=f"Tool {tool_call.tool_name} does not exist",
-                        additional_kwargs=additional_kwargs,
-                    )
-                )
+            if tool_call.tool_name not in tools_by_name:
                 ctx.write_event_to_stream(
                     AgentRunEvent(name=self.name, msg="Tool does not exist: " + str(tool_call.tool_name), workflow_name=self.name if self.use_name_as_workflow_name else None)
                 )
-                continue
+                return ChatMessage(
+                    role="tool",
+                    content=f"Tool {tool_call.tool_name} does not exist",
+                    additional_kwargs=additional_kwargs,
+                ), None
 
-            ctx.write_event_to_stream(
-                AgentRunEvent(name=self.name, msg="Calling tool: " + str(tool_call.tool_name), workflow_name=self.name if self.use_name_as_workflow_name else None)
-            )
-            try:
-                if isinstance(tool, ContextAwareTool):
-                    # inject context for calling an context aware tool
-                    tool_output = await tool.acall(ctx=ctx, **tool_call.tool_kwargs)
-                else:
-                    tool_output = await tool.acall(**tool_call.tool_kwargs)
-                self.sources.append(tool_output)
-                tool_msgs.append(
-                    ChatMessage(
+            async with agent_semaphore, get_tool_call_semaphore():
+                ctx.write_event_to_stream(
+                    AgentRunEvent(name=self.name, msg="Calling tool: " + str(tool_call.tool_name), workflow_name=self.name if self.use_name_as_workflow_name else None)
+                )
+                try:
+                    tool_output = await self.call_tool(
+                        ctx, tools_by_name[tool_call.tool_name], tool_call
+                    )
+                    return ChatMessage(
                         role="tool",
                         content=tool_output.content,
                         additional_kwargs=additional_kwargs,
+                    ), tool_output
+                except Exception as e:
+                    ctx.write_event_to_stream(
+                        AgentRunEvent(name=self.name, msg="Encountered error in tool call: " + str(e), workflow_name=self.name if self.use_name_as_workflow_name else None)
                     )
-                )
-            except Exception as e:
-                ctx.write_event_to_stream(
-                    AgentRunEvent(name=self.name, msg="Encountered error in tool call: " + str(e), workflow_name=self.name if self.use_name_as_workflow_name else None)
-                )
-                tool_msgs.append(
-                    ChatMessage(
+                    return ChatMessage(
                         role="tool",
                         content=f"Encountered error in tool call: {e}",
                         additional_kwargs=additional_kwargs,
-                    )
-                )
-                    
-        for msg in tool_msgs:
+                    ), None
+
+        # gather keeps the results in the order the LLM issued the calls
+        results = await asyncio.gather(*[run_tool_call(tool_call) for tool_call in tool_calls])
+
+        for msg, tool_output in results:
+            if tool_output is not None:
+                self.sources.append(tool_output)
             self.memory.put(msg)
             ctx.write_event_to_stream(
                 AgentRunEvent(name=self.name, msg="Tool response: " + str(msg), workflow_name=self.name if self.use_name_as_workflow_name else None)
@@ -0,0 +1,99 @@
+"""
+Benchmark for near duplicate removal in the analyzer prompts (`app.utils.dedup`).
+
+Builds the search results of several agents researching the same topic, where each agent returns
+an overlapping share of the same quotes and competitor descriptions with small differences in
+punctuation and case, plus the same URLs with tracking parameters. Packs them with a budget large
+enough for everything and compares the prompt tokens without deduplication, with the exact paragraph
+deduplication the packer used before, and with near duplicate paragraph and line removal.
+
+Usage (from the backend directory):
+    poetry run python -m benchmarks.dedup
+    poetry run python -m benchmarks.dedup --agents 8 --items 200 --overlap 0.6
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from app.utils.context_packer import ContextPacker, count_tokens
+from app.utils.dedup import extract_urls
+
+TOPICS = ["onboarding", "pricing", "sync", "offline mode", "integrations", "support", "mobile app", "exports"]
+FEELINGS = ["is confusing for", "keeps failing for", "is the main reason we picked it for", "is too expensive for"]
+AUDIENCES = ["small teams", "freelancers", "agencies with many clients", "students on a budget", "enterprise admins"]
+
+
+def build_item(index: int) -> dict:
+    rng = random.Random(index)
+    return {
+        "quote": f"Honestly the {rng.choice(TOPICS)} {rng.choice(FEELINGS)} {rng.choice(AUDIENCES)}, "
+        f"we tried it for {rng.randint(2, 30)} weeks and thread {index} has the details",
+        "sentiment": rng.choice(["positive", "negative", "mixed"]),
+        "source_url": f"https://www.reddit.com/r/productivity/comments/{index:05d}/?utm_source=share&utm_medium=web",
+    }
+
+
+def vary(text: str, rng: random.Random) -> str:
+    # The same quote as another agent copied it: different case and punctuation
+    if rng.random() < 0.5:
+        text = text.replace(",", "")
+    if rng.random() < 0.5:
+        text = text[0].lower() + text[1:] + "."
+    return text
+
+
+def build_results(agents: int, items: int, overlap: float, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    results = []
+    for agent in range(agents):
+        found = [index for index in range(items) if rng.random() < overlap]
+        insights = []
+        for index in found:
+            item = build_item(index)
+            item["quote"] = vary(item["quote"], rng)
+            if rng.random() < 0.5:
+                item["source_url"] = item["source_url"].replace("https://www.", "http://")
+            insights.append(item)
+        results.append(json.dumps({"agent": agent, "insights": insights}, indent=2))
+    return results
+
+
+def exact_dedup_tokens(results: list) -> int:
+    seen = set()
+    tokens = 0
+    for paragraph in re.split(r"\n\s*\n", "\n\n".join(results)):
+        fingerprint = " ".join(re.findall(r"[a-z0-9]+", paragraph.lower()))
+        if paragraph.strip() and fingerprint not in seen:
+            seen.add(fingerprint)
+            tokens += count_tokens(paragraph)
+    return tokens
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=4, help="Agents returning search results")
+    parser.add_argument("--items", type=int, default=100, help="Distinct quotes across all agents")
+    parser.add_argument("--overlap", type=float, default=0.5, help="Share of the quotes each agent finds")
+    args = parser.parse_args()
+
+    results = build_results(args.agents, args.items, args.overlap)
+    raw_tokens = sum(count_tokens(result) for result in results)
+    exact_tokens = exact_dedup_tokens(results)
+
+    start = time.perf_counter()
+    packed = ContextPacker(token_budget=10 ** 9).pack("pricing for small teams", {"Reddit discussions": results})
+    elapsed = time.perf_counter() - start
+    packed_tokens = count_tokens(packed)
+
+    raw_urls = sum(len(re.findall(r"https?://\S+", result)) for result in results)
+    print(f"{'':>22} {'tokens':>8} {'saved':>7}")
+    print(f"{'no dedup':>22} {raw_tokens:>8}")
+    print(f"{'exact paragraphs':>22} {exact_tokens:>8} {1 - exact_tokens / raw_tokens:>7.1%}")
+    print(f"{'near duplicates':>22} {packed_tokens:>8} {1 - packed_tokens / raw_tokens:>7.1%}")
+    print(f"packing took {elapsed * 1000:.1f}ms, sources: {raw_urls} URLs, {len(extract_urls(results))} unique")
+
+
+if __name__ == "__main__":
+    main()
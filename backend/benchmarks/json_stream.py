@@ -0,0 +1,96 @@
+"""
+Benchmark for parsing streamed agent JSON with `IncrementalJsonParser`.
+
+Builds competitor search responses of growing size (prose, then a fenced JSON document with many
+competitors), splits them into LLM sized chunks and compares the regex extractor, which can only
+run once the full response arrived, with the incremental parser fed chunk by chunk. Reports the
+parse time of each, and how much of the response had streamed in when the first competitor was
+available to downstream steps.
+
+Usage (from the backend directory):
+    poetry run python -m benchmarks.json_stream
+    poetry run python -m benchmarks.json_stream --sizes 100 500 2000 --chunk-chars 16
+"""
+import argparse
+import json
+import time
+
+from app.agents.stage_2_initial_research.competitor_analysis.competitor_searcher import CompetitorInfo
+from app.utils.json_extractor import extract_json_from_response
+from app.utils.json_stream import StreamingModelParser
+
+DESCRIPTION = (
+    "An AI assistant that drafts personalised sales emails from CRM data, "
+    "with sequences, A/B testing and {merge_fields} for outbound teams. "
+)
+
+
+def build_response(target_kb: int) -> str:
+    competitor = {
+        "name": "",
+        "direct_competitor": True,
+        "description": DESCRIPTION * 4,
+        "source_url": "https://www.producthunt.com/products/example",
+        "relevance_factors": ["email generation", "CRM integration", "sequence automation"],
+    }
+    size = len(json.dumps(competitor))
+    count = max(1, target_kb * 1024 // size)
+    document = {
+        "sources": [f"https://example.com/source/{i}" for i in range(20)],
+        "insights": ["The space is crowded, most tools target SDR teams {e.g. outbound}"] * 5,
+        "competitors": [{**competitor, "name": f"Competitor {i}"} for i in range(count)],
+    }
+    return (
+        "I searched both the curated sources and the web, here is what I found:\n```json\n"
+        + json.dumps(document, indent=2)
+        + "\n```\n"
+    )
+
+
+def chunked(text: str, chunk_chars: int):
+    return [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+
+
+def bench_regex(chunks) -> tuple:
+    start = time.perf_counter()
+    response = "".join(chunks)
+    document = extract_json_from_response(response)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(document["competitors"])
+
+
+def bench_incremental(chunks) -> tuple:
+    parser = StreamingModelParser(CompetitorInfo, ("competitors", "*"))
+    first_item_at = None
+    start = time.perf_counter()
+    for index, chunk in enumerate(chunks):
+        if parser.feed(chunk) and first_item_at is None:
+            first_item_at = (index + 1) / len(chunks)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(parser.items), first_item_at
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 250, 1000], help="Response sizes in KB")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="Characters per streamed chunk")
+    parser.add_argument("--chars-per-second", type=float, default=400, help="Generation speed, to express time to first item")
+    args = parser.parse_args()
+
+    print(f"{'size':>8} {'regex parse':>12} {'stream parse':>13} {'items':>6} {'first item at':>14} {'first item after':>17} {'regex first item':>17}")
+    for size_kb in args.sizes:
+        chunks = chunked(build_response(size_kb), args.chunk_chars)
+        total_chars = sum(len(chunk) for chunk in chunks)
+        stream_seconds = total_chars / args.chars_per_second
+
+        regex_elapsed, regex_items = bench_regex(chunks)
+        stream_elapsed, stream_items, first_item_at = bench_incremental(chunks)
+        assert regex_items == stream_items, (regex_items, stream_items)
+        print(
+            f"{size_kb:>6}KB {regex_elapsed * 1000:>10.1f}ms {stream_elapsed * 1000:>11.1f}ms {stream_items:>6} "
+            f"{first_item_at:>13.1%} {first_item_at * stream_seconds:>16.1f}s {stream_seconds + regex_elapsed:>16.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
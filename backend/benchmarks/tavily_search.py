@@ -0,0 +1,128 @@
+"""
+Offline benchmark for the Tavily search backend.
+
+Starts a local stub of the Tavily /search endpoint with artificial latency, then simulates
+parallel agents issuing overlapping searches, comparing the blocking per-call client with
+the pooled, coalescing async backend.
+
+Usage (from the backend directory):
+    poetry run python -m benchmarks.tavily_search
+    poetry run python -m benchmarks.tavily_search --serve --port 8765  # only run the stub
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.engine.tools import tavily
+
+
+class StubTavilyHandler(BaseHTTPRequestHandler):
+    latency: float = 0.2
+    requests_served = 0
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+        type(self).requests_served += 1
+        query = payload.get("query", "")
+        body = json.dumps(
+            {
+                "query": query,
+                "answer": f"Stub answer for {query}" if payload.get("include_answer") else None,
+                "results": [
+                    {
+                        "title": f"Result {i} for {query}",
+                        "url": f"https://example.com/{i}",
+                        "content": f"Stub content {i} for {query}",
+                        "score": 1 - i / 10,
+                    }
+                    for i in range(payload.get("max_results", 5))
+                ],
+            }
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    # The socketserver default backlog of 5 stalls concurrent connects for a full SYN retry
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def start_stub_server(port: int = 0, latency: float = 0.2) -> ThreadingHTTPServer:
+    StubTavilyHandler.latency = latency
+    server = StubServer(("127.0.0.1", port), StubTavilyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_workload(num_agents: int, num_unique_queries: int):
+    # Parallel agents research the same idea, so their queries overlap heavily
+    return [
+        (f"ai sales email tool query {i % num_unique_queries}", ["reddit.com"] if i % 2 else None)
+        for i in range(num_agents)
+    ]
+
+
+async def run_blocking(workload):
+    # Baseline: the previous behaviour, a blocking call per search on the event loop
+    start = time.perf_counter()
+    for query, domains in workload:
+        tavily.tavily_search(query=query, include_domains=domains)
+    return time.perf_counter() - start
+
+
+async def run_async(workload):
+    backend = tavily.AsyncTavilySearchBackend()
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[backend.search(query=query, include_domains=domains) for query, domains in workload]
+    )
+    elapsed = time.perf_counter() - start
+    await backend.aclose()
+    return elapsed, backend.requests_sent, backend.coalesced
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serve", action="store_true", help="Only run the stub server")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--agents", type=int, default=40)
+    parser.add_argument("--unique-queries", type=int, default=10)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.latency)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    if args.serve:
+        print(f"Stub Tavily server listening on {url}")
+        threading.Event().wait()
+
+    os.environ["TAVILY_API_URL"] = url
+    os.environ.setdefault("TAVILY_API_KEY", "stub")
+    # Measure the network path, not the persistent search cache
+    os.environ["SEARCH_CACHE_ENABLED"] = "false"
+    workload = make_workload(args.agents, args.unique_queries)
+
+    blocking = asyncio.run(run_blocking(workload))
+    concurrent, sent, coalesced = asyncio.run(run_async(workload))
+    print(f"{len(workload)} searches, {args.unique_queries} unique queries, {args.latency * 1000:.0f}ms stub latency")
+    print(f"blocking client:        {blocking:.2f}s, {len(workload)} requests")
+    print(f"async pooled backend:   {concurrent:.2f}s, {sent} requests ({coalesced} coalesced)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
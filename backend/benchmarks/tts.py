@@ -0,0 +1,134 @@
+"""
+Benchmark for podcast audio generation in `ElevenLabsGenerator`.
+
+Serves canned mp3 audio from a local fake ElevenLabs text-to-speech server with a configurable
+latency, then compares generating a podcast the previous way (one blocking request per segment,
+a temp file per segment and `+=` concatenation) with concurrent synthesis over a pooled client,
+in-memory decoding and a single concatenation, then regenerating the podcast after editing one
+segment with the TTS segment cache. Requires pydub and ffmpeg.
+
+Usage (from the backend directory):
+    poetry run python -m benchmarks.tts
+    poetry run python -m benchmarks.tts --segments 40 --latency 1.5 --concurrency 4
+"""
+import argparse
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+# Measure synthesis without the segment cache, it is enabled explicitly for the regeneration run
+os.environ["TTS_CACHE_ENABLED"] = "false"
+
+from app.engine.tools.podcast_generator import ElevenLabsGenerator, TTSRequest  # noqa: E402
+from app.engine.tools.tts_cache import TTSCache  # noqa: E402
+
+SESSION_ID = "benchmark"
+
+
+def make_canned_audio(seconds: float) -> bytes:
+    buffer = io.BytesIO()
+    Sine(440).to_audio_segment(duration=int(seconds * 1000)).export(buffer, format="mp3")
+    return buffer.getvalue()
+
+
+def make_handler(audio: bytes, latency: float):
+    class FakeTTSHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("Content-Length", str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+
+        def log_message(self, *args):
+            pass
+
+    return FakeTTSHandler
+
+
+class FakeTTSServer(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def start_fake_tts_server(audio: bytes, latency: float) -> ThreadingHTTPServer:
+    server = FakeTTSServer(("127.0.0.1", 0), make_handler(audio, latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def generate_sequentially(generator: ElevenLabsGenerator, segments, output_dir: Path) -> float:
+    """The previous implementation: blocking requests, temp files and quadratic concatenation."""
+    start = time.perf_counter()
+    final_audio = None
+    for speaker, text in segments:
+        response = requests.post(
+            f"{generator.base_url}/v1/text-to-speech/{generator._get_voice_id(speaker)}",
+            headers={"xi-api-key": generator.api_key},
+            json=TTSRequest(text=text).model_dump(),
+        )
+        response.raise_for_status()
+        temp_path = output_dir / f"temp_{speaker}.mp3"
+        temp_path.write_bytes(response.content)
+        audio_segment = AudioSegment.from_mp3(str(temp_path))
+        final_audio = audio_segment if final_audio is None else final_audio + audio_segment
+        temp_path.unlink()
+    final_audio.export(str(output_dir / "sequential.mp3"), format="mp3")
+    return time.perf_counter() - start
+
+
+async def generate_concurrently(generator: ElevenLabsGenerator, segments) -> float:
+    start = time.perf_counter()
+    await generator.agenerate_podcast(segments, filename="concurrent", session_id=SESSION_ID)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segments", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds the fake server takes per segment")
+    parser.add_argument("--audio-seconds", type=float, default=15.0, help="Length of the canned audio per segment")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    server = start_fake_tts_server(make_canned_audio(args.audio_seconds), args.latency)
+    generator = ElevenLabsGenerator(
+        api_key="benchmark",
+        base_url=f"http://127.0.0.1:{server.server_address[1]}",
+        max_concurrency=args.concurrency,
+    )
+    segments = [("Alex" if i % 2 == 0 else "Jamie", f"Segment {i} of the script.") for i in range(args.segments)]
+    output_dir = Path(tempfile.mkdtemp())
+    generator.output_dir = output_dir
+
+    sequential = generate_sequentially(generator, segments, output_dir)
+    print(f"{'sequential':<12} {sequential:6.2f}s")
+    concurrent = asyncio.run(generate_concurrently(generator, segments))
+    print(f"{'concurrent':<12} {concurrent:6.2f}s  ({sequential / concurrent:.1f}x faster)")
+
+    generator.cache = TTSCache(path=str(output_dir / "tts.sqlite"))
+    asyncio.run(generate_concurrently(generator, segments))
+    edited = segments[:-1] + [(segments[-1][0], "An edited last segment.")]
+    regenerated = asyncio.run(generate_concurrently(generator, edited))
+    print(f"{'one edit':<12} {regenerated:6.2f}s  (cache {generator.cache.stats()})")
+
+    shutil.rmtree(output_dir)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Throughput benchmark for the chat stream written by `VercelStreamResponse`.
+
+Drives the response with a synthetic run, a token stream of the final answer interleaved with
+agent events, and compares the previous writer (one JSON line and one write per token or event)
+with the batching writer. A slow client can be simulated with a per-write delay, showing the run
+waiting for the client instead of tokens and events being buffered without bound.
+
+Usage (from the backend directory):
+    poetry run python -m benchmarks.vercel_stream
+    poetry run python -m benchmarks.vercel_stream --tokens 50000 --events 5000 --write-delay-ms 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# Skip the next question suggestions, they call the LLM
+os.environ.pop("NEXT_QUESTION_PROMPT", None)
+
+from llama_index.core.llms import ChatResponse  # noqa: E402
+
+from app.api.routers.models import ChatData, Message  # noqa: E402
+from app.api.routers.vercel_response import VercelStreamResponse  # noqa: E402
+from app.workflows.single import AgentRunEvent  # noqa: E402
+
+WORDS = "the market for ai sales assistants grows as founders automate outreach".split()
+
+
+class SyntheticRun:
+    """
+    Stands in for a workflow handler: awaiting it returns the token stream of the final answer,
+    agent events are produced concurrently while the tokens stream.
+    """
+
+    def __init__(self, tokens: int, events: int):
+        self.tokens = tokens
+        self.events = events
+
+    def __await__(self):
+        async def result():
+            return self._tokens()
+
+        return result().__await__()
+
+    async def _tokens(self):
+        for i in range(self.tokens):
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+            yield ChatResponse(message={"role": "assistant", "content": ""}, delta=WORDS[i % len(WORDS)] + " ")
+
+    async def stream_events(self):
+        for i in range(self.events):
+            if i % 10 == 0:
+                await asyncio.sleep(0)
+            yield AgentRunEvent(name="Researcher", workflow_name="Market Research", msg=f"Step {i}: searching for {WORDS[i % len(WORDS)]}")
+
+    async def cancel_run(self):
+        pass
+
+
+async def unbatched(run: SyntheticRun):
+    """The previous writer: every token and event is encoded and written on its own."""
+    async def tokens():
+        async for token in await run:
+            yield f"0:{json.dumps(token.delta)}\n"
+
+    async def events():
+        async for event in run.stream_events():
+            yield f"8:[{json.dumps(VercelStreamResponse._event_to_response(event))}]\n"
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump(source):
+        async for chunk in source:
+            await queue.put(chunk)
+
+    producers = asyncio.gather(pump(tokens()), pump(events()))
+    producers.add_done_callback(lambda _: queue.put_nowait(None))
+    while (chunk := await queue.get()) is not None:
+        yield chunk
+
+
+async def consume(chunks, write_delay: float):
+    writes = 0
+    size = 0
+    start = time.perf_counter()
+    async for chunk in chunks:
+        writes += 1
+        size += len(chunk)
+        if write_delay:
+            await asyncio.sleep(write_delay)
+    return time.perf_counter() - start, writes, size
+
+
+async def main_async(args):
+    write_delay = args.write_delay_ms / 1000
+    chat_data = ChatData(messages=[Message(role="user", content="Research my idea")])
+
+    elapsed, writes, size = await consume(unbatched(SyntheticRun(args.tokens, args.events)), write_delay)
+    print(f"{'per item':<10} {elapsed:6.2f}s  {writes:7d} writes  {size / 1024:8.1f} KiB")
+
+    run = SyntheticRun(args.tokens, args.events)
+    response = VercelStreamResponse(request=None, chat_data=chat_data, event_handler=run, events=run.stream_events())
+    elapsed, writes, size = await consume(response.body_iterator, write_delay)
+    print(f"{'batched':<10} {elapsed:6.2f}s  {writes:7d} writes  {size / 1024:8.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--write-delay-ms", type=float, default=0.0, help="Simulated time the client takes per write")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark for the shared crawl4ai browser pool used by `read_webpage`.
+
+Serves a set of static article pages from a local HTTP server, then compares per-URL latency
+when every read launches its own browser (the previous behaviour) with reads served by the
+long lived crawler pool. Requires crawl4ai and its Playwright browsers to be installed.
+
+Usage (from the backend directory):
+    poetry run python -m benchmarks.web_reader
+    poetry run python -m benchmarks.web_reader --pages 40 --concurrency 8
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from crawl4ai import AsyncWebCrawler
+
+from app.engine.tools.browser_pool import CrawlerPool
+
+PARAGRAPH = (
+    "Founders keep telling us that writing sales emails takes hours every week, "
+    "and that most tools produce generic copy that prospects ignore. "
+)
+
+
+def render_page(index: int) -> bytes:
+    paragraphs = "".join(f"<p>{PARAGRAPH * 3} Paragraph {i}.</p>" for i in range(20))
+    return (
+        f"<html><head><title>Article {index}</title></head><body>"
+        f"<nav><a href='/'>Home</a> <a href='/about'>About</a></nav>"
+        f"<article><h1>Article {index}</h1>{paragraphs}</article>"
+        f"<footer>Copyright</footer></body></html>"
+    ).encode("utf-8")
+
+
+class StaticPageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_page(abs(hash(self.path)) % 1000)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StaticServer(ThreadingHTTPServer):
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def start_static_server(port: int = 0) -> ThreadingHTTPServer:
+    server = StaticServer(("127.0.0.1", port), StaticPageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def read_with_fresh_browser(url: str) -> float:
+    start = time.perf_counter()
+    async with AsyncWebCrawler(verbose=False) as crawler:
+        await crawler.arun(url=url, bypass_cache=True, verbose=False)
+    return time.perf_counter() - start
+
+
+async def read_with_pool(pool: CrawlerPool, url: str) -> float:
+    start = time.perf_counter()
+    async with pool.acquire() as crawler:
+        await crawler.arun(url=url, bypass_cache=True, verbose=False)
+    return time.perf_counter() - start
+
+
+async def run(urls, concurrency: int, reader):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(url):
+        async with semaphore:
+            return await reader(url)
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[bounded(url) for url in urls])
+    return time.perf_counter() - start, latencies
+
+
+def report(name: str, total: float, latencies) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+    print(
+        f"{name:<16} total {total:6.2f}s  "
+        f"median {statistics.median(latencies) * 1000:7.0f}ms  p95 {p95 * 1000:7.0f}ms"
+    )
+
+
+async def main_async(args):
+    server = start_static_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base_url}/article/{i}" for i in range(args.pages)]
+
+    total, latencies = await run(urls, args.concurrency, read_with_fresh_browser)
+    report("fresh browser", total, latencies)
+
+    pool = CrawlerPool(size=args.browsers, pages_per_crawler=args.concurrency)
+    # Launch the browsers up front, as they are after the first request in a running server
+    async with pool.acquire():
+        pass
+    total, latencies = await run(urls, args.concurrency, lambda url: read_with_pool(pool, url))
+    report("crawler pool", total, latencies)
+    print(f"pool launched {pool.launches} browser(s), recycled {pool.recycles}")
+    await pool.close()
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--browsers", type=int, default=1)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
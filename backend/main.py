@@ -9,6 +9,7 @@ import os
 
 import uvicorn
 from app.api.routers import api_router
+from app.engine.tools.browser_pool import close_crawler_pool
 from app.observability import init_observability
 from app.settings import init_settings
 from fastapi import FastAPI
@@ -57,6 +58,12 @@ mount_static_files("output", "/api/files/output")
 
 app.include_router(api_router, prefix="/api")
 
+
+@app.on_event("shutdown")
+async def shutdown_crawler_pool():
+    await close_crawler_pool()
+
+
 if __name__ == "__main__":
     app_host = os.getenv("APP_HOST", "0.0.0.0")
     app_port = int(os.getenv("APP_PORT", "8000"))
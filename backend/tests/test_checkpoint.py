@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+from app.workflows.checkpoint import WorkflowCheckpoint
+
+
+def make_checkpoint(tmp_path) -> WorkflowCheckpoint:
+    return WorkflowCheckpoint(session_id="session", workflow_name="ideator_inc", checkpoint_dir=str(tmp_path))
+
+
+def test_resumed_run_skips_completed_steps(tmp_path):
+    async def partial_run():
+        checkpoint = make_checkpoint(tmp_path)
+        assert not await checkpoint.astart(resume=True, idea="idea")
+        await checkpoint.asave_step("market_research_result", market_research_result="market report")
+
+    asyncio.run(partial_run())
+
+    async def resumed_run():
+        checkpoint = make_checkpoint(tmp_path)
+        assert await checkpoint.astart(resume=True, idea="idea")
+        return checkpoint
+
+    checkpoint = asyncio.run(resumed_run())
+    assert checkpoint.is_completed("market_research_result")
+    assert checkpoint.get("market_research_result") == "market report"
+    assert not checkpoint.is_completed("online_trends_result")
+
+
+def test_checkpoint_of_another_idea_is_not_resumed(tmp_path):
+    async def run():
+        checkpoint = make_checkpoint(tmp_path)
+        await checkpoint.astart(resume=True, idea="old idea")
+        await checkpoint.asave_step("market_research_result", market_research_result="old report")
+        fresh = make_checkpoint(tmp_path)
+        return fresh, await fresh.astart(resume=True, idea="new idea")
+
+    checkpoint, resumed = asyncio.run(run())
+    assert not resumed
+    assert checkpoint.completed_steps == []
+    assert make_checkpoint(tmp_path).get("idea") == "new idea"
+
+
+def test_run_without_resume_starts_over(tmp_path):
+    async def run():
+        checkpoint = make_checkpoint(tmp_path)
+        await checkpoint.astart(resume=True, idea="idea")
+        await checkpoint.asave_step("market_research_result", market_research_result="report")
+        return await make_checkpoint(tmp_path).astart(resume=False, idea="idea")
+
+    assert not asyncio.run(run())
+    assert make_checkpoint(tmp_path).completed_steps == []
+
+
+def test_corrupt_checkpoint_is_ignored(tmp_path):
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.save_step("market_research_result", market_research_result="report")
+    with open(checkpoint.path, "w", encoding="utf-8") as f:
+        f.write('{"data": {"idea": "ide')
+    assert not asyncio.run(make_checkpoint(tmp_path).astart(resume=True, idea="idea"))
+    assert make_checkpoint(tmp_path).completed_steps == []
+
+
+def test_checkpoint_is_written_off_the_event_loop(tmp_path, monkeypatch):
+    checkpoint = make_checkpoint(tmp_path)
+    threads = []
+    write = checkpoint._write
+
+    def tracked_write():
+        threads.append(threading.current_thread())
+        write()
+
+    monkeypatch.setattr(checkpoint, "_write", tracked_write)
+    asyncio.run(checkpoint.asave_step("market_research_result", market_research_result="report"))
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,54 @@
+import random
+
+from app.utils.context_packer import ContextPacker
+
+PRODUCTS = ["Jira", "Linear", "Asana", "Trello", "Monday", "ClickUp", "Notion", "Basecamp", "Wrike", "Height"]
+WORDS = "teams pricing onboarding reports sync integrations mobile roadmap sprints tickets automation dashboards".split()
+
+
+def unique_paragraphs(count: int):
+    rng = random.Random(0)
+    paragraphs = []
+    for index in range(count):
+        product = PRODUCTS[index % len(PRODUCTS)]
+        body = " ".join(rng.choice(WORDS) for _ in range(14))
+        paragraphs.append(f"### Competitor: {product} {index}\n{product} {index} is used by {body} and many more teams.")
+    return paragraphs
+
+
+def test_unique_multi_line_paragraphs_are_kept():
+    paragraphs = unique_paragraphs(500)
+    packer = ContextPacker(token_budget=10 ** 9)
+    kept = [chunk for chunk in packer.chunk("Research", "\n\n".join(paragraphs))]
+    text = "\n\n".join(chunk.text for chunk in kept)
+    for paragraph in paragraphs:
+        assert paragraph in text
+
+
+def test_pack_keeps_heading_sections():
+    research = "### Competitor: Jira\nJira is an issue tracker used by software teams to plan sprints and track bugs.\n\n" \
+        "### Competitor: Linear\nLinear is a fast issue tracker focused on product teams with keyboard driven workflows."
+    packed = ContextPacker(token_budget=100000).pack("issue tracker", {"Research": research})
+    assert "### Competitor: Jira" in packed
+    assert "### Competitor: Linear" in packed
+
+
+def test_near_duplicate_lines_are_dropped_across_sources():
+    quote = '  "quote": "I stopped using it because the sync between my phone and laptop kept losing notes",'
+    first = "{\n" + quote + '\n  "sentiment": "negative"\n}'
+    second = "{\n" + quote.replace("notes", "notes!") + '\n  "sentiment": "negative"\n}'
+    packed = ContextPacker(token_budget=100000).pack("notes app", {"A": [first], "B": [second]})
+    assert packed.count("kept losing notes") == 1
+
+
+def test_exact_duplicate_paragraphs_are_dropped():
+    packed = ContextPacker(token_budget=100000).pack("task", {"A": ["Same paragraph here.", "Same paragraph here."]})
+    assert packed.count("Same paragraph here.") == 1
+
+
+def test_pack_respects_budget_and_prefers_relevant_chunks():
+    relevant = "Pricing for small teams starts at ten dollars per user per month with a free trial."
+    filler = ["Unrelated notes about weather patterns number %d across the northern hemisphere region." % i for i in range(50)]
+    packer = ContextPacker(token_budget=60, chunk_tokens=30)
+    packed = packer.pack("pricing for small teams", {"Research": filler + [relevant]})
+    assert relevant in packed
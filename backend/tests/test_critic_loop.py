@@ -0,0 +1,109 @@
+from app.workflows.critic_loop import NO_CHANGES, CriticLoop, apply_section_revision
+
+DRAFT = """# Market Research: Project management tools
+
+An overview of the market for project management tools aimed at small teams and agencies.
+
+## Market Size
+
+The market is growing steadily as remote work becomes the norm for small teams.
+
+### TAM
+
+$5B according to a 2023 industry report.
+
+### SAM
+
+$1.2B for teams under 50 people in North America and Europe.
+
+## Competitors
+
+Jira, Linear, Asana and Trello dominate, with Notion moving into the space.
+
+## Trends
+
+AI assistants and automation are the features buyers ask about the most."""
+
+
+def test_section_revision_is_merged():
+    revision = "## Competitors\n\nJira, Linear, Asana, Trello and ClickUp dominate, Notion is moving into the space."
+    text, applied = apply_section_revision(DRAFT, revision)
+    assert applied == "merged"
+    assert "ClickUp" in text
+    assert "## Market Size" in text and "## Trends" in text
+    assert "Jira, Linear, Asana and Trello dominate" not in text
+
+
+def test_new_section_is_appended():
+    text, applied = apply_section_revision(DRAFT, "## Risks\n\nIncumbents bundle project management with their suites.")
+    assert applied == "merged"
+    assert text.startswith("# Market Research")
+    assert text.endswith("Incumbents bundle project management with their suites.")
+
+
+def test_sub_heading_only_revision_keeps_the_report():
+    text, applied = apply_section_revision(DRAFT, "### TAM\n\n$7B according to Gartner.")
+    assert applied == "merged"
+    assert "$7B according to Gartner." in text
+    assert "$5B" not in text
+    for heading in ("# Market Research", "## Market Size", "### SAM", "## Competitors", "## Trends"):
+        assert heading in text
+    assert text.index("### TAM") < text.index("### SAM")
+
+
+def test_unknown_sub_heading_is_rejected():
+    text, applied = apply_section_revision(DRAFT, "### CAGR\n\n12% a year until 2030.")
+    assert applied == "rejected"
+    assert text == DRAFT
+
+
+def test_preamble_only_revision_is_rejected():
+    text, applied = apply_section_revision(DRAFT, "I have updated the market size figures with more recent sources.")
+    assert applied == "rejected"
+    assert text == DRAFT
+
+
+def test_no_changes_keeps_the_draft():
+    text, applied = apply_section_revision(DRAFT, NO_CHANGES)
+    assert applied == "merged"
+    assert text == DRAFT
+
+
+def test_full_rewrite_replaces_the_draft():
+    revision = DRAFT.replace("## Competitors", "## Competition").replace("steadily", "quickly")
+    text, applied = apply_section_revision(DRAFT, revision)
+    assert applied == "replaced"
+    assert text == revision
+
+
+def test_rejected_revision_asks_again_and_does_not_converge():
+    loop = CriticLoop("test", max_iterations=3, convergence=0.95)
+    loop.add_draft(DRAFT)
+    assert loop.should_stop() is False
+    assert loop.add_draft("Updated the numbers as requested.") == DRAFT
+    assert loop.similarity is None
+    assert loop.should_stop() is False
+    assert loop.revision_request("Cite the TAM source").startswith("Your last revision could not be applied")
+
+    loop.add_draft("### TAM\n\n$7B according to Gartner.")
+    assert loop.rejected_revision is False
+    assert "Your last revision" not in loop.revision_request("Looks good")
+
+
+def test_identical_revision_converges():
+    loop = CriticLoop("test", max_iterations=5, convergence=0.95)
+    loop.add_draft(DRAFT)
+    loop.should_stop()
+    loop.add_draft(NO_CHANGES)
+    assert loop.should_stop() is True
+    assert loop.stop_reason == "converged"
+
+
+def test_critique_material_only_sends_changed_sections():
+    loop = CriticLoop("test", max_iterations=3)
+    assert loop.critique_material(DRAFT) == DRAFT
+    draft = loop.add_draft(DRAFT)
+    revised, _ = apply_section_revision(draft, "## Trends\n\nBuyers now expect AI summaries of projects and meetings.")
+    material = loop.critique_material(revised)
+    assert "Buyers now expect AI summaries" in material
+    assert "Jira, Linear" not in material
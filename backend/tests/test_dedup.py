@@ -0,0 +1,51 @@
+import numpy as np
+
+from app.utils.dedup import (
+    NearDuplicateIndex,
+    canonicalize_url,
+    dedupe_urls,
+    extract_urls,
+    same_name,
+    unique_by_similarity,
+)
+
+
+def test_canonicalize_url():
+    assert canonicalize_url("HTTP://www.Example.com:80/pricing/?utm_source=x&b=2&a=1#plans") == "https://example.com/pricing?a=1&b=2"
+
+
+def test_dedupe_urls_keeps_first_original_form():
+    urls = ["https://www.a.com/x/", "http://a.com/x?utm_source=t", "a.com/x#f", "https://a.com/y"]
+    assert dedupe_urls(urls) == ["https://www.a.com/x/", "https://a.com/y"]
+
+
+def test_extract_urls():
+    texts = ["see https://www.reddit.com/r/x/comments/1/ and (https://reddit.com/r/x/comments/1?utm_source=share).", '"url": "https://a.io/p",']
+    assert extract_urls(texts) == ["https://www.reddit.com/r/x/comments/1/", "https://a.io/p"]
+
+
+def test_same_name():
+    assert same_name("Notion Labs, Inc.", "notion labs")
+    assert same_name("Salesforce Inc", "SalesForce.com")
+    assert not same_name("Linear", "LinearB")
+
+
+def test_index_contains_does_not_add():
+    index = NearDuplicateIndex()
+    text = "The app keeps crashing when I upload photos from my phone, support never answered."
+    assert not index.contains(text)
+    assert index.add(text)
+    assert index.contains(text.replace(",", "!"))
+    assert not index.add(text.upper())
+    assert index.duplicates == 1
+
+
+def test_index_does_not_merge_urls_differing_in_id():
+    index = NearDuplicateIndex()
+    lines = [f'"source_url": "https://www.reddit.com/r/productivity/comments/{i:05d}/?utm_source=share&utm_medium=web",' for i in range(200)]
+    assert all(index.add(line) for line in lines)
+
+
+def test_unique_by_similarity():
+    embeddings = np.array([[1, 0], [0.99, 0.01], [0, 1], [0.01, 1]], dtype=np.float32)
+    assert unique_by_similarity(embeddings, 0.95).tolist() == [0, 2]
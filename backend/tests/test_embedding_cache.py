@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from app.engine.embedding_cache import EmbeddingStore
+
+
+def vector(writer: int, index: int) -> list:
+    return [float(writer), float(index), float(writer * 1000 + index)]
+
+
+def write(directory: str, writer: int) -> None:
+    store = EmbeddingStore(directory)
+    for batch in range(20):
+        store.put_many([(f"{writer}-{batch}-{index}", vector(writer, batch * 5 + index)) for index in range(5)])
+
+
+def test_concurrent_writers_keep_rows_consistent(tmp_path):
+    directory = str(tmp_path / "store")
+    EmbeddingStore(directory).put_many([("seed", [0.0, 0.0, 0.0])])
+    processes = [multiprocessing.get_context("spawn").Process(target=write, args=(directory, writer)) for writer in (1, 2, 3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    store = EmbeddingStore(directory)
+    keys = [f"{writer}-{batch}-{index}" for writer in (1, 2, 3) for batch in range(20) for index in range(5)]
+    found = store.get_many(keys)
+    assert len(found) == len(keys)
+    for key in keys:
+        writer, batch, index = map(int, key.split("-"))
+        assert np.allclose(found[key], vector(writer, batch * 5 + index))
+
+
+def test_partial_row_is_truncated_on_open(tmp_path):
+    directory = str(tmp_path / "store")
+    EmbeddingStore(directory).put_many([("a", [1.0, 2.0, 3.0])])
+    with open(os.path.join(directory, "vectors.f32"), "ab") as f:
+        f.write(b"\x00" * 5)
+
+    store = EmbeddingStore(directory)
+    assert os.path.getsize(store.vectors_path) == 3 * 4
+    store.put_many([("b", [4.0, 5.0, 6.0])])
+    found = store.get_many(["a", "b"])
+    assert np.allclose(found["a"], [1.0, 2.0, 3.0])
+    assert np.allclose(found["b"], [4.0, 5.0, 6.0])
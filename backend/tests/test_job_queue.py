@@ -0,0 +1,128 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.engine.queued_engine import QueuedResearchEngine
+from app.utils.job_queue import Job, SQLiteJobQueue, fair_order
+
+
+def make_job(job_id: str, user_id: str, enqueued_at: float) -> Job:
+    return Job(id=job_id, user_id=user_id, session_id=job_id, payload={}, status="queued", enqueued_at=enqueued_at)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SQLiteJobQueue(str(tmp_path / "jobs.sqlite"), max_attempts=2)
+
+
+def test_fair_order_round_robins_users():
+    jobs = [make_job("a1", "alice", 1), make_job("a2", "alice", 2), make_job("a3", "alice", 3), make_job("b1", "bob", 4), make_job("c1", "carol", 5)]
+    assert [job.id for job in fair_order(jobs, {})] == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_fair_order_counts_running_jobs():
+    jobs = [make_job("a1", "alice", 1), make_job("b1", "bob", 2)]
+    assert [job.id for job in fair_order(jobs, {"alice": 1})] == ["b1", "a1"]
+
+
+def test_enqueue_returns_the_active_job_of_the_session(queue):
+    job = queue.enqueue("alice", "session", {"input": "idea"})
+    assert queue.enqueue("alice", "session", {"input": "idea"}).id == job.id
+    assert queue.position(job.id) == 1
+
+
+def test_claim_respects_limits(queue):
+    queue.enqueue("alice", "s1", {})
+    queue.enqueue("alice", "s2", {})
+    queue.enqueue("bob", "s3", {})
+    first = queue.claim("w1", max_running=2, max_running_per_user=1)
+    second = queue.claim("w1", max_running=2, max_running_per_user=1)
+    assert {first.user_id, second.user_id} == {"alice", "bob"}
+    assert queue.claim("w1", max_running=3, max_running_per_user=1) is None
+    assert queue.claim("w1", max_running=2, max_running_per_user=2) is None
+
+
+def test_stale_job_is_requeued_then_fails_after_max_attempts(queue):
+    job = queue.enqueue("alice", "s1", {})
+    assert queue.claim("w1", 4, 1).attempts == 1
+    assert queue.requeue_stale(timeout=-1) == 1
+    assert queue.claim("w2", 4, 1).attempts == 2
+    assert queue.requeue_stale(timeout=-1) == 0
+    failed = queue.get(job.id)
+    assert failed.status == "failed"
+    assert "interrupted 2 times" in failed.error
+
+
+def test_exhausted_queued_job_fails_on_claim(queue):
+    job = queue.enqueue("alice", "s1", {})
+    queue.claim("w1", 4, 1)
+    queue.release(job.id, "w1")
+    queue.claim("w1", 4, 1)
+    queue.release(job.id, "w1")
+    assert queue.claim("w1", 4, 1) is None
+    assert queue.get(job.id).status == "failed"
+
+
+def test_worker_that_lost_its_claim_cannot_write(queue):
+    job = queue.enqueue("alice", "s1", {})
+    queue.claim("w1", 4, 1)
+    assert queue.append_events(job.id, "w1", [("text", "hello")])
+    queue.requeue_stale(timeout=-1)
+    queue.claim("w2", 4, 1)
+
+    assert queue.heartbeat("w1", [job.id]) == ([], [job.id])
+    assert queue.append_events(job.id, "w1", [("text", "stale")]) is False
+    assert queue.finish(job.id, "w1", "completed") is False
+    queue.release(job.id, "w1")
+    assert queue.get(job.id).status == "running"
+    assert queue.get(job.id).worker_id == "w2"
+
+    assert queue.append_events(job.id, "w2", [("text", "hello world")])
+    assert [payload for _, _, payload in queue.read_events(job.id)] == ["hello world"]
+    assert queue.finish(job.id, "w2", "completed")
+    assert queue.get(job.id).status == "completed"
+
+
+def test_requeued_job_does_not_replay_its_failed_attempt(queue):
+    job = queue.enqueue("alice", "s1", {})
+    queue.claim("w1", 4, 1)
+    queue.append_events(job.id, "w1", [("text", "first"), ("text", " attempt")])
+    (cursor, _, _), _ = queue.read_events(job.id)
+    queue.requeue_stale(timeout=-1)
+    queue.claim("w2", 4, 1)
+    assert queue.read_events(job.id) == []
+    queue.append_events(job.id, "w2", [("text", "second attempt")])
+    # A follower of the first attempt keeps its cursor, the new parts come after it
+    assert queue.read_events(job.id, after=cursor) == [(2, "text", "second attempt")]
+    assert queue.read_events(job.id) == [(2, "text", "second attempt")]
+
+
+def test_heartbeat_reports_cancelled_jobs(queue):
+    job = queue.enqueue("alice", "s1", {})
+    queue.claim("w1", 4, 1)
+    queue.cancel(job.id)
+    assert queue.heartbeat("w1", [job.id]) == ([job.id], [])
+    assert queue.requeue_stale(timeout=60) == 0
+
+
+def test_queued_engine_enqueues_off_the_event_loop(queue):
+    enqueue = queue.enqueue
+    threads = []
+
+    def tracked_enqueue(*args):
+        threads.append(threading.current_thread())
+        return enqueue(*args)
+
+    queue.enqueue = tracked_enqueue
+
+    async def run():
+        handler = QueuedResearchEngine(queue, "session", email="alice@example.com").run(input="idea", streaming=True)
+        job = await handler.enqueue()
+        await handler.cancel_run()
+        return job
+
+    job = asyncio.run(run())
+    assert threads and threads[0] is not threading.main_thread()
+    assert queue.get(job.id).status == "cancelled"
+    assert job.user_id == "alice@example.com"
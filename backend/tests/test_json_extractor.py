@@ -0,0 +1,33 @@
+import pytest
+
+from app.utils.json_extractor import extract_json_from_response, repair_json
+
+
+@pytest.mark.parametrize(
+    "response, expected",
+    [
+        ('```json\n{"a": 1}\n```', {"a": 1}),
+        ("Here you go: {'queries': ['a', 'b',], 'done': True}", {"queries": ["a", "b"], "done": True}),
+        ('{"name": "Acme", "note": None, "ok": False}', {"name": "Acme", "note": None, "ok": False}),
+        ('{"text": "line one\nline two"}', {"text": "line one\nline two"}),
+        ('{"items": [1, 2, 3}', {"items": [1, 2, 3]}),
+        ('{"items": [{"a": 1}, {"a": 2}, {"a": "trunc', {"items": [{"a": 1}, {"a": 2}, {"a": "trunc"}]}),
+        ('{"a": 1, "b', {"a": 1}),
+        ('{"a": 1, "b": ', {"a": 1}),
+        ('[{"a": 1}, {"a":', [{"a": 1}]),
+        ('{"x": {"a": 1}, "y": {"a":', {"x": {"a": 1}}),
+        ("[1, 2, 3.", [1, 2]),
+        ('[{"a": 1},]', [{"a": 1}]),
+        ('{"quote": "she said \\"hi\\", then left"}', {"quote": 'she said "hi", then left'}),
+    ],
+)
+def test_repair_json(response, expected):
+    assert repair_json(response) == expected
+
+
+def test_repair_json_without_json():
+    assert repair_json("No JSON in this answer.") is None
+
+
+def test_valid_json_is_extracted_unchanged():
+    assert extract_json_from_response('Result:\n```json\n{"competitors": []}\n```') == {"competitors": []}
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from pydantic import BaseModel
+
+from app.utils.json_stream import IncrementalJsonParser, StreamingModelParser
+
+DOCUMENT = {
+    "competitors": [
+        {"name": "Linear", "url": "https://linear.app", "notes": "Fast, \"keyboard first\" {issue} tracker [beta]"},
+        {"name": "Jira", "url": "https://atlassian.com/jira", "notes": "Enterprise\\nincumbent"},
+    ],
+    "sources": ["https://example.com/a", "https://example.com/b"],
+}
+
+
+def feed_in_chunks(parser: IncrementalJsonParser, text: str, size: int) -> list:
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_chunking_does_not_change_the_result(size):
+    text = f"Here are the competitors:\n```json\n{json.dumps(DOCUMENT, indent=2)}\n```\nLet me know!"
+    parser = IncrementalJsonParser(paths=[("competitors", "*")])
+    completed = feed_in_chunks(parser, text, size)
+    assert completed == [(("competitors", index), competitor) for index, competitor in enumerate(DOCUMENT["competitors"])]
+    assert parser.done
+    assert parser.result() == DOCUMENT
+
+
+@pytest.mark.parametrize("size", [1, 4, 1000])
+def test_bracket_in_prose_is_not_the_document(size):
+    text = f"Sure, see [1] below:\n```json\n{json.dumps(DOCUMENT)}\n```"
+    parser = IncrementalJsonParser(paths=[("competitors", "*")])
+    completed = feed_in_chunks(parser, text, size)
+    assert [value["name"] for _, value in completed] == ["Linear", "Jira"]
+    assert parser.result() == DOCUMENT
+
+
+def test_braces_in_prose_are_skipped():
+    parser = IncrementalJsonParser()
+    parser.feed('Researching {idea} for you, results: {"competitors": []}')
+    assert parser.result() == {"competitors": []}
+
+
+@pytest.mark.parametrize("size", [1, 2, 1000])
+def test_fenced_document_wins_over_prose_example(size):
+    text = 'The format is {"competitors": [{"name": "..."}]}, here it is:\n```json\n{"competitors": [{"name": "Linear"}]}\n```'
+    parser = IncrementalJsonParser()
+    feed_in_chunks(parser, text, size)
+    assert parser.done
+    assert parser.result() == {"competitors": [{"name": "Linear"}]}
+
+
+@pytest.mark.parametrize("size", [1, 1000])
+def test_items_repeated_by_a_fenced_document_are_emitted_once(size):
+    text = 'Draft: {"competitors": [{"name": "A"}]}\n```json\n{"competitors": [{"name": "A"}, {"name": "B"}]}\n```'
+    parser = IncrementalJsonParser(paths=[("competitors", "*")])
+    completed = feed_in_chunks(parser, text, size)
+    assert completed == [(("competitors", 0), {"name": "A"}), (("competitors", 1), {"name": "B"})]
+    assert parser.result() == {"competitors": [{"name": "A"}, {"name": "B"}]}
+
+
+def test_unfenced_document_is_the_result():
+    parser = IncrementalJsonParser()
+    parser.feed('{"competitors": [1, 2]} and some closing words [sic]')
+    assert parser.result() == {"competitors": [1, 2]}
+
+
+def test_array_root_when_paths_start_with_an_index():
+    parser = IncrementalJsonParser(paths=[("*",)])
+    completed = parser.feed('```json\n[{"name": "A"}, {"name": "B"}]\n```')
+    assert [value for _, value in completed] == [{"name": "A"}, {"name": "B"}]
+    assert parser.result() == [{"name": "A"}, {"name": "B"}]
+
+
+class Competitor(BaseModel):
+    name: str
+    url: str
+
+
+def test_streaming_model_parser_validates_items():
+    seen = []
+    parser = StreamingModelParser(Competitor, ("competitors", "*"), on_item=seen.append)
+    text = json.dumps({"competitors": [{"name": "Linear", "url": "https://linear.app"}, {"name": "No url"}]})
+    for start in range(0, len(text), 5):
+        parser.feed(text[start:start + 5])
+    assert [item.name for item in parser] == ["Linear"]
+    assert seen == parser.items
+    assert parser.invalid == 1
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from enum import Enum
+from typing import Any, List
+
+import pytest
+from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+from pydantic import BaseModel, PrivateAttr
+
+from app.engine import llm_cache
+from app.utils.cache import TieredCache, make_cache_key
+from app.utils.json_validator import JsonValidationHelper
+
+
+class ScriptedLLM(CustomLLM):
+    """Returns the scripted responses in order, records the prompts."""
+
+    _responses: List[str] = PrivateAttr()
+    _prompts: List[str] = PrivateAttr(default_factory=list)
+
+    def __init__(self, responses: List[str]):
+        super().__init__()
+        self._responses = list(responses)
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(model_name="scripted")
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        self._prompts.append(prompt)
+        return CompletionResponse(text=self._responses.pop(0))
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        raise NotImplementedError
+
+
+class Idea(BaseModel):
+    name: str
+    score: int
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TieredCache(namespace="llm", path=str(tmp_path / "llm.sqlite"), ttl=3600)
+    llm_cache.set_llm_cache(cache)
+    yield cache
+    llm_cache.set_llm_cache(None)
+
+
+def test_cache_key_is_stable_and_order_independent():
+    assert make_cache_key("model", {"a": 1, "b": 2}) == make_cache_key("model", {"b": 2, "a": 1})
+    assert make_cache_key("model", {"a": 1}) != make_cache_key("model", {"a": 2})
+
+
+def test_tiered_cache_reads_through_to_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    TieredCache(namespace="test", path=path).set_json("key", {"value": 1})
+    fresh = TieredCache(namespace="test", path=path)
+    assert fresh.get_json("key") == {"value": 1}
+    assert fresh.stats.disk_hits == 1
+    assert fresh.get_json("key") == {"value": 1}
+    assert fresh.stats.memory_hits == 1
+    assert TieredCache(namespace="other", path=path).get_json("key") is None
+
+
+def test_tiered_cache_expires_entries():
+    cache = TieredCache(namespace="test")
+    cache.set("key", b"value", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("key") is None
+    cache.set("key", b"value")
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_completions_are_cached(cache):
+    llm = ScriptedLLM(["first", "second"])
+    assert asyncio.run(llm_cache.acomplete(llm, "prompt")).text == "first"
+    assert asyncio.run(llm_cache.acomplete(llm, "prompt")).text == "first"
+    assert asyncio.run(llm_cache.acomplete(llm, "prompt", use_cache=False)).text == "second"
+
+
+def test_json_repair_retries_are_not_cached(cache):
+    llm = ScriptedLLM(['{"name": "Idea"}', '{"name": "Idea", "score": "high"}', '{"name": "Idea", "score": 7}'])
+    helper = JsonValidationHelper(Idea, llm, max_retries=3)
+    assert asyncio.run(helper.validate_and_fix('{"name": "Idea"')) == Idea(name="Idea", score=7)
+    assert len(llm._prompts) == 3
+    assert cache.stats.writes == 0
+
+
+def test_invalid_generated_output_is_not_replayed(cache):
+    llm = ScriptedLLM(["no json here", "still none", "nope", "nothing", '{"name": "Idea", "score": 3}'])
+    helper = JsonValidationHelper(Idea, llm, max_retries=3)
+    assert asyncio.run(helper.generate("Rate the idea")) is None
+    assert asyncio.run(helper.generate("Rate the idea")) == Idea(name="Idea", score=3)
+
+
+def test_agent_turns_are_cached_by_default(monkeypatch):
+    monkeypatch.delenv("LLM_CACHE_AGENT_TURNS", raising=False)
+    assert llm_cache.agent_turn_caching_enabled()
+    monkeypatch.setenv("LLM_CACHE_AGENT_TURNS", "false")
+    assert not llm_cache.agent_turn_caching_enabled()
+
+
+def test_cache_key_serializes_enums_by_value():
+    class Priority(Enum):
+        HIGH = 1
+
+    assert make_cache_key(Priority.HIGH) == make_cache_key(1)
+
+
+def test_cache_key_does_not_mistake_objects_with_a_value_attribute_for_enums():
+    class Setting:
+        value = "user"
+
+        def __str__(self):
+            return "setting"
+
+    assert make_cache_key(Setting()) == make_cache_key("setting")
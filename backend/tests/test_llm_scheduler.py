@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from app.engine.llm_scheduler import LLMScheduler, Priority, _TokenBucket, get_llm_priority, llm_priority
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = _TokenBucket(per_minute=60)
+    assert bucket.wait_time(60) == 0
+    bucket.tokens = 0
+    assert bucket.wait_time(1) == pytest.approx(1, abs=0.05)
+    # Calls larger than the bucket only wait for a full bucket
+    assert bucket.wait_time(600) == pytest.approx(60, abs=0.05)
+    bucket.updated_at -= 30
+    assert bucket.wait_time(30) == 0
+
+
+def test_priority_is_inherited_by_tasks_started_in_the_context():
+    async def current_priority():
+        return get_llm_priority()
+
+    async def run():
+        with llm_priority(Priority.INTERACTIVE):
+            inherited = await asyncio.create_task(current_priority())
+        return inherited, get_llm_priority()
+
+    assert asyncio.run(run()) == (Priority.INTERACTIVE, Priority.NORMAL)
+
+
+def test_queued_calls_are_dispatched_by_priority():
+    async def run():
+        scheduler = LLMScheduler("test", rpm=6000, tpm=10**6, max_concurrency=1)
+        order = []
+
+        async def call(name, priority):
+            async with scheduler.slot(10, priority):
+                order.append(name)
+
+        await scheduler.acquire(10)
+        tasks = [
+            asyncio.create_task(call("background", Priority.BACKGROUND)),
+            asyncio.create_task(call("normal", Priority.NORMAL)),
+            asyncio.create_task(call("interactive 1", Priority.INTERACTIVE)),
+            asyncio.create_task(call("interactive 2", Priority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queue_depth_by_priority"] == {"interactive": 2, "normal": 1, "background": 1}
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["interactive 1", "interactive 2", "normal", "background"]
+
+
+def test_concurrency_is_capped():
+    async def run():
+        scheduler = LLMScheduler("test", rpm=6000, tpm=10**6, max_concurrency=2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with scheduler.slot(10):
+                peak = max(peak, scheduler.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        return peak, scheduler.completed
+
+    assert asyncio.run(run()) == (2, 6)
+
+
+def test_request_budget_spaces_out_calls():
+    async def run():
+        # One request per 50ms once the burst of 2 is spent
+        scheduler = LLMScheduler("test", rpm=2, tpm=10**6, max_concurrency=10)
+        scheduler.requests.rate = 20.0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        granted = []
+
+        async def call():
+            async with scheduler.slot(10):
+                granted.append(loop.time() - started)
+
+        await asyncio.gather(*(call() for _ in range(4)))
+        return granted
+
+    granted = asyncio.run(run())
+    assert granted[1] < 0.03
+    assert granted[3] >= 0.09
+
+
+def test_token_budget_holds_back_large_calls():
+    async def run():
+        scheduler = LLMScheduler("test", rpm=6000, tpm=1000, max_concurrency=10)
+        await scheduler.acquire(1000)
+        waiting = asyncio.create_task(scheduler.acquire(500))
+        await asyncio.sleep(0.01)
+        # The token bucket is empty, the call waits for it to refill
+        assert not waiting.done()
+        assert scheduler.queue_depth == 1
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.queue_depth == 0
+
+    asyncio.run(run())
+
+
+def test_rate_limited_call_drains_the_request_budget():
+    async def run():
+        scheduler = LLMScheduler("test", rpm=600, tpm=10**6, max_concurrency=10)
+        with pytest.raises(RateLimitError):
+            async with scheduler.slot(10):
+                raise RateLimitError("429 Too Many Requests")
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler.rate_limited == 1
+    assert scheduler.in_flight == 0
+    assert scheduler.requests.wait_time(1) > 0
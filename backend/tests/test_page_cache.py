@@ -0,0 +1,48 @@
+import asyncio
+import os
+
+from app.engine.tools.page_cache import PageCache
+
+
+def test_pages_and_extractions_share_the_disk_budget(tmp_path):
+    path = str(tmp_path / "pages.sqlite")
+    cache = PageCache(path, max_bytes=40_000)
+    assert cache.pages.max_bytes + cache.extractions.max_bytes == 40_000
+
+    async def fill():
+        for index in range(40):
+            url = f"https://example.com/{index}"
+
+            async def fetch(url):
+                return {"html": "x" * 1000, "markdown": f"page {url} " + "y" * 1000, "headers": {}}
+
+            page = await cache.get_page(url, fetch)
+
+            async def extract():
+                return "z" * 500
+
+            await cache.get_extraction(page, url, extract, instruction="summarize")
+
+    asyncio.run(fill())
+    (total,) = cache.pages._conn.execute("SELECT SUM(size) FROM cache_entries").fetchone()
+    assert total <= 40_000
+    assert os.path.exists(path)
+
+
+def test_fresh_pages_are_served_from_the_cache(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"))
+    fetches = []
+
+    async def fetch(url):
+        fetches.append(url)
+        return {"html": "<p>hi</p>", "markdown": "hi", "headers": {"ETag": "abc"}}
+
+    async def run():
+        first = await cache.get_page("https://example.com", fetch)
+        second = await cache.get_page("https://example.com", fetch)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert fetches == ["https://example.com"]
+    assert second["etag"] == "abc" and second["content_hash"] == first["content_hash"]
+    assert cache.stats()["hits"] == 1
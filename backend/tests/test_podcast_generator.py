@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+
+from app.engine.tools import podcast_generator
+from app.engine.tools.podcast_generator import ElevenLabsGenerator
+from app.engine.tools.tts_cache import TTSCache
+
+
+class FakeElevenLabs:
+    """Answers text to speech requests with the segment text as audio, slower for longer texts."""
+
+    def __init__(self):
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        text = json.loads(request.content)["text"]
+        self.requests.append(text)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.005 * len(text))
+        self.active -= 1
+        return httpx.Response(200, content=text.encode())
+
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(podcast_generator, "get_tts_cache", lambda: None)
+    monkeypatch.setenv("FILESERVER_URL_PREFIX", "http://localhost/api/files")
+    generator = ElevenLabsGenerator(api_key="test", max_concurrency=2)
+    generator.fake = FakeElevenLabs()
+    generator._client = lambda: httpx.AsyncClient(base_url="http://elevenlabs", transport=httpx.MockTransport(generator.fake.handler))
+    return generator
+
+
+def test_segments_are_returned_in_script_order(generator):
+    completed = []
+
+    async def on_segment(index, audio):
+        completed.append(index)
+
+    segments = [("alex", "a much longer opening line"), ("jamie", "short"), ("alex", "mid length")]
+    audio = asyncio.run(generator.synthesize_segments(segments, on_segment=on_segment))
+    assert audio == [text.encode() for _, text in segments]
+    assert sorted(completed) == [0, 1, 2]
+    assert completed != [0, 1, 2]
+
+
+def test_requests_are_capped_at_max_concurrency(generator):
+    segments = [("alex", f"line {index}") for index in range(8)]
+    asyncio.run(generator.synthesize_segments(segments))
+    assert len(generator.fake.requests) == 8
+    assert generator.fake.max_active == 2
+
+
+def test_repeated_segments_are_synthesized_once(generator):
+    segments = [("alex", "welcome back"), ("jamie", "welcome back"), ("alex", "welcome back")]
+    audio = asyncio.run(generator.synthesize_segments(segments))
+    assert audio == [b"welcome back"] * 3
+    # Alex and Jamie have different voices, only Alex's repeat is coalesced
+    assert generator.fake.requests == ["welcome back", "welcome back"]
+
+
+def test_cached_segments_are_served_without_a_request(generator, tmp_path):
+    generator.cache = TTSCache(str(tmp_path / "tts.sqlite"))
+    generator.cache.set(generator.segment_key("welcome back", "alex"), b"cached")
+    audio = asyncio.run(generator.synthesize_segments([("alex", "welcome  back"), ("alex", "see you")]))
+    assert audio == [b"cached", b"see you"]
+    assert generator.fake.requests == ["see you"]
+    assert generator.cache.get(generator.segment_key("see you", "alex")) == b"see you"
+
+
+def test_generate_podcast_runs_from_a_running_event_loop(generator, monkeypatch):
+    posted = []
+    lock = threading.Lock()
+
+    class Response:
+        def __init__(self, content):
+            self.content = content
+
+        def raise_for_status(self):
+            pass
+
+    def post(url, headers, json, timeout):
+        with lock:
+            posted.append(json["text"])
+        return Response(json["text"].encode())
+
+    assembled = {}
+
+    def assemble_audio(audio_segments, output_path, keys=None):
+        assembled.update(audio=audio_segments, path=output_path)
+
+    monkeypatch.setattr(podcast_generator.requests, "post", post)
+    generator.assemble_audio = assemble_audio
+
+    async def from_a_tool_call():
+        return generator.generate_podcast([("alex", "hi"), ("jamie", "hello"), ("alex", "hi")], "My Show", "session")
+
+    url = asyncio.run(from_a_tool_call())
+    assert url == "http://localhost/api/files/output/tools/session/my_show.mp3"
+    assert assembled["audio"] == [b"hi", b"hello", b"hi"]
+    assert sorted(posted) == ["hello", "hi"]
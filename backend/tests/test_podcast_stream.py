@@ -0,0 +1,38 @@
+import os
+
+from app.engine.tools.podcast_stream import PLAYLIST_NAME, HLSPlaylistWriter
+
+
+def read_playlist(directory) -> str:
+    with open(os.path.join(directory, PLAYLIST_NAME), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_segments_are_published_in_script_order(tmp_path):
+    writer = HLSPlaylistWriter(str(tmp_path / "podcast"))
+    assert writer.add(1, b"second", 12.5) == 0
+    assert not os.path.exists(writer.playlist_path)
+
+    assert writer.add(0, b"first", 10.0) == 2
+    playlist = read_playlist(writer.directory)
+    assert playlist.index("segment_0000.mp3") < playlist.index("segment_0001.mp3")
+    assert "#EXTINF:12.500," in playlist
+    assert "#EXT-X-ENDLIST" not in playlist
+    with open(writer.directory / "segment_0001.mp3", "rb") as f:
+        assert f.read() == b"second"
+
+
+def test_finish_closes_the_playlist_and_target_duration_covers_segments(tmp_path):
+    writer = HLSPlaylistWriter(str(tmp_path / "podcast"), target_duration=30)
+    writer.add(0, b"long", 41.2)
+    writer.finish()
+    playlist = read_playlist(writer.directory)
+    assert "#EXT-X-TARGETDURATION:42" in playlist
+    assert playlist.rstrip().endswith("#EXT-X-ENDLIST")
+
+
+def test_previous_segments_are_removed(tmp_path):
+    directory = tmp_path / "podcast"
+    HLSPlaylistWriter(str(directory)).add(0, b"old", 5)
+    HLSPlaylistWriter(str(directory))
+    assert os.listdir(directory) == []
@@ -0,0 +1,48 @@
+from app.utils import research_corpus
+from app.utils.research_corpus import ResearchCorpusLoader
+
+
+def write_session(tmp_path, session_id: str, size: int) -> None:
+    session_dir = tmp_path / session_id
+    session_dir.mkdir(parents=True, exist_ok=True)
+    (session_dir / "research.md").write_text("x" * size, encoding="utf-8")
+
+
+def test_unchanged_sessions_are_read_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(research_corpus, "get_session_data_path", lambda session_id: tmp_path / session_id)
+    write_session(tmp_path, "s1", 10)
+    loader = ResearchCorpusLoader()
+    assert loader.load_sync("s1").as_dict() == {"research.md": "x" * 10}
+    loader.load_sync("s1")
+    assert loader.reads == 1
+
+
+def test_least_recently_loaded_sessions_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(research_corpus, "get_session_data_path", lambda session_id: tmp_path / session_id)
+    for session_id in ["s1", "s2", "s3"]:
+        write_session(tmp_path, session_id, 10)
+    loader = ResearchCorpusLoader(max_sessions=2, max_bytes=1000)
+    loader.load_sync("s1")
+    loader.load_sync("s2")
+    loader.load_sync("s1")
+    loader.load_sync("s3")
+    assert list(loader._corpora) == ["s1", "s3"]
+    assert loader._bytes == 20
+    loader.load_sync("s2")
+    assert loader.reads == 4
+
+
+def test_cache_is_bounded_by_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(research_corpus, "get_session_data_path", lambda session_id: tmp_path / session_id)
+    write_session(tmp_path, "s1", 60)
+    write_session(tmp_path, "s2", 60)
+    write_session(tmp_path, "big", 500)
+    loader = ResearchCorpusLoader(max_sessions=10, max_bytes=100)
+    loader.load_sync("s1")
+    loader.load_sync("s2")
+    assert list(loader._corpora) == ["s2"]
+    # A session larger than the budget is still kept until the next load
+    loader.load_sync("big")
+    assert list(loader._corpora) == ["big"]
+    loader.invalidate()
+    assert loader._bytes == 0
@@ -0,0 +1,24 @@
+import asyncio
+
+from app.utils import research_corpus
+from app.workflows.research_feed import ResearchFeed
+
+
+def test_sections_get_the_files_they_publish(tmp_path, monkeypatch):
+    monkeypatch.setattr(research_corpus, "get_session_data_path", lambda session_id: tmp_path)
+    research_corpus.get_research_corpus_loader().invalidate()
+
+    async def run():
+        feed = ResearchFeed(session_id="session", expected=2)
+        # Both analysts wrote their report before either published
+        (tmp_path / "market_report.txt").write_text("market", encoding="utf-8")
+        (tmp_path / "trend_report.txt").write_text("trends", encoding="utf-8")
+        market = await feed.publish("Market Research", ["market_report.txt"])
+        trends = await feed.publish("Online Trends", ["trend_report.txt"])
+        return feed, market, trends
+
+    feed, market, trends = asyncio.run(run())
+    assert market.files == {"market_report.txt": "market"}
+    assert trends.files == {"trend_report.txt": "trends"}
+    assert feed.complete
+    assert feed.research() == {"market_report.txt": "market", "trend_report.txt": "trends"}
@@ -0,0 +1,61 @@
+import asyncio
+
+from app.api.services.runs import RunRegistry
+
+
+def test_reads_are_bounded_and_resume_from_the_cursor():
+    async def run():
+        registry = RunRegistry(max_events=100)
+
+        async def produce(run):
+            for token in ["aaaa", "bbbb", "cccc"]:
+                await run.put_text(token)
+            await run.put_data({"type": "agent", "n": 1})
+
+        detached = registry.start("session", produce, input="idea")
+        await detached.task
+        assert detached.input == "idea"
+        first = detached.read(0, max_bytes=8)
+        assert [payload for _, _, payload in first] == ["aaaa", "bbbb"]
+        rest = detached.read(first[-1][0] + 1, max_bytes=8)
+        assert [payload for _, _, payload in rest] == ["cccc"]
+        # A part larger than the limit is still returned on its own
+        assert [payload for _, _, payload in detached.read(3, max_bytes=1)] == [{"type": "agent", "n": 1}]
+        assert not await detached.wait(4)
+
+    asyncio.run(run())
+
+
+def test_wait_returns_once_the_part_was_produced():
+    async def run():
+        registry = RunRegistry(max_events=100)
+        release = asyncio.Event()
+
+        async def produce(run):
+            await release.wait()
+            await run.put_text("token")
+
+        detached = registry.start("session", produce)
+        waiting = asyncio.create_task(detached.wait(0))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        release.set()
+        assert await asyncio.wait_for(waiting, timeout=1)
+        await detached.task
+
+    asyncio.run(run())
+
+
+def test_reading_before_the_retained_window_resumes_at_the_oldest_part():
+    async def run():
+        registry = RunRegistry(max_events=2)
+
+        async def produce(run):
+            for token in ["a", "b", "c"]:
+                await run.put_text(token)
+
+        detached = registry.start("session", produce)
+        await detached.task
+        assert [cursor for cursor, _, _ in detached.read(0, max_bytes=100)] == [1, 2]
+
+    asyncio.run(run())
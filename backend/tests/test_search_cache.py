@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import pytest
+
+from app.engine.tools import google_trends, search_cache
+from app.engine.tools.search_cache import SearchResultCache, normalize_query
+
+
+@pytest.fixture
+def fresh_search_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("SEARCH_CACHE_PATH", str(tmp_path / "search.sqlite"))
+    monkeypatch.setattr(search_cache, "_search_cache", None)
+    monkeypatch.setattr(search_cache, "_search_cache_initialized", False)
+    yield
+    search_cache._search_cache = None
+    search_cache._search_cache_initialized = False
+
+
+def test_queries_are_normalized():
+    assert normalize_query("  Best  AI sales-email tools? ") == "best ai sales-email tools"
+    assert SearchResultCache.key("tavily", "AI tools?", include_domains=["Reddit.com"]) == SearchResultCache.key(
+        "tavily", "ai tools", include_domains=["reddit.com "]
+    )
+    assert SearchResultCache.key("tavily", "ai tools", topic="news") != SearchResultCache.key("tavily", "ai tools")
+
+
+def test_ttl_per_tool_from_env(fresh_search_cache, monkeypatch):
+    monkeypatch.setenv("SEARCH_CACHE_TTL_GOOGLE_TRENDS", "60")
+    cache = search_cache.get_search_cache()
+    assert cache._cache("google_trends").ttl == 60
+    assert cache._cache("tavily").ttl == search_cache.DEFAULT_FRESHNESS["tavily"]
+
+
+def test_results_expire_after_the_tool_freshness(tmp_path):
+    cache = SearchResultCache(str(tmp_path / "search.sqlite"), freshness={"duckduckgo": 0.01, "tavily": 3600})
+    cache.set("duckduckgo", "ai tools", [{"title": "A"}])
+    cache.set("tavily", "ai tools", {"results": []})
+    time.sleep(0.02)
+    assert cache.get("duckduckgo", "ai tools") is None
+    assert cache.get("tavily", "ai tools") == {"results": []}
+    # Tools are namespaced, the same query of another tool is a miss
+    assert cache.get("google_trends", "ai tools") is None
+
+
+class FakeGoogleSearch:
+    responses = []
+    calls = 0
+
+    def __init__(self, params):
+        self.params = params
+
+    def get_dict(self):
+        FakeGoogleSearch.calls += 1
+        return FakeGoogleSearch.responses.pop(0)
+
+
+def test_google_trends_errors_are_not_cached(fresh_search_cache, monkeypatch):
+    monkeypatch.setattr(google_trends, "GoogleSearch", FakeGoogleSearch)
+    FakeGoogleSearch.calls = 0
+    FakeGoogleSearch.responses = [{"error": "Invalid API key"}, {"interest_over_time": {"timeline_data": []}}]
+
+    first = asyncio.run(google_trends.google_trends_search("ai tools", api_key="key"))
+    assert first == {"success": False, "data": None, "error": "Invalid API key"}
+    second = asyncio.run(google_trends.google_trends_search("ai tools", api_key="key"))
+    assert second["success"]
+    # The successful lookup is cached
+    assert asyncio.run(google_trends.google_trends_search("AI tools", api_key="key")) == second
+    assert FakeGoogleSearch.calls == 2
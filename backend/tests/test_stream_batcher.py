@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+from app.api.services.stream_batcher import StreamBatcher
+
+
+async def collect(batcher: StreamBatcher, produce) -> list:
+    async def producer():
+        await produce()
+        batcher.close()
+
+    task = asyncio.create_task(producer())
+    frames = [frame async for frame in batcher.frames()]
+    await task
+    return frames
+
+
+def test_consecutive_parts_are_coalesced_in_order():
+    batcher = StreamBatcher(max_frame_bytes=1024, max_delay=0.01, max_pending_bytes=4096)
+
+    async def produce():
+        await batcher.put_text("Hello")
+        await batcher.put_text(" world")
+        await batcher.put_data({"type": "agent", "n": 1})
+        await batcher.put_data({"type": "agent", "n": 2})
+        await batcher.put_text("!")
+
+    frames = asyncio.run(collect(batcher, produce))
+    assert "".join(frames) == '0:"Hello world"\n8:[{"type": "agent", "n": 1}, {"type": "agent", "n": 2}]\n0:"!"\n'
+    assert batcher.parts_received == 5
+
+
+def test_full_frame_is_flushed_without_waiting():
+    batcher = StreamBatcher(max_frame_bytes=8, max_delay=60, max_pending_bytes=4096)
+
+    async def produce():
+        await batcher.put_text("12345678")
+
+    frames = asyncio.run(asyncio.wait_for(collect(batcher, produce), timeout=5))
+    assert frames == ['0:"12345678"\n']
+
+
+def test_slow_client_makes_the_producer_wait_without_dropping():
+    batcher = StreamBatcher(max_frame_bytes=1024, max_delay=0, max_pending_bytes=10)
+    tokens = [f"token{i} " for i in range(50)]
+    events = [{"type": "agent", "n": i} for i in range(20)]
+
+    async def produce():
+        for i, token in enumerate(tokens):
+            await batcher.put_text(token)
+            if i < len(events):
+                await batcher.put_data(events[i])
+
+    async def slow_client():
+        received = []
+        pending = []
+
+        async def producer():
+            await produce()
+            batcher.close()
+
+        task = asyncio.create_task(producer())
+        async for frame in batcher.frames():
+            received.append(frame)
+            # While the client writes, the pending parts stay around the bound
+            await asyncio.sleep(0.001)
+            pending.append(batcher._size)
+        await task
+        return received, pending
+
+    frames, pending = asyncio.run(slow_client())
+    assert batcher.producer_waits > 0
+    assert max(pending) < 10 + len("token49 ")
+    text = "".join(line[3:-2] for frame in frames for line in frame.splitlines(True) if line.startswith("0:"))
+    assert text == "".join(tokens)
+    data = [item for frame in frames for line in frame.splitlines() if line.startswith("8:") for item in json.loads(line[2:])]
+    assert data == events
+
+
+def test_trailer_is_appended_to_every_frame():
+    count = {"n": 0}
+    batcher = StreamBatcher(max_frame_bytes=4, max_delay=0, max_pending_bytes=4, trailer=lambda: {"cursor": count["n"]})
+
+    async def produce():
+        for token in ["abcd", "efgh"]:
+            await batcher.put_text(token)
+            count["n"] += 1
+
+    frames = asyncio.run(collect(batcher, produce))
+    assert frames == ['0:"abcd"\n8:[{"cursor": 1}]\n', '0:"efgh"\n8:[{"cursor": 2}]\n']
+
+
+def test_close_releases_a_waiting_producer():
+    batcher = StreamBatcher(max_frame_bytes=1024, max_delay=0, max_pending_bytes=4)
+
+    async def run():
+        await batcher.put_text("full")
+        waiting = asyncio.create_task(batcher.put_text("more"))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        batcher.close()
+        await asyncio.wait_for(waiting, timeout=1)
+
+    asyncio.run(run())
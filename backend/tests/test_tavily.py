@@ -0,0 +1,32 @@
+import asyncio
+import gc
+
+from app.engine.tools.tavily import AsyncTavilySearchBackend
+
+
+def test_each_event_loop_gets_its_own_client():
+    backend = AsyncTavilySearchBackend(api_key="test")
+
+    async def clients():
+        return backend._ensure_client(), backend._ensure_client()
+
+    first, again = asyncio.run(clients())
+    assert first is again
+    second, _ = asyncio.run(clients())
+    assert second[0] is not first[0]
+    gc.collect()
+    # The clients of finished loops are not kept around
+    assert len(backend._clients) == 0
+
+
+def test_aclose_closes_the_client_of_the_running_loop():
+    backend = AsyncTavilySearchBackend(api_key="test")
+
+    async def run():
+        client, _ = backend._ensure_client()
+        await backend.aclose()
+        assert client.is_closed
+        assert backend._ensure_client()[0] is not client
+        await backend.aclose()
+
+    asyncio.run(run())
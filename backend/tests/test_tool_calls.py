@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import time
+import weakref
+
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.tools import FunctionTool, ToolSelection
+
+from app.workflows import single
+from app.workflows.single import FunctionCallingAgent, is_sync_tool
+
+
+class RecordingContext:
+    def __init__(self):
+        self.events = []
+
+    def write_event_to_stream(self, event):
+        self.events.append(event)
+
+
+def make_agent(tools, max_parallel_tool_calls=4) -> FunctionCallingAgent:
+    # Only the tool calling step is exercised, it needs no LLM
+    agent = FunctionCallingAgent.__new__(FunctionCallingAgent)
+    agent.tools = tools
+    agent.name = "Tester"
+    agent.use_name_as_workflow_name = False
+    agent.max_parallel_tool_calls = max_parallel_tool_calls
+    agent.memory = ChatMemoryBuffer.from_defaults(token_limit=100000)
+    agent.sources = []
+    return agent
+
+
+def call(name: str, index: int) -> ToolSelection:
+    return ToolSelection(tool_id=f"call_{index}", tool_name=name, tool_kwargs={"value": index})
+
+
+def test_sync_and_async_tools_are_told_apart():
+    def search(value: int) -> str:
+        return str(value)
+
+    async def asearch(value: int) -> str:
+        return str(value)
+
+    assert is_sync_tool(FunctionTool.from_defaults(search))
+    assert not is_sync_tool(FunctionTool.from_defaults(async_fn=asearch))
+
+
+def test_tool_calls_run_concurrently_and_keep_their_order():
+    running = 0
+    peak = 0
+
+    async def search(value: int) -> str:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        # Later calls finish first
+        await asyncio.sleep(0.01 * (5 - value))
+        running -= 1
+        return f"result {value}"
+
+    agent = make_agent([FunctionTool.from_defaults(async_fn=search, name="search")], max_parallel_tool_calls=3)
+    event = asyncio.run(agent.handle_tool_calls(RecordingContext(), single.ToolCallEvent(tool_calls=[call("search", i) for i in range(5)])))
+    tool_messages = [message for message in event.input if message.role == "tool"]
+    assert [message.content for message in tool_messages] == [f"result {i}" for i in range(5)]
+    assert [message.additional_kwargs["tool_call_id"] for message in tool_messages] == [f"call_{i}" for i in range(5)]
+    assert peak == 3
+
+
+def test_global_semaphore_caps_tool_calls_across_agents(monkeypatch):
+    running = 0
+    peak = 0
+
+    async def search(value: int) -> str:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return str(value)
+
+    monkeypatch.setattr(single, "MAX_CONCURRENT_TOOL_CALLS", 2)
+    monkeypatch.setattr(single, "_tool_call_semaphores", weakref.WeakKeyDictionary())
+    agents = [make_agent([FunctionTool.from_defaults(async_fn=search, name="search")]) for _ in range(3)]
+
+    async def run():
+        await asyncio.gather(
+            *(agent.handle_tool_calls(RecordingContext(), single.ToolCallEvent(tool_calls=[call("search", i) for i in range(3)])) for agent in agents)
+        )
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_sync_tools_run_off_the_event_loop():
+    threads = []
+
+    def search(value: int) -> str:
+        threads.append(threading.current_thread())
+        time.sleep(0.1)
+        return str(value)
+
+    agent = make_agent([FunctionTool.from_defaults(search, name="search")])
+    started = time.perf_counter()
+    asyncio.run(agent.handle_tool_calls(RecordingContext(), single.ToolCallEvent(tool_calls=[call("search", i) for i in range(4)])))
+    assert all(thread is not threading.main_thread() for thread in threads)
+    # The four blocking calls overlapped
+    assert time.perf_counter() - started < 0.3
+
+
+def test_failing_and_unknown_tools_become_error_messages():
+    async def broken(value: int) -> str:
+        raise RuntimeError("rate limited")
+
+    agent = make_agent([FunctionTool.from_defaults(async_fn=broken, name="broken")])
+    event = asyncio.run(agent.handle_tool_calls(RecordingContext(), single.ToolCallEvent(tool_calls=[call("broken", 0), call("missing", 1)])))
+    contents = [message.content for message in event.input if message.role == "tool"]
+    assert contents == ["Encountered error in tool call: rate limited", "Tool missing does not exist"]
+    assert agent.sources == []
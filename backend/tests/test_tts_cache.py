@@ -0,0 +1,39 @@
+import unicodedata
+
+from app.engine.tools.podcast_generator import VoiceSettings
+from app.engine.tools.tts_cache import TTSCache, normalize_tts_text
+
+VOICE = "21m00Tcm4TlvDq8ikWAM"
+MODEL = "eleven_multilingual_v2"
+
+
+def test_text_is_normalized_to_nfc_with_collapsed_whitespace():
+    decomposed = unicodedata.normalize("NFD", "café")
+    assert decomposed != "café"
+    assert normalize_tts_text(f"  Welcome to\n the {decomposed}\t show ") == "Welcome to the café show"
+
+
+def test_key_ignores_whitespace_and_unicode_form():
+    key = TTSCache.key(VOICE, MODEL, VoiceSettings(), "Welcome to the café")
+    assert TTSCache.key(VOICE, MODEL, VoiceSettings(), " Welcome  to\nthe café ") == key
+    assert TTSCache.key(VOICE, MODEL, VoiceSettings(), unicodedata.normalize("NFD", "Welcome to the café")) == key
+
+
+def test_key_changes_with_voice_model_settings_and_text():
+    key = TTSCache.key(VOICE, MODEL, VoiceSettings(), "Welcome")
+    assert TTSCache.key("AZnzlk1XvdvUeBnXmlld", MODEL, VoiceSettings(), "Welcome") != key
+    assert TTSCache.key(VOICE, "eleven_turbo_v2", VoiceSettings(), "Welcome") != key
+    assert TTSCache.key(VOICE, MODEL, VoiceSettings(stability=0.9), "Welcome") != key
+    assert TTSCache.key(VOICE, MODEL, VoiceSettings(), "welcome") != key
+
+
+def test_segments_persist_and_are_counted(tmp_path):
+    path = str(tmp_path / "tts.sqlite")
+    cache = TTSCache(path)
+    key = TTSCache.key(VOICE, MODEL, VoiceSettings(), "Welcome")
+    assert cache.get(key) is None
+    cache.set(key, b"audio")
+    assert cache.get(key) == b"audio"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert TTSCache(path).get(key) == b"audio"